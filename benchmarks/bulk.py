@@ -0,0 +1,188 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from fake_clickup import FakeClickUp, Workload
+
+# A sprint rollover: rename every list of a space, then delete them. One
+# `lists update --match` call against one `lists update -n` process per
+# list, as a shell loop would do it. The bulk calls must report one result
+# per list and leave the fake server in the same state.
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+SCRIPT = ("import sys; sys.argv = ['clicli'] + sys.argv[1:]; "
+          "from main import cli; cli()")
+
+CONFIG = {
+    'api-key': 'benchmark',
+    'team-id': '1',
+    'space-id': '101',
+    'user': '1',
+}
+
+
+def clicli(args, env, input=None, check=True):
+    result = subprocess.run([sys.executable, '-c', SCRIPT, *args],
+                            cwd=SRC_DIR,
+                            env=env,
+                            input=input,
+                            stdin=None if input is not None else
+                            subprocess.DEVNULL,
+                            capture_output=True,
+                            text=True)
+    if check and result.returncode != 0:
+        sys.stderr.write(result.stderr)
+        raise SystemExit('clicli %s failed' % ' '.join(args))
+    return result
+
+
+def results(result):
+    return [json.loads(line) for line in result.stdout.splitlines()]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compare bulk list updates with one process per list.')
+    parser.add_argument('--folders', type=int, default=10)
+    parser.add_argument('--lists',
+                        type=int,
+                        default=20,
+                        help='lists in every folder')
+    parser.add_argument('--latency',
+                        type=float,
+                        default=50,
+                        help='milliseconds of server latency per request')
+    options = parser.parse_args()
+
+    workload = Workload(spaces=1,
+                        folders=options.folders,
+                        lists=options.lists,
+                        folderless_lists=0,
+                        tasks=0)
+    lists = {
+        id: list
+        for id, list in workload.lists.items() if list['space'] == 101
+    }
+    server = FakeClickUp(workload, latency=options.latency / 1000).start()
+    home = tempfile.mkdtemp()
+    failed = False
+
+    def check(condition, message):
+        nonlocal failed
+        if not condition:
+            print('FAIL: %s' % message)
+            failed = True
+
+    try:
+        with open(os.path.join(home, '.cliclirc'), 'w') as file:
+            json.dump(CONFIG, file)
+        env = {
+            key: value
+            for key, value in os.environ.items()
+            if not key.startswith('CLICKUP_') and not key.startswith('XDG_')
+        }
+        env.update(HOME=home, CLICKUP_API_URL=server.url)
+
+        # One process per list, looked up by name.
+        server.reset_stats()
+        start = time.perf_counter()
+        for list in lists.values():
+            clicli([
+                '--no-cache', 'lists', 'update', '-f',
+                str(list['folder']), '-n', list['name'],
+                '%s (rolled)' % list['name']
+            ], env)
+        serial_time = time.perf_counter() - start
+        serial_requests = server.stats['requests']
+        check(
+            all(list['name'].endswith(' (rolled)')
+                for list in lists.values()), 'a serial update was lost')
+
+        server.reset_stats()
+        preview = clicli([
+            '--no-cache', 'lists', 'update', '--match', '* (rolled)',
+            '{name} (next)', '--dry-run', '--output', 'ndjson'
+        ], env)
+        check(
+            server.stats['requests'] == 2 and all(
+                result['status'] == 'dry-run' and
+                result['new_name'] == result['name'] + ' (next)'
+                for result in results(preview)) and
+            len(results(preview)) == len(lists), '--dry-run changed lists')
+
+        server.reset_stats()
+        start = time.perf_counter()
+        update = clicli([
+            '--no-cache', 'lists', 'update', '--match', '* (rolled)',
+            '{name} (next)', '--output', 'ndjson'
+        ], env)
+        bulk_time = time.perf_counter() - start
+        bulk_requests = server.stats['requests']
+        check(
+            len(results(update)) == len(lists) and all(
+                result['status'] == 'ok' for result in results(update)),
+            'not every list was reported as updated')
+        check(
+            all(list['name'].endswith(' (rolled) (next)')
+                for list in lists.values()), 'a bulk update was lost')
+
+        print('%d lists, %.0f ms server latency' %
+              (len(lists), options.latency))
+        print('%-38s %9s %9s' % ('', 'seconds', 'requests'))
+        print('%-38s %9.2f %9d' %
+              ('lists update -n, one process per list', serial_time,
+               serial_requests))
+        print('%-38s %9.2f %9d' %
+              ('lists update --match', bulk_time, bulk_requests))
+
+        # A missing ID fails on its own; every other folder is renamed.
+        folder_ids = [str(id) for id in workload.folders]
+        rename = clicli([
+            '--no-cache', 'folders', 'rename', '--ids-from', '-',
+            'Old {name}', '--output', 'ndjson'
+        ],
+                        env,
+                        input='\n'.join(folder_ids + ['404']) + '\n',
+                        check=False)
+        statuses = {
+            result['id']: result['status']
+            for result in results(rename)
+        }
+        check(
+            rename.returncode == 1 and statuses.pop('404') == 'error' and
+            set(statuses.values()) == {'ok'} and
+            len(statuses) == len(folder_ids),
+            'folders rename did not report the missing folder on its own')
+        check(
+            all(folder['name'].startswith('Old Folder')
+                for folder in workload.folders.values()),
+            'a folder was not renamed')
+
+        start = time.perf_counter()
+        clicli([
+            '--no-cache', 'lists', 'remove', '-q', '--regex', r'\(next\)$',
+            '--output', 'ndjson'
+        ], env)
+        clicli([
+            '--no-cache', 'folders', 'remove', '-q', '--match', 'old *',
+            '--output', 'ndjson'
+        ], env)
+        print('%-38s %9.2f' % ('lists remove, folders remove --match',
+                               time.perf_counter() - start))
+        check(not any(list['space'] == 101
+                      for list in workload.lists.values()) and
+              not workload.folders, 'not everything was removed')
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(home, ignore_errors=True)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,190 @@
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from fake_clickup import FakeClickUp, Workload
+
+# Shell completion of names and IDs must answer from the local completion
+# file without waiting for the API, also when the file is missing or stale
+# and a background refresh is started. The fake server is slow, so a
+# completion that waited for it would be far over budget.
+#
+# The budget covers the whole invocation through the `clicli` entry point,
+# from starting the interpreter to printing the values. The first completion
+# goes through click and writes the spec the others are answered from.
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+SCRIPT = ("import sys; sys.argv = ['clicli']; "
+          "from daemon import main; main()")
+
+COMPLETION_BUDGET_MS = 30
+RUNS = 15
+
+CONFIG = {
+    'api-key': 'benchmark',
+    'team-id': '1',
+    'space-id': '101',
+    'user': '1',
+}
+
+
+def complete(words, env):
+    # Returns the values bash would be offered for the last word.
+    words = ['clicli'] + words
+    result = subprocess.run([sys.executable, '-c', SCRIPT],
+                            cwd=SRC_DIR,
+                            env=dict(env,
+                                     COMP_WORDS=' '.join(words),
+                                     COMP_CWORD=str(len(words) - 1),
+                                     _CLICLI_COMPLETE='bash_complete'),
+                            capture_output=True,
+                            text=True,
+                            check=True)
+    return [
+        line.split(',', 1)[1] for line in result.stdout.splitlines() if line
+    ]
+
+
+def median_ms(words, env):
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        complete(words, env)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def names(items, **fields):
+    return sorted(
+        item['name'] for item in items.values()
+        if all(item[key] == value for key, value in fields.items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Measure shell completion latency against a slow fake '
+        'server.')
+    parser.add_argument('--folders', type=int, default=20)
+    parser.add_argument('--lists',
+                        type=int,
+                        default=25,
+                        help='lists in every folder')
+    parser.add_argument('--latency',
+                        type=float,
+                        default=300,
+                        help='milliseconds of server latency per request')
+    options = parser.parse_args()
+
+    workload = Workload(folders=options.folders, lists=options.lists)
+    server = FakeClickUp(workload, latency=options.latency / 1000).start()
+    home = tempfile.mkdtemp()
+    completion_file = os.path.join(home, '.cache', 'clicli', 'completion.tsv')
+    # (words, expected values)
+    cases = [
+        (['lists', 'get', ''], names(workload.lists, space=101, folder=None)),
+        (['lists', 'get', '-f', '10102', 'list'],
+         names(workload.lists, folder=10102)),
+        (['lists', 'get', '1010'],
+         sorted(id for id in map(str, workload.lists) if id.startswith('1010'))
+         ),
+        (['lists', 'update', '-f', '10103', '-n', ''],
+         names(workload.lists, folder=10103)),
+        (['lists', 'update', '--folder-id=10103', '--name', ''],
+         names(workload.lists, folder=10103)),
+        (['folders', 'rename', '-n', ''], names(workload.folders, space=101)),
+        (['config', 'set', 'space-id', ''], sorted(map(str,
+                                                       workload.spaces))),
+    ]
+    failed = False
+    try:
+        with open(os.path.join(home, '.cliclirc'), 'w') as file:
+            json.dump(CONFIG, file)
+        # Bytecode is written as an install would have it, so the timings
+        # don't include compiling the modules.
+        env = {
+            key: value
+            for key, value in os.environ.items()
+            if not key.startswith('CLICKUP_') and not key.startswith('XDG_')
+            and key != 'PYTHONDONTWRITEBYTECODE'
+        }
+        env.update(HOME=home, CLICKUP_API_URL=server.url)
+
+        # Without a completion file: nothing to offer yet, but a refresh
+        # starts in the background. Two completions at once start one.
+        start = time.perf_counter()
+        first = complete(['lists', 'get', ''], env)
+        complete(['folders', 'rename', '-n', ''], env)
+        cold = (time.perf_counter() - start) * 1000 / 2
+        deadline = time.monotonic() + 60
+        while not os.path.exists(completion_file) and \
+                time.monotonic() < deadline:
+            time.sleep(0.1)
+        refreshed = time.perf_counter()
+        print('no completion file: %.1f ms per completion, %d values, '
+              'refreshed in the background after %.1f s' %
+              (cold, len(first), refreshed - start))
+        if first or not os.path.exists(completion_file):
+            print('FAIL: expected an empty answer and a background refresh')
+            return 1
+        time.sleep(1)
+        requests = server.stats['requests']
+
+        print('%-50s %8s %10s' % ('completion', 'values', 'median ms'))
+        for words, expected in cases:
+            values = complete(words, env)
+            median = median_ms(words, env)
+            print('%-50s %8d %10.1f' % (' '.join(words), len(values), median))
+            if sorted(values) != expected:
+                print('FAIL: expected %s, got %s' % (expected, values))
+                failed = True
+            if median > COMPLETION_BUDGET_MS:
+                print('FAIL: over the %s ms budget' % COMPLETION_BUDGET_MS)
+                failed = True
+        if server.stats['requests'] != requests:
+            print('FAIL: completing from a fresh file called the API')
+            failed = True
+
+        # A stale file is still served at once while it is refreshed.
+        words, expected = cases[0]
+        timings = []
+        refreshed = True
+        for _ in range(5):
+            stale = time.time() - 24 * 3600
+            for path in (completion_file, completion_file + '.lock'):
+                os.utime(path, (stale, stale))
+            start = time.perf_counter()
+            values = complete(words, env)
+            timings.append((time.perf_counter() - start) * 1000)
+            if sorted(values) != expected:
+                print('FAIL: the stale file was not served')
+                failed = True
+            deadline = time.monotonic() + 60
+            while os.stat(completion_file).st_mtime == stale and \
+                    time.monotonic() < deadline:
+                time.sleep(0.1)
+            refreshed = refreshed and \
+                os.stat(completion_file).st_mtime != stale
+        elapsed = statistics.median(timings)
+        print('stale completion file: %.1f ms, refreshed: %s' %
+              (elapsed, refreshed))
+        if elapsed > COMPLETION_BUDGET_MS:
+            print('FAIL: over the %s ms budget' % COMPLETION_BUDGET_MS)
+            failed = True
+        if not refreshed:
+            print('FAIL: the stale file was not refreshed')
+            failed = True
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(home, ignore_errors=True)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
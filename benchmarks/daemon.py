@@ -0,0 +1,118 @@
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from fake_clickup import FakeClickUp, Workload
+
+# Per-call latency of short commands run one after another, as a script
+# would, with and without `clicli daemon`. Through the daemon a call should
+# cost little more than its API round trips.
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+SCRIPT = ("import sys; sys.argv = ['clicli'] + sys.argv[1:]; "
+          "from daemon import main; main()")
+
+CONFIG = {
+    'api-key': 'benchmark',
+    'team-id': '1',
+    'space-id': '101',
+    'user': '1',
+}
+COMMANDS = [
+    ['--no-cache', 'lists', 'get', '1010101'],
+    ['--no-cache', 'folders', 'get', '10101'],
+    ['config', 'get', 'user'],
+]
+
+
+def clicli(args, env, check=True):
+    result = subprocess.run([sys.executable, '-c', SCRIPT, *args],
+                            cwd=SRC_DIR,
+                            env=env,
+                            capture_output=True)
+    if check and result.returncode != 0:
+        sys.stderr.write(result.stderr.decode(errors='replace'))
+        raise SystemExit('clicli %s failed' % ' '.join(args))
+    return result
+
+
+def time_calls(env, calls: int):
+    timings = {}
+    outputs = {}
+    for command in COMMANDS:
+        name = ' '.join(command)
+        timings[name] = []
+        for _ in range(calls):
+            start = time.perf_counter()
+            result = clicli(command, env)
+            timings[name].append((time.perf_counter() - start) * 1000)
+        outputs[name] = result.stdout
+    return timings, outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compare clicli call latency with and without the '
+        'daemon.')
+    parser.add_argument('--calls', type=int, default=20)
+    parser.add_argument('--latency',
+                        type=float,
+                        default=20,
+                        help='milliseconds of server latency per request')
+    options = parser.parse_args()
+
+    home = tempfile.mkdtemp()
+    runtime_dir = tempfile.mkdtemp()
+    server = FakeClickUp(Workload(), latency=options.latency / 1000).start()
+    try:
+        with open(os.path.join(home, '.cliclirc'), 'w') as file:
+            json.dump(CONFIG, file)
+        env = {
+            key: value
+            for key, value in os.environ.items()
+            if not key.startswith('CLICKUP_') and not key.startswith('XDG_')
+        }
+        env.update(HOME=home,
+                   XDG_RUNTIME_DIR=runtime_dir,
+                   CLICKUP_API_URL=server.url)
+
+        # The first call only warms the bytecode cache.
+        clicli(COMMANDS[0], env)
+        in_process, expected = time_calls(env, options.calls)
+        clicli(['daemon', 'start'], env)
+        try:
+            connections = server.stats['connections']
+            daemon, outputs = time_calls(env, options.calls)
+            connections = server.stats['connections'] - connections
+        finally:
+            clicli(['daemon', 'stop'], env)
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(home, ignore_errors=True)
+        shutil.rmtree(runtime_dir, ignore_errors=True)
+
+    print('median ms per call over %d calls, %.0f ms server latency' %
+          (options.calls, options.latency))
+    print('%-36s %12s %12s' % ('command', 'in-process', 'daemon'))
+    failed = False
+    for name in in_process:
+        print('%-36s %12.1f %12.1f' %
+              (name, statistics.median(in_process[name]),
+               statistics.median(daemon[name])))
+        if outputs[name] != expected[name]:
+            print('FAIL: output through the daemon differs for %s' % name)
+            failed = True
+    print('%d new connections for %d calls through the daemon' %
+          (connections, options.calls * len(COMMANDS)))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
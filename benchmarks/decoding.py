@@ -0,0 +1,90 @@
+import gzip
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from decoding import CHUNK_SIZE, decode_chunks, decompress  # noqa: E402
+from fake_clickup import Workload  # noqa: E402
+
+# Compares decoding a large task page the way responses used to be handled
+# (read everything, decode to str, json.loads) with decompressing and
+# decoding it while it is read.
+
+TASKS_PER_PAGE = 100
+DESCRIPTION_REPEAT = 20  # Inflates descriptions to roughly 700 KB per page
+RUNS = 20
+# Streamed decoding must stay under this fraction of the buffered peak.
+MEMORY_BUDGET = 0.65
+
+
+def task_page():
+    workload = Workload(tasks=TASKS_PER_PAGE)
+    tasks = []
+    for number in range(TASKS_PER_PAGE):
+        task = workload.task_json(1010101, number)
+        task['description'] *= DESCRIPTION_REPEAT
+        task['text_content'] *= DESCRIPTION_REPEAT
+        tasks.append(task)
+    return {'tasks': tasks}
+
+
+def socket_chunks(data: bytes):
+    stream = io.BytesIO(data)
+    return iter(lambda: stream.read(CHUNK_SIZE), b'')
+
+
+def buffered(raw: bytes, compressed: bytes):
+    # As make_api_request did: the body stays referenced by the response
+    # while its str copy is parsed.
+    body = b''.join(socket_chunks(raw))
+    text = body.decode()
+    return json.loads(text)
+
+
+def streamed(raw: bytes, compressed: bytes):
+    return decode_chunks(decompress(socket_chunks(compressed), 'gzip'))
+
+
+def measure(decode, raw: bytes, compressed: bytes):
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        decode(raw, compressed)
+    elapsed = (time.perf_counter() - start) / RUNS
+    tracemalloc.start()
+    decode(raw, compressed)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    page = task_page()
+    raw = json.dumps(page).encode()
+    compressed = gzip.compress(raw)
+    assert streamed(raw, compressed) == page
+    print('page: %d KB, %d KB gzipped' %
+          (len(raw) // 1024, len(compressed) // 1024))
+    results = {}
+    for decode in (buffered, streamed):
+        elapsed, peak = measure(decode, raw, compressed)
+        results[decode.__name__] = peak
+        print('%-10s %7.2f ms %8d KB peak' %
+              (decode.__name__, elapsed * 1000, peak // 1024))
+    ratio = results['streamed'] / results['buffered']
+    print('streamed peak is %.0f%% of buffered (budget %.0f%%)' %
+          (ratio * 100, MEMORY_BUDGET * 100))
+    if ratio > MEMORY_BUDGET:
+        print('FAIL: streamed decoding over memory budget')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
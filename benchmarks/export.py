@@ -0,0 +1,192 @@
+import argparse
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from fake_clickup import FakeClickUp, Workload
+
+# An export of a space that is killed again and again part way through, and
+# one that stops on server errors, each continued with --resume until it
+# finishes. The uninterrupted export must hold every task of the space
+# once, and the others must be byte for byte the same file.
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+SCRIPT = ("import sys; sys.argv = ['clicli'] + sys.argv[1:]; "
+          "from main import cli; cli()")
+
+CONFIG = {
+    'api-key': 'benchmark',
+    'team-id': '1',
+    'space-id': '101',
+    'user': '1',
+}
+
+
+def command(args):
+    return [sys.executable, '-c', SCRIPT, '--no-cache', 'export', *args]
+
+
+def checkpoint(filename: str):
+    try:
+        with open(filename + '.checkpoint') as file:
+            return json.load(file)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def space_task_ids(workload: Workload, space_id: int):
+    return Counter(task['id'] for list_id, list in workload.lists.items()
+                   if list['space'] == space_id
+                   for task in workload.list_tasks(list_id, {}))
+
+
+def killed_export(args, filename: str, env, kills: int, every: int):
+    # Kills the export each time its checkpoint has advanced by `every`
+    # tasks, then resumes it. Returns the number of runs.
+    runs = 0
+    while True:
+        runs += 1
+        process = subprocess.Popen(command(args),
+                                   cwd=SRC_DIR,
+                                   env=env,
+                                   stdout=subprocess.DEVNULL,
+                                   stderr=subprocess.DEVNULL)
+        start = (checkpoint(filename) or {}).get('tasks', 0)
+        while process.poll() is None:
+            state = checkpoint(filename)
+            if kills and state and state['tasks'] >= start + every:
+                process.send_signal(signal.SIGKILL)
+                process.wait()
+                kills -= 1
+                break
+            time.sleep(0.005)
+        if process.returncode == 0:
+            return runs
+        if process.returncode != -signal.SIGKILL:
+            raise SystemExit('clicli export %s failed' % ' '.join(args))
+        args = [filename, '--resume']
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Interrupt and resume exports against a fake server.')
+    parser.add_argument('--tasks',
+                        type=int,
+                        default=450,
+                        help='tasks in every list')
+    parser.add_argument('--kills', type=int, default=8)
+    parser.add_argument('--latency',
+                        type=float,
+                        default=20,
+                        help='milliseconds of server latency per request')
+    options = parser.parse_args()
+
+    workload = Workload(spaces=1, folders=2, lists=5, tasks=options.tasks)
+    server = FakeClickUp(workload, latency=options.latency / 1000).start()
+    # Killed exports leave requests whose answers can't be sent.
+    server.handle_error = lambda request, client_address: None
+    home = tempfile.mkdtemp()
+    failed = False
+
+    def check(condition, message):
+        nonlocal failed
+        if not condition:
+            print('FAIL: %s' % message)
+            failed = True
+
+    try:
+        with open(os.path.join(home, '.cliclirc'), 'w') as file:
+            json.dump(CONFIG, file)
+        env = {
+            key: value
+            for key, value in os.environ.items()
+            if not key.startswith('CLICKUP_') and not key.startswith('XDG_')
+        }
+        env.update(HOME=home, CLICKUP_API_URL=server.url)
+
+        for extension in ['ndjson', 'csv']:
+            clean = os.path.join(home, 'clean.%s' % extension)
+            args = [clean, '--space-id', '101', '--include-closed']
+            server.reset_stats()
+            start = time.perf_counter()
+            subprocess.run(command(args),
+                           cwd=SRC_DIR,
+                           env=env,
+                           check=True,
+                           capture_output=True)
+            clean_time = time.perf_counter() - start
+            clean_requests = server.stats['requests']
+            with open(clean, 'rb') as file:
+                expected = file.read()
+            lines = expected.count(b'\n')
+            if extension == 'ndjson':
+                tasks = lines
+                exported = Counter(
+                    json.loads(line)['id'] for line in expected.splitlines())
+                check(exported == space_task_ids(workload, 101),
+                      'the export lost or repeated tasks of the space')
+
+            killed = os.path.join(home, 'killed.%s' % extension)
+            server.reset_stats()
+            start = time.perf_counter()
+            runs = killed_export([killed, '--space-id', '101',
+                                  '--include-closed'], killed, env,
+                                 options.kills, lines // options.kills // 2)
+            killed_time = time.perf_counter() - start
+            with open(killed, 'rb') as file:
+                check(file.read() == expected,
+                      '%s export killed %s times differs from the '
+                      'uninterrupted one' % (extension, runs - 1))
+            check(not os.path.exists(killed + '.checkpoint'),
+                  'the checkpoint was left behind')
+            print('%-6s %5d lines  uninterrupted %5.2f s %4d requests  '
+                  '%d runs %5.2f s %4d requests' %
+                  (extension, lines, clean_time, clean_requests, runs,
+                   killed_time, server.stats['requests']))
+
+        # Every request failing stops the export with a hint to resume.
+        stopped = os.path.join(home, 'stopped.ndjson')
+        process = subprocess.Popen(command(
+            [stopped, '--space-id', '101', '--include-closed']),
+                                   cwd=SRC_DIR,
+                                   env=env,
+                                   stdout=subprocess.DEVNULL,
+                                   stderr=subprocess.PIPE,
+                                   text=True)
+        while (checkpoint(stopped) or {}).get('tasks', 0) < tasks // 3:
+            time.sleep(0.005)
+        server.error_rate = 1
+        error = process.communicate()[1]
+        server.error_rate = 0
+        check(process.returncode == 1 and '--resume' in error,
+              'the export did not stop with a hint to resume')
+        resumed = subprocess.run(command([stopped, '--resume']),
+                                 cwd=SRC_DIR,
+                                 env=env,
+                                 capture_output=True,
+                                 text=True)
+        check(resumed.returncode == 0 and
+              json.loads(resumed.stdout)['tasks'] == tasks,
+              'the resumed export failed')
+        with open(stopped, 'rb') as file, \
+                open(os.path.join(home, 'clean.ndjson'), 'rb') as clean:
+            check(file.read() == clean.read(),
+                  'the export resumed after server errors differs from the '
+                  'uninterrupted one')
+        print('stopped on server errors and resumed: %s' %
+              ('ok' if resumed.returncode == 0 else 'failed'))
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(home, ignore_errors=True)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,680 @@
+import argparse
+import gzip
+import json
+import random
+import re
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# A local stand-in for the parts of the ClickUp API that clicli uses, serving
+# a synthetic workspace. Point clicli at it with
+#
+#     python benchmarks/fake_clickup.py --port 8080 --tasks 10000
+#     CLICKUP_API_URL=http://127.0.0.1:8080 clicli tasks list 1010101 --all
+#
+# IDs encode their parents: team 1, space 101, folder 10101, list 1010101.
+# Folderless lists are numbered from 90 within their space, e.g. 10190.
+
+BASE_PATH = '/api/v2/'
+PAGE_SIZE = 100
+START = 1577836800000  # 2020-01-01
+DAY = 24 * 60 * 60 * 1000
+STATUSES = ['to do', 'in progress', 'review', 'done']
+FOLDERLESS = 90
+ORDER_FIELDS = {
+    'id': 'id',
+    'created': 'date_created',
+    'updated': 'date_updated',
+    'due_date': 'due_date',
+}
+
+
+def items(collection: dict):
+    # A snapshot, since requests that create items may run concurrently.
+    return list(collection.items())
+
+
+class Workload:
+    def __init__(self,
+                 teams: int = 1,
+                 spaces: int = 3,
+                 folders: int = 4,
+                 lists: int = 5,
+                 folderless_lists: int = 2,
+                 tasks: int = 200):
+        # `tasks` is the number of tasks in every list. Tasks are generated
+        # on demand, so large lists cost nothing until they are paged.
+        self.tasks = tasks
+        self.teams = {}
+        self.spaces = {}
+        self.folders = {}
+        self.lists = {}
+        self.created_tasks = {}
+        # Tasks changed through PUT task/<id>, by list ID and task ID.
+        self.changed_tasks = {}
+        self._next_id = 10**9
+        self._lock = threading.Lock()
+        for t in range(1, teams + 1):
+            self.teams[t] = {'id': str(t), 'name': 'Team %s' % t}
+            for s in range(1, spaces + 1):
+                space_id = t * 100 + s
+                self.spaces[space_id] = {
+                    'id': str(space_id),
+                    'name': 'Space %s' % s,
+                    'team': t
+                }
+                for f in range(1, folders + 1):
+                    folder_id = space_id * 100 + f
+                    self.folders[folder_id] = {
+                        'id': str(folder_id),
+                        'name': 'Folder %s' % f,
+                        'space': space_id
+                    }
+                    for n in range(1, lists + 1):
+                        self.add_list(folder_id * 100 + n, 'List %s' % n,
+                                      space_id, folder_id)
+                for n in range(folderless_lists):
+                    self.add_list(space_id * 100 + FOLDERLESS + n,
+                                  'Loose %s' % (n + 1), space_id, None)
+
+    def new_id(self):
+        with self._lock:
+            self._next_id += 1
+            return self._next_id
+
+    def add_list(self, list_id: int, name: str, space_id: int, folder_id):
+        self.lists[list_id] = {
+            'id': str(list_id),
+            'name': name,
+            'space': space_id,
+            'folder': folder_id,
+            'tasks': self.tasks
+        }
+        return self.lists[list_id]
+
+    def space_json(self, space_id: int):
+        space = self.spaces[space_id]
+        return {
+            'id': space['id'],
+            'name': space['name'],
+            'private': False,
+            'statuses': [{
+                'status': status,
+                'type': 'closed' if status == 'done' else 'custom'
+            } for status in STATUSES],
+            'archived': False,
+        }
+
+    def list_json(self, list_id: int):
+        list = self.lists[list_id]
+        folder = self.folders.get(list['folder'])
+        return {
+            'id': list['id'],
+            'name': list['name'],
+            'orderindex': list_id % 100,
+            'content': '',
+            'status': None,
+            'priority': None,
+            'assignee': None,
+            'task_count': list['tasks'],
+            'due_date': None,
+            'start_date': None,
+            'folder': {
+                'id': folder['id'] if folder else str(list['space']),
+                'name': folder['name'] if folder else 'hidden',
+                'hidden': folder is None,
+                'access': True
+            },
+            'space': {
+                'id': str(list['space']),
+                'name': self.spaces[list['space']]['name'],
+                'access': True
+            },
+            'archived': False,
+            'permission_level': 'create',
+        }
+
+    def folder_json(self, folder_id: int):
+        folder = self.folders[folder_id]
+        lists = [
+            self.list_json(list_id) for list_id, list in items(self.lists)
+            if list['folder'] == folder_id
+        ]
+        return {
+            'id': folder['id'],
+            'name': folder['name'],
+            'orderindex': folder_id % 100,
+            'override_statuses': False,
+            'hidden': False,
+            'space': {
+                'id': str(folder['space']),
+                'name': self.spaces[folder['space']]['name'],
+                'access': True
+            },
+            'task_count': str(sum(list['task_count'] for list in lists)),
+            'archived': False,
+            'lists': lists,
+        }
+
+    def task_json(self, list_id: int, number: int):
+        # Deterministic per task, so repeated pages are identical.
+        rng = random.Random(list_id * 1000003 + number)
+        list = self.lists[list_id]
+        status = rng.choice(STATUSES)
+        created = START + rng.randrange(365 * DAY)
+        return {
+            'id': '%st%s' % (list_id, number),
+            'name': 'Task %s %s' % (number, rng.choice(['api', 'ui',
+                                                         'docs'])),
+            'text_content': 'Synthetic task %s. ' % number * 8,
+            'description': 'Synthetic task %s. ' % number * 8,
+            'status': {
+                'status': status,
+                'color': '#d3d3d3',
+                'type': 'closed' if status == 'done' else 'custom',
+                'orderindex': STATUSES.index(status)
+            },
+            'orderindex': '%s.0000' % number,
+            'date_created': str(created),
+            'date_updated': str(created + rng.randrange(30 * DAY)),
+            'date_closed': str(created + DAY) if status == 'done' else None,
+            'archived': False,
+            'creator': {
+                'id': 1,
+                'username': 'creator',
+                'color': '#000000',
+                'email': 'creator@example.com'
+            },
+            'assignees': [{
+                'id': rng.randrange(20),
+                'username': 'user',
+                'email': 'user@example.com'
+            }],
+            'watchers': [],
+            'checklists': [],
+            'tags': [],
+            'parent': None,
+            'priority': None,
+            'due_date': str(created + rng.randrange(60 * DAY)),
+            'start_date': None,
+            'points': None,
+            'time_estimate': None,
+            'custom_fields': [],
+            'dependencies': [],
+            'linked_tasks': [],
+            'team_id': '1',
+            'url': 'https://app.clickup.com/t/%st%s' % (list_id, number),
+            'list': {
+                'id': list['id'],
+                'name': list['name'],
+                'access': True
+            },
+            'project': {
+                'id': str(list['folder'] or list['space']),
+                'hidden': list['folder'] is None,
+                'access': True
+            },
+            'folder': {
+                'id': str(list['folder'] or list['space']),
+                'hidden': list['folder'] is None,
+                'access': True
+            },
+            'space': {
+                'id': str(list['space'])
+            },
+        }
+
+    def task(self, list_id: int, number: int):
+        changed = self.changed_tasks.get(list_id, {})
+        return changed.get('%st%s' % (list_id, number)) or \
+            self.task_json(list_id, number)
+
+    def update_task(self, task_id: str, changes: dict):
+        if task_id in self.created_tasks:
+            task = dict(self.created_tasks[task_id])
+            list_id = int(task['list']['id'])
+        else:
+            list_id, number = task_id.split('t')
+            list_id = int(list_id)
+            task = dict(self.task(list_id, int(number)))
+        now = str(int(time.time() * 1000))
+        if 'name' in changes:
+            task['name'] = changes['name']
+        if 'status' in changes:
+            task['status'] = dict(task['status'],
+                                  status=changes['status'],
+                                  type='closed' if changes['status'] == 'done'
+                                  else 'custom')
+            task['date_closed'] = now if changes['status'] == 'done' else None
+        task['date_updated'] = now
+        with self._lock:
+            self.changed_tasks.setdefault(list_id, {})[task_id] = task
+            if task_id in self.created_tasks:
+                self.created_tasks[task_id] = task
+        return task
+
+    def list_tasks(self, list_id: int, query: dict):
+        # Every task of a list matching the query, in the requested order.
+        if query.get('archived') == 'true':
+            return []
+        count = self.lists[list_id]['tasks']
+        updated_after = int(query.get('date_updated_gt') or 0)
+        created_after = int(query.get('date_created_gt') or 0)
+        changed = items(self.changed_tasks.get(list_id, {}))
+        # Generated tasks were all last updated within 395 days of START,
+        # so later only changed and created tasks can match.
+        if updated_after < START + 395 * DAY:
+            candidates = [
+                self.task(list_id, number) for number in range(count)
+            ] + [task for task_id, task in changed if task_id.startswith('new')]
+        else:
+            candidates = [task for _, task in changed]
+        return order_tasks([
+            task for task in candidates
+            if int(task['date_updated']) > updated_after and
+            int(task['date_created']) > created_after
+        ], query)
+
+    def task_page(self, list_id: int, page: int, query: dict):
+        # Without a filter or order, tasks are served oldest number first,
+        # which is enough for paging.
+        if query.get('date_updated_gt') or query.get('date_created_gt') or \
+                query.get('order_by'):
+            return self.list_tasks(list_id,
+                                   query)[page * PAGE_SIZE:(page + 1) *
+                                          PAGE_SIZE]
+        if query.get('archived') == 'true':
+            return []
+        count = self.lists[list_id]['tasks']
+        return [
+            self.task(list_id, number)
+            for number in range(page * PAGE_SIZE,
+                                min(count, (page + 1) * PAGE_SIZE))
+        ]
+
+    def team_task_page(self, team_id: int, page: int, query: dict):
+        list_ids = [
+            list_id for list_id, list in items(self.lists)
+            if self.spaces[list['space']]['team'] == team_id
+        ]
+        if query.get('date_updated_gt') or query.get('date_created_gt') or \
+                query.get('order_by'):
+            tasks = order_tasks([
+                task for list_id in list_ids
+                for task in self.list_tasks(list_id, dict(query,
+                                                          order_by=None))
+            ], query)
+            return tasks[page * PAGE_SIZE:(page + 1) * PAGE_SIZE]
+        # The lists' tasks one after another, generating only this page.
+        tasks = []
+        skip = page * PAGE_SIZE
+        for list_id in list_ids:
+            count = 0 if query.get('archived') == 'true' else \
+                self.lists[list_id]['tasks']
+            start = min(skip, count)
+            skip -= start
+            for number in range(start, count):
+                if len(tasks) == PAGE_SIZE:
+                    return tasks
+                tasks.append(self.task(list_id, number))
+        return tasks
+
+
+def order_tasks(tasks, query: dict):
+    # As ClickUp's order_by: largest (newest) first, smallest first with
+    # reverse=true, and tasks missing the field last either way.
+    field = ORDER_FIELDS.get(query.get('order_by'))
+    if field is None:
+        return tasks
+
+    def key(task):
+        return task[field] if field == 'id' else int(task[field])
+
+    present = [task for task in tasks if task.get(field) is not None]
+    missing = [task for task in tasks if task.get(field) is None]
+    return sorted(present, key=key,
+                  reverse=query.get('reverse') != 'true') + missing
+
+
+class FakeClickUp(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self,
+                 workload: Workload,
+                 port: int = 0,
+                 latency: float = 0,
+                 error_rate: float = 0,
+                 throttle_rate: float = 0,
+                 rate_limit: int = 10000,
+                 compress: bool = True,
+                 seed: int = 0):
+        # latency is in seconds per request. error_rate and throttle_rate are
+        # the probability of answering with a 500 or a 429 instead. rate_limit
+        # is the number of requests allowed per minute, as advertised in the
+        # X-RateLimit-* headers. With compress, responses are gzipped for
+        # clients that accept it.
+        super().__init__(('127.0.0.1', port), Handler)
+        self.workload = workload
+        self.latency = latency
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.rate_limit = rate_limit
+        self.compress = compress
+        self.random = random.Random(seed)
+        self.stats = {
+            'requests': 0,
+            'connections': 0,
+            'bytes': 0,
+            'statuses': {}
+        }
+        self.window = (0, 0)
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        return 'http://%s:%s' % self.server_address[:2]
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return self
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {
+            'requests': 0,
+            'connections': 0,
+            'bytes': 0,
+            'statuses': {}
+        }
+
+    def admit(self):
+        # Returns (status, rate limit headers) for the next request.
+        with self._lock:
+            self.stats['requests'] += 1
+            window_start, used = self.window
+            now = time.time()
+            if now - window_start >= 60:
+                window_start, used = now, 0
+            used += 1
+            self.window = (window_start, used)
+            headers = {
+                'X-RateLimit-Limit': str(self.rate_limit),
+                'X-RateLimit-Remaining': str(max(0, self.rate_limit - used)),
+                'X-RateLimit-Reset': str(int(window_start + 60)),
+            }
+            roll = self.random.random()
+            if used > self.rate_limit:
+                status = 429
+            elif roll < self.throttle_rate:
+                status = 429
+                headers['Retry-After'] = '0'
+            elif roll < self.throttle_rate + self.error_rate:
+                status = 500
+            else:
+                status = 200
+            return status, headers
+
+    def count(self, status: int, size: int):
+        with self._lock:
+            self.stats['bytes'] += size
+            statuses = self.stats['statuses']
+            statuses[status] = statuses.get(status, 0) + 1
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        # Headers and body go out in separate writes; without this, Nagle's
+        # algorithm holds back small (e.g. gzipped) bodies.
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self.server._lock:
+            self.server.stats['connections'] += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def send(self, status: int, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        if self.server.compress and 'gzip' in self.headers.get(
+                'Accept-Encoding', ''):
+            data = gzip.compress(data, compresslevel=6)
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+        self.server.count(status, len(data))
+
+    def handle_request(self, method: str):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length) or b'{}') if length else {}
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        status, headers = self.server.admit()
+        if status == 429:
+            return self.send(429, {'err': 'Rate limit reached',
+                                   'ECODE': 'APP_002'}, headers)
+        if status == 500:
+            return self.send(500, {'err': 'Internal error',
+                                   'ECODE': 'APP_001'}, headers)
+        url = urlsplit(self.path)
+        if not url.path.startswith(BASE_PATH):
+            return self.send(404, {'err': 'Route not found',
+                                   'ECODE': 'APP_001'}, headers)
+        query = {
+            key: values[-1]
+            for key, values in parse_qs(url.query).items()
+        }
+        try:
+            status, response = route(self.server.workload, method,
+                                     url.path[len(BASE_PATH):], query, body)
+        except KeyError:
+            status, response = 404, {'err': 'Not found', 'ECODE': 'ITEM_013'}
+        self.send(status, response, headers)
+
+    def do_GET(self):
+        self.handle_request('GET')
+
+    def do_POST(self):
+        self.handle_request('POST')
+
+    def do_PUT(self):
+        self.handle_request('PUT')
+
+    def do_DELETE(self):
+        self.handle_request('DELETE')
+
+
+def route(workload: Workload, method: str, path: str, query: dict,
+          body: dict):
+    archived = query.get('archived') == 'true'
+    match = re.fullmatch(r'(\w+)(?:/(\d+|[\w]+))?(?:/(\w+))?', path)
+    if match is None:
+        raise KeyError(path)
+    kind, id, child = match.groups()
+    id = int(id) if id and id.isdigit() else id
+
+    if (method, kind, child) == ('GET', 'team', None):
+        return 200, {
+            'teams': [{
+                'id': team['id'],
+                'name': team['name'],
+                'color': '#000000',
+                'members': []
+            } for team in workload.teams.values()]
+        }
+    if (method, kind, child) == ('GET', 'team', 'task'):
+        workload.teams[id]
+        return 200, {
+            'tasks':
+            workload.team_task_page(id, int(query.get('page') or 0), query)
+        }
+    if (method, kind, child) == ('GET', 'team', 'space'):
+        workload.teams[id]
+        return 200, {
+            'spaces': [] if archived else [
+                workload.space_json(space_id)
+                for space_id, space in items(workload.spaces)
+                if space['team'] == id
+            ]
+        }
+    if (method, kind, child) == ('GET', 'space', None):
+        return 200, workload.space_json(id)
+    if (method, kind, child) == ('GET', 'space', 'folder'):
+        workload.spaces[id]
+        return 200, {
+            'folders': [] if archived else [
+                workload.folder_json(folder_id)
+                for folder_id, folder in items(workload.folders)
+                if folder['space'] == id
+            ]
+        }
+    if (method, kind, child) == ('GET', 'space', 'list'):
+        workload.spaces[id]
+        return 200, {
+            'lists': [] if archived else [
+                workload.list_json(list_id)
+                for list_id, list in items(workload.lists)
+                if list['space'] == id and list['folder'] is None
+            ]
+        }
+    if (method, kind, child) == ('GET', 'folder', None):
+        return 200, workload.folder_json(id)
+    if (method, kind, child) == ('GET', 'folder', 'list'):
+        workload.folders[id]
+        return 200, {
+            'lists': [] if archived else [
+                workload.list_json(list_id)
+                for list_id, list in items(workload.lists)
+                if list['folder'] == id
+            ]
+        }
+    if (method, kind, child) == ('GET', 'list', None):
+        return 200, workload.list_json(id)
+    if (method, kind, child) == ('GET', 'list', 'task'):
+        workload.lists[id]
+        return 200, {
+            'tasks': workload.task_page(id, int(query.get('page') or 0),
+                                        query)
+        }
+    if (method, kind, child) == ('GET', 'task', None):
+        if id in workload.created_tasks:
+            return 200, workload.created_tasks[id]
+        list_id, number = str(id).split('t')
+        return 200, workload.task(int(list_id), int(number))
+
+    if method == 'POST' and (kind, child) == ('space', 'folder'):
+        workload.spaces[id]
+        folder_id = workload.new_id()
+        workload.folders[folder_id] = {
+            'id': str(folder_id),
+            'name': body.get('name'),
+            'space': id
+        }
+        return 200, workload.folder_json(folder_id)
+    if method == 'POST' and (kind, child) in [('folder', 'list'),
+                                              ('space', 'list')]:
+        if kind == 'folder':
+            space_id, folder_id = workload.folders[id]['space'], id
+        else:
+            workload.spaces[id]
+            space_id, folder_id = id, None
+        list_id = workload.new_id()
+        workload.add_list(list_id, body.get('name'), space_id, folder_id)
+        workload.lists[list_id]['tasks'] = 0
+        return 200, workload.list_json(list_id)
+    if method == 'POST' and (kind, child) == ('list', 'task'):
+        task = {
+            'id': 'new%s' % workload.new_id(),
+            'name': body.get('name'),
+            'status': {
+                'status': body.get('status') or STATUSES[0],
+                'type': 'custom'
+            },
+            'list': {
+                'id': str(id)
+            },
+            'date_created': str(int(time.time() * 1000)),
+            'date_closed': None,
+        }
+        task['date_updated'] = task['date_created']
+        workload.lists[id]
+        workload.created_tasks[task['id']] = task
+        workload.changed_tasks.setdefault(id, {})[task['id']] = task
+        return 200, task
+    if method == 'PUT' and (kind, child) == ('task', None):
+        return 200, workload.update_task(str(id), body)
+    if method == 'PUT' and child is None and kind in ('folder', 'list'):
+        collection = workload.folders if kind == 'folder' else workload.lists
+        if 'name' in body:
+            collection[id]['name'] = body['name']
+        return 200, (workload.folder_json(id)
+                     if kind == 'folder' else workload.list_json(id))
+    if method == 'DELETE' and child is None and kind in ('folder', 'list'):
+        collection = workload.folders if kind == 'folder' else workload.lists
+        del collection[id]
+        return 200, {}
+    raise KeyError(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Serve a synthetic ClickUp workspace for benchmarks.')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--teams', type=int, default=1)
+    parser.add_argument('--spaces', type=int, default=3)
+    parser.add_argument('--folders', type=int, default=4)
+    parser.add_argument('--lists', type=int, default=5)
+    parser.add_argument('--tasks',
+                        type=int,
+                        default=200,
+                        help='tasks in every list')
+    parser.add_argument('--latency',
+                        type=float,
+                        default=0,
+                        help='milliseconds added to every response')
+    parser.add_argument('--error-rate',
+                        type=float,
+                        default=0,
+                        help='fraction of requests answered with a 500')
+    parser.add_argument('--throttle-rate',
+                        type=float,
+                        default=0,
+                        help='fraction of requests answered with a 429')
+    parser.add_argument('--rate-limit',
+                        type=int,
+                        default=10000,
+                        help='requests allowed per minute')
+    parser.add_argument('--no-compress',
+                        action='store_true',
+                        help='never gzip responses')
+    args = parser.parse_args()
+    workload = Workload(args.teams, args.spaces, args.folders, args.lists,
+                        tasks=args.tasks)
+    server = FakeClickUp(workload,
+                         port=args.port,
+                         latency=args.latency / 1000,
+                         error_rate=args.error_rate,
+                         throttle_rate=args.throttle_rate,
+                         rate_limit=args.rate_limit,
+                         compress=not args.no_compress)
+    print('Serving %s lists on %s' % (len(workload.lists), server.url),
+          file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
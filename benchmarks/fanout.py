@@ -0,0 +1,118 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from fake_clickup import FakeClickUp, Workload, order_tasks
+
+# `tasks list --space-id` against one `tasks list --all` per list of the
+# space, run one after another as a script would. Both must return the same
+# tasks, and with --order the merged stream must be sorted like the server
+# sorts a single list. Without --order, pages come in the order they arrive.
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+SCRIPT = ("import sys; sys.argv = ['clicli'] + sys.argv[1:]; "
+          "from main import cli; cli()")
+
+CONFIG = {
+    'api-key': 'benchmark',
+    'team-id': '1',
+    'space-id': '101',
+    'user': '1',
+}
+
+
+def clicli(args, env):
+    result = subprocess.run(
+        [sys.executable, '-c', SCRIPT, '--no-cache', *args, '--output',
+         'ndjson'],
+        cwd=SRC_DIR,
+        env=env,
+        capture_output=True,
+        check=True)
+    return [json.loads(line) for line in result.stdout.splitlines()]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compare a space-wide tasks list with a loop over its '
+        'lists.')
+    parser.add_argument('--tasks',
+                        type=int,
+                        default=500,
+                        help='tasks in every list')
+    parser.add_argument('--latency',
+                        type=float,
+                        default=50,
+                        help='milliseconds of server latency per request')
+    options = parser.parse_args()
+
+    workload = Workload(spaces=1, tasks=options.tasks)
+    # In the order clicli enumerates them: lists in folders, then the
+    # folderless ones.
+    space_lists = [
+        str(list_id) for list_id in sorted(
+            workload.lists,
+            key=lambda id: (workload.lists[id]['folder'] is None, id))
+        if workload.lists[list_id]['space'] == 101
+    ]
+    server = FakeClickUp(workload, latency=options.latency / 1000).start()
+    home = tempfile.mkdtemp()
+    failed = False
+    try:
+        with open(os.path.join(home, '.cliclirc'), 'w') as file:
+            json.dump(CONFIG, file)
+        env = {
+            key: value
+            for key, value in os.environ.items()
+            if not key.startswith('CLICKUP_') and not key.startswith('XDG_')
+        }
+        env.update(HOME=home, CLICKUP_API_URL=server.url)
+        # Warms the bytecode cache.
+        clicli(['tasks', 'list', '1010101'], env)
+
+        for order in [None, 'created', 'due_date']:
+            for reverse in [False, True] if order else [False]:
+                flags = ['--order', order] if order else []
+                flags += ['--reverse'] if reverse else []
+                start = time.perf_counter()
+                serial = []
+                for list_id in space_lists:
+                    serial += clicli(['tasks', 'list', list_id, '--all'] +
+                                     flags, env)
+                serial_time = time.perf_counter() - start
+                start = time.perf_counter()
+                merged = clicli(['tasks', 'list', '--space-id', '101'] + flags,
+                                env)
+                merged_time = time.perf_counter() - start
+                expected = order_tasks(
+                    serial, {
+                        'order_by': order,
+                        'reverse': 'true' if reverse else 'false'
+                    })
+                name = ' '.join(flags) or 'no order'
+                print('%-22s %3d lists %6d tasks: serial %6.2f s, '
+                      '--space-id %6.2f s' %
+                      (name, len(space_lists), len(merged), serial_time,
+                       merged_time))
+                if sorted(task['id'] for task in merged) != \
+                        sorted(task['id'] for task in serial):
+                    print('FAIL: --space-id returned different tasks')
+                    failed = True
+                elif order and [task['id'] for task in merged] != \
+                        [task['id'] for task in expected]:
+                    print('FAIL: --space-id returned tasks out of order')
+                    failed = True
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(home, ignore_errors=True)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
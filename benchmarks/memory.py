@@ -0,0 +1,102 @@
+import argparse
+import gc
+import json
+import os
+import shutil
+import sys
+import tempfile
+import tracemalloc
+
+from fake_clickup import Workload
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from mirror import Mirror  # noqa: E402
+
+# The memory a `tasks list --local` result takes while it is held: the tasks
+# of a synced mirror read as decoded dicts, as the mirror used to return
+# them, against the slotted Task models it returns now. Both must describe
+# the same tasks, and the models must stay well under half the size.
+
+MAX_RATIO = 0.5
+
+
+def traced(build):
+    # Returns what build() returned and the bytes it still holds.
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = build()
+        gc.collect()
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return result, size
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Compare the per-task memory of dicts and Task models.')
+    parser.add_argument('--tasks',
+                        type=int,
+                        default=1000,
+                        help='tasks in every list')
+    parser.add_argument('--lists', type=int, default=20)
+    options = parser.parse_args()
+
+    workload = Workload(spaces=1,
+                        folders=1,
+                        lists=options.lists,
+                        folderless_lists=0,
+                        tasks=options.tasks)
+    directory = tempfile.mkdtemp()
+    failed = False
+    try:
+        mirror = Mirror(os.path.join(directory, 'mirror.db'))
+        for list_id in workload.lists:
+            mirror.store_tasks(list_id, [
+                workload.task_json(list_id, number)
+                for number in range(options.tasks)
+            ])
+        query = dict(include_closed=True, subtasks=True)
+
+        def dicts():
+            # The mirror's rows decoded the way it did before the models.
+            with mirror._lock:
+                return [
+                    json.loads(row[0]) for row in mirror._db.execute(
+                        'SELECT data FROM tasks ORDER BY date_created DESC, '
+                        'id DESC')
+                ]
+
+        before, before_size = traced(dicts)
+        after, after_size = traced(lambda: mirror.query_tasks(**query))
+        count = len(before)
+        print('%d tasks' % count)
+        print('%-28s %12s %10s' % ('', 'bytes', 'per task'))
+        print('%-28s %12d %10.0f' % ('dicts', before_size, before_size / count))
+        print('%-28s %12d %10.0f' % ('Task models', after_size,
+                                     after_size / count))
+        print('ratio %.2f' % (after_size / before_size))
+
+        if len(after) != count or \
+                [task.to_dict() for task in after] != before:
+            print('FAIL: the models do not decode to the same tasks')
+            failed = True
+        elif any(task.description != data['description'] or
+                 task.status != data['status']['status']
+                 for task, data in zip(after, before)):
+            print('FAIL: a field of the models differs from the dicts')
+            failed = True
+        if after_size > before_size * MAX_RATIO:
+            print('FAIL: models take more than %.0f%% of the dicts' %
+                  (MAX_RATIO * 100))
+            failed = True
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
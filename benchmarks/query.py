@@ -0,0 +1,102 @@
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from mirror import Mirror  # noqa: E402
+
+TASKS = 50000
+LISTS = 50
+USERS = 20
+STATUSES = ['to do', 'in progress', 'review', 'blocked', 'done']
+QUERY_BUDGET_MS = 100
+RUNS = 7
+START = 1577836800000  # 2020-01-01
+DAY = 24 * 60 * 60 * 1000
+
+
+def synthetic_task(number: int, rng: random.Random):
+    created = START + rng.randrange(365 * DAY)
+    status = rng.choice(STATUSES)
+    return {
+        'id': 'task%s' % number,
+        'name': 'Task %s %s' % (number, rng.choice(['api', 'ui', 'docs'])),
+        'list': {
+            'id': str(number % LISTS)
+        },
+        'parent': None if rng.random() > 0.1 else 'task%s' % (number - 1),
+        'status': {
+            'status': status,
+            'type': 'closed' if status == 'done' else 'custom'
+        },
+        'assignees': [{
+            'id': rng.randrange(USERS)
+        } for _ in range(rng.randrange(3))],
+        'date_created': str(created),
+        'date_updated': str(created + rng.randrange(30 * DAY)),
+        'date_closed': None,
+        'due_date':
+        str(created + rng.randrange(60 * DAY)) if rng.random() > 0.3 else None,
+        'description': 'x' * rng.randrange(400),
+    }
+
+
+QUERIES = [
+    ('one list, default filters', dict(list_ids=['7'])),
+    ('status across all lists', dict(statuses='blocked', limit=100)),
+    ('assignee across all lists', dict(assignees='3', limit=100)),
+    ('due date range, ordered by due date',
+     dict(due_date_gt=datetime(2020, 3, 1),
+          due_date_lt=datetime(2020, 3, 8),
+          order='due_date')),
+    ('compound where', dict(where='(status = review or status = blocked) '
+                            'and assignee = 5 and name ~ api',
+                            include_closed=True)),
+    ('updated since, newest 50',
+     dict(date_updated_gt=datetime(2020, 11, 1), order='updated', limit=50)),
+]
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    mirror = Mirror(os.path.join(directory, 'mirror.db'))
+    rng = random.Random(42)
+    start = time.perf_counter()
+    tasks = [synthetic_task(number, rng) for number in range(TASKS)]
+    by_list = {}
+    for task in tasks:
+        by_list.setdefault(task['list']['id'], []).append(task)
+    for list_id, list_tasks in by_list.items():
+        mirror.store_tasks(list_id, list_tasks)
+    mirror.analyze()  # as sync does after storing tasks
+    print('Loaded %s tasks in %.2f s (%s)' %
+          (TASKS, time.perf_counter() - start, mirror.filename))
+
+    failed = False
+    results = {}
+    for name, filters in QUERIES:
+        timings = []
+        for _ in range(RUNS):
+            start = time.perf_counter()
+            found = mirror.query_tasks(**filters)
+            timings.append((time.perf_counter() - start) * 1000)
+        median = statistics.median(timings)
+        results[name] = {'ms': round(median, 2), 'tasks': len(found)}
+        over = median > QUERY_BUDGET_MS
+        failed = failed or over
+        print('%-40s %7.2f ms %6s tasks%s' %
+              (name, median, len(found), '  OVER BUDGET' if over else ''))
+    if '--json' in sys.argv:
+        print(json.dumps(results, indent=4, sort_keys=True))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
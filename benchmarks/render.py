@@ -0,0 +1,64 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import output  # noqa: E402
+from fake_clickup import PAGE_SIZE, Workload  # noqa: E402
+
+# Render throughput of every --output format for `tasks list --all`, with
+# the standard library json module and, when it is installed, orjson.
+
+TASKS = 10000
+RUNS = 3
+
+
+def pages():
+    workload = Workload(lists=1, tasks=TASKS)
+    return [{
+        'tasks': workload.task_page(1010101, page, {})
+    } for page in range(TASKS // PAGE_SIZE)]
+
+
+def render(task_pages, format: str):
+    renderer = output.PageRenderer('tasks', format)
+    size = 0
+    for page in task_pages:
+        size += len(renderer.render(page['tasks']))
+    return size + len(renderer.finish())
+
+
+def main():
+    task_pages = pages()
+    installed = output.orjson
+    backends = [('json', None)] + ([('orjson', installed)] if installed else [])
+    print('%d tasks, best of %d runs' % (TASKS, RUNS))
+    print('%-8s %-8s %10s %10s %10s' %
+          ('format', 'backend', 'ms', 'MB', 'MB/s'))
+    try:
+        for format in output.FORMATS:
+            for name, backend in backends:
+                output.orjson = backend
+                timings = []
+                for _ in range(RUNS):
+                    start = time.perf_counter()
+                    size = render(task_pages, format)
+                    timings.append(time.perf_counter() - start)
+                best = min(timings)
+                print('%-8s %-8s %10.1f %10.2f %10.1f' %
+                      (format, name, best * 1000, size / 1e6,
+                       size / 1e6 / best))
+                if format == 'json':
+                    # Indented output always uses the standard library.
+                    break
+    finally:
+        output.orjson = installed
+    if not installed:
+        print('orjson is not installed; only the standard library was timed')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+# Cold start budget for a command that needs no network access, measured as
+# the median wall time of a fresh interpreter running it.
+STARTUP_BUDGET_MS = 100
+RUNS = 15
+
+# Modules that only commands talking to the API should import.
+FORBIDDEN_MODULES = ['api', 'http.client', 'ssl', 'sqlite3']
+
+SCRIPT = ("import sys; sys.argv = ['clicli'] + sys.argv[1:]; "
+          "from main import cli; cli()")
+
+
+def run(args, env, extra_flags=()):
+    return subprocess.run([sys.executable, *extra_flags, '-c', SCRIPT, *args],
+                          cwd=SRC_DIR,
+                          env=env,
+                          capture_output=True,
+                          text=True)
+
+
+def imported_modules(args, env):
+    result = run(args, env, extra_flags=('-X', 'importtime'))
+    modules = []
+    for line in result.stderr.splitlines():
+        match = re.match(r'import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)',
+                         line)
+        if match:
+            modules.append(
+                (match.group(4), int(match.group(1)), int(match.group(2))))
+    return modules
+
+
+def main():
+    home = tempfile.mkdtemp()
+    with open(os.path.join(home, '.cliclirc'), 'w') as file:
+        file.write('{"user": "1"}')
+    env = dict(os.environ, HOME=home)
+    args = ['config', 'get', 'user']
+
+    # Warm the bytecode cache so compilation isn't measured.
+    run(args, env)
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        run(args, env)
+        timings.append((time.perf_counter() - start) * 1000)
+    median = statistics.median(timings)
+
+    modules = imported_modules(args, env)
+    names = {name for name, _, _ in modules}
+    forbidden = [name for name in FORBIDDEN_MODULES if name in names]
+    heaviest = sorted(modules, key=lambda module: module[1], reverse=True)
+
+    print('clicli %s: median %.1f ms over %s runs (budget %s ms)' %
+          (' '.join(args), median, RUNS, STARTUP_BUDGET_MS))
+    print('Heaviest imports (self time):')
+    for name, self_us, cumulative_us in heaviest[:10]:
+        print('  %-30s %7.1f ms (cumulative %.1f ms)' %
+              (name, self_us / 1000, cumulative_us / 1000))
+
+    failed = False
+    if forbidden:
+        print('FAIL: imported %s' % ', '.join(forbidden))
+        failed = True
+    if median > STARTUP_BUDGET_MS:
+        print('FAIL: cold start over budget')
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
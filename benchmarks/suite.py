@@ -0,0 +1,254 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from fake_clickup import FakeClickUp, Workload
+
+# End-to-end benchmarks: each scenario runs clicli in a fresh interpreter
+# against a local fake ClickUp server and records wall time, the number of
+# requests and response bytes the server sent and the peak RSS of the clicli
+# process.
+#
+#     python benchmarks/suite.py            compare with baseline.json
+#     python benchmarks/suite.py --update   record a new baseline
+#
+# Request counts are deterministic and must not grow. Wall time, bytes and
+# memory may grow by --tolerance before a scenario counts as a regression.
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             'baseline.json')
+
+SCRIPT = ("import sys; sys.argv = ['clicli'] + sys.argv[1:]; "
+          "from main import cli; cli()")
+
+CONFIG = {
+    'api-key': 'benchmark',
+    'team-id': '1',
+    'space-id': '101',
+    'user': '1',
+}
+BULK_CREATES = 200
+
+# name: (setup commands, measured command). Setup runs unmeasured against the
+# same home directory, e.g. to warm the name index.
+SCENARIOS = {
+    'cold-start': ([], ['config', 'get', 'user']),
+    'tasks-list-all': ([], [
+        '--no-cache', 'tasks', 'list', '1010101', '--all', '--output',
+        'ndjson'
+    ]),
+    'name-lookup-cold': ([], ['--no-cache', 'lists', 'get', 'List 3', '-f',
+                              '10101']),
+    'name-lookup-warm': ([['--no-cache', 'lists', 'list', '-f', '10101']],
+                         ['--no-cache', 'lists', 'get', 'List 3', '-f',
+                          '10101']),
+    'hierarchy-walk': ([], ['--no-cache', 'tree']),
+    'bulk-create': ([], ['--no-cache', 'batch', '{operations}']),
+}
+
+
+def write_operations(home: str):
+    filename = os.path.join(home, 'operations.ndjson')
+    with open(filename, 'w') as file:
+        for number in range(BULK_CREATES):
+            file.write(
+                json.dumps({
+                    'op': 'lists.create',
+                    'args': {
+                        'name': 'Bulk %s' % number,
+                        'folder_id': '10101'
+                    }
+                }) + '\n')
+    return filename
+
+
+def run(args, env):
+    # Returns (wall seconds, exit code, peak RSS in KiB) for one clicli run.
+    with tempfile.TemporaryFile() as stderr:
+        start = time.perf_counter()
+        process = subprocess.Popen([sys.executable, '-c', SCRIPT, *args],
+                                   cwd=SRC_DIR,
+                                   env=env,
+                                   stdout=subprocess.DEVNULL,
+                                   stderr=stderr)
+        _, status, usage = os.wait4(process.pid, 0)
+        wall = time.perf_counter() - start
+        process.returncode = os.waitstatus_to_exitcode(status)
+        if process.returncode != 0:
+            stderr.seek(0)
+            sys.stderr.write(stderr.read().decode(errors='replace'))
+    return wall, process.returncode, usage.ru_maxrss
+
+
+def run_scenario(name: str, options):
+    setup, command = SCENARIOS[name]
+    walls, requests, sizes, rss, failures = [], [], [], [], 0
+    # The first run only warms the bytecode and disk caches.
+    for run_number in range(options.runs + 1):
+        home = tempfile.mkdtemp()
+        try:
+            with open(os.path.join(home, '.cliclirc'), 'w') as file:
+                json.dump(CONFIG, file)
+            server = FakeClickUp(Workload(tasks=options.tasks),
+                                 latency=options.latency / 1000,
+                                 error_rate=options.error_rate,
+                                 throttle_rate=options.throttle_rate,
+                                 compress=not options.no_compress).start()
+            env = {
+                key: value
+                for key, value in os.environ.items()
+                if not key.startswith('CLICKUP_') and
+                not key.startswith('XDG_')
+            }
+            env.update(HOME=home, CLICKUP_API_URL=server.url)
+            args = [
+                arg.format(operations=write_operations(home))
+                if arg == '{operations}' else arg for arg in command
+            ]
+            for setup_args in setup:
+                run(setup_args, env)
+            server.reset_stats()
+            wall, code, peak = run(args, env)
+            server.shutdown()
+            server.server_close()
+        finally:
+            shutil.rmtree(home, ignore_errors=True)
+        if run_number == 0:
+            continue
+        failures += code != 0
+        walls.append(wall)
+        requests.append(server.stats['requests'])
+        sizes.append(server.stats['bytes'])
+        rss.append(peak)
+    return {
+        'wall_ms': round(statistics.median(walls) * 1000, 1),
+        'requests': max(requests),
+        'bytes': max(sizes),
+        'peak_rss_kb': max(rss),
+        'failures': failures,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float):
+    regressions = []
+    for name, result in results.items():
+        expected = baseline.get('scenarios', {}).get(name)
+        if expected is None:
+            continue
+        if result['requests'] > expected['requests']:
+            regressions.append('%s: %s requests, baseline %s' %
+                               (name, result['requests'],
+                                expected['requests']))
+        for metric in ('wall_ms', 'bytes', 'peak_rss_kb'):
+            if metric not in expected:
+                continue
+            if result[metric] > expected[metric] * (1 + tolerance):
+                regressions.append('%s: %s %s, baseline %s' %
+                                   (name, metric, result[metric],
+                                    expected[metric]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Run clicli end-to-end benchmarks against a fake server.')
+    parser.add_argument('scenarios',
+                        nargs='*',
+                        help='scenarios to run (default: all of %s)' %
+                        ', '.join(SCENARIOS))
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--tasks',
+                        type=int,
+                        default=10000,
+                        help='tasks in every list')
+    parser.add_argument('--latency',
+                        type=float,
+                        default=20,
+                        help='milliseconds of server latency per request')
+    parser.add_argument('--no-compress',
+                        action='store_true',
+                        help='serve uncompressed responses')
+    parser.add_argument('--error-rate', type=float, default=0)
+    parser.add_argument('--throttle-rate', type=float, default=0)
+    parser.add_argument('--tolerance',
+                        type=float,
+                        default=0.25,
+                        help='allowed growth in wall time and memory')
+    parser.add_argument('--baseline', default=BASELINE_FILE)
+    parser.add_argument('--update',
+                        action='store_true',
+                        help='write the results as the new baseline')
+    parser.add_argument('--json',
+                        action='store_true',
+                        help='print the results as JSON')
+    options = parser.parse_args()
+    unknown = set(options.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error('unknown scenarios %s' % ', '.join(sorted(unknown)))
+
+    parameters = {
+        'runs': options.runs,
+        'tasks': options.tasks,
+        'latency_ms': options.latency,
+        'error_rate': options.error_rate,
+        'throttle_rate': options.throttle_rate,
+        'compress': not options.no_compress,
+    }
+    results = {}
+    for name in options.scenarios or SCENARIOS:
+        results[name] = run_scenario(name, options)
+        if not options.json:
+            print('%-18s %9.1f ms %6d requests %10d bytes %8d KiB peak RSS%s'
+                  % (name, results[name]['wall_ms'],
+                     results[name]['requests'], results[name]['bytes'],
+                     results[name]['peak_rss_kb'],
+                     ' (%d failed runs)' % results[name]['failures']
+                     if results[name]['failures'] else ''))
+    report = {
+        'parameters': parameters,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'scenarios': results,
+    }
+    if options.json:
+        print(json.dumps(report, indent=4))
+
+    if options.update:
+        if os.path.exists(options.baseline):
+            with open(options.baseline) as file:
+                previous = json.load(file)
+            if previous.get('parameters') == parameters:
+                results = dict(previous.get('scenarios', {}), **results)
+                report['scenarios'] = results
+        with open(options.baseline, 'w') as file:
+            json.dump(report, file, indent=4, sort_keys=True)
+            file.write('\n')
+        return 0
+
+    failed = any(result['failures'] for result in results.values())
+    if not os.path.exists(options.baseline):
+        print('No baseline at %s, run with --update to record one' %
+              options.baseline, file=sys.stderr)
+        return 1 if failed else 0
+    with open(options.baseline) as file:
+        baseline = json.load(file)
+    if baseline.get('parameters') != parameters:
+        print('Baseline was recorded with %s, not comparing' %
+              baseline.get('parameters'), file=sys.stderr)
+        return 1 if failed else 0
+    regressions = compare(results, baseline, options.tolerance)
+    for regression in regressions:
+        print('REGRESSION: %s' % regression, file=sys.stderr)
+    return 1 if failed or regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
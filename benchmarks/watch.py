@@ -0,0 +1,201 @@
+import argparse
+import json
+import os
+import random
+import shutil
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from fake_clickup import FakeClickUp, Workload
+
+# Cost and latency of `clicli tasks watch` on many lists. Tasks are created,
+# updated and closed on the fake server while the watch runs; every change
+# must come out as exactly one event of the right kind. The requests and
+# bytes the watch costs are compared with re-downloading every list once per
+# poll interval, as a `tasks list --all` loop would.
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+SCRIPT = ("import sys; sys.argv = ['clicli'] + sys.argv[1:]; "
+          "from main import cli; cli()")
+
+CONFIG = {
+    'api-key': 'benchmark',
+    'team-id': '1',
+    'space-id': '101',
+    'user': '1',
+}
+
+
+def read_events(stream, events):
+    for line in stream:
+        events.append((time.monotonic(), json.loads(line)))
+
+
+def change(workload, list_ids, rng):
+    # Makes one random change and returns (event kind, list ID, task ID).
+    list_id = rng.choice(list_ids)
+    kind = rng.choice(['created', 'updated', 'closed'])
+    if kind == 'created':
+        task_id = 'new%s' % workload.new_id()
+        now = str(int(time.time() * 1000))
+        task = {
+            'id': task_id,
+            'name': 'Watched',
+            'status': {
+                'status': 'to do',
+                'type': 'custom'
+            },
+            'list': {
+                'id': str(list_id)
+            },
+            'date_created': now,
+            'date_updated': now,
+            'date_closed': None,
+        }
+        workload.created_tasks[task_id] = task
+        workload.changed_tasks.setdefault(list_id, {})[task_id] = task
+        return kind, list_id, task_id
+    # Open tasks only, so that closing one is a change of state.
+    while True:
+        task_id = '%st%s' % (list_id, rng.randrange(workload.tasks))
+        if workload.task(list_id, int(task_id.split('t')[1]))['status'][
+                'type'] != 'closed':
+            break
+    workload.update_task(
+        task_id, {'status': 'done'} if kind == 'closed' else
+        {'name': 'Renamed %s' % rng.random()})
+    return kind, list_id, task_id
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Measure clicli tasks watch against a fake server.')
+    parser.add_argument('--lists', type=int, default=50)
+    parser.add_argument('--tasks', type=int, default=1000)
+    parser.add_argument('--changes', type=int, default=40)
+    parser.add_argument('--duration',
+                        type=float,
+                        default=20,
+                        help='seconds over which the changes are made')
+    parser.add_argument('--interval', type=float, default=1)
+    parser.add_argument('--max-interval', type=float, default=4)
+    parser.add_argument('--latency',
+                        type=float,
+                        default=20,
+                        help='milliseconds of server latency per request')
+    options = parser.parse_args()
+
+    workload = Workload(spaces=1,
+                        folders=(options.lists + 4) // 5,
+                        lists=5,
+                        folderless_lists=0,
+                        tasks=options.tasks)
+    list_ids = sorted(workload.lists)[:options.lists]
+    server = FakeClickUp(workload, latency=options.latency / 1000).start()
+    home = tempfile.mkdtemp()
+    rng = random.Random(0)
+    events = []
+    changes = {}
+    try:
+        with open(os.path.join(home, '.cliclirc'), 'w') as file:
+            json.dump(CONFIG, file)
+        env = {
+            key: value
+            for key, value in os.environ.items()
+            if not key.startswith('CLICKUP_') and not key.startswith('XDG_')
+        }
+        env.update(HOME=home, CLICKUP_API_URL=server.url)
+
+        # What one full download of every list costs.
+        server.reset_stats()
+        subprocess.run([
+            sys.executable, '-c', SCRIPT, '--no-cache', 'tasks', 'list',
+            str(list_ids[0]), '--all', '--output', 'compact'
+        ],
+                       cwd=SRC_DIR,
+                       env=env,
+                       stdout=subprocess.DEVNULL,
+                       check=True)
+        full_requests = server.stats['requests'] * len(list_ids)
+        full_bytes = server.stats['bytes'] * len(list_ids)
+
+        process = subprocess.Popen([
+            sys.executable, '-c', SCRIPT, 'tasks', 'watch', *map(
+                str, list_ids), '--interval',
+            str(options.interval), '--max-interval',
+            str(options.max_interval), '--fields', 'id,name,status.status'
+        ],
+                                   cwd=SRC_DIR,
+                                   env=env,
+                                   stdout=subprocess.PIPE,
+                                   text=True)
+        reader = threading.Thread(target=read_events,
+                                  args=(process.stdout, events),
+                                  daemon=True)
+        reader.start()
+        # Let the first polls record where every list stands.
+        time.sleep(2)
+        server.reset_stats()
+        started = time.monotonic()
+        for number in range(options.changes):
+            time.sleep(
+                max(0, started + options.duration * number / options.changes -
+                    time.monotonic()))
+            kind, list_id, task_id = change(workload, list_ids, rng)
+            changes[task_id] = (time.monotonic(), kind, str(list_id))
+        time.sleep(options.max_interval + 1)
+        elapsed = time.monotonic() - started
+        requests, size = server.stats['requests'], server.stats['bytes']
+        process.send_signal(signal.SIGINT)
+        process.wait(timeout=10)
+        reader.join(timeout=5)
+    finally:
+        server.shutdown()
+        server.server_close()
+        shutil.rmtree(home, ignore_errors=True)
+
+    failed = False
+    latencies = []
+    seen = {}
+    for received, event in events:
+        task_id = event['task']['id']
+        if task_id in seen:
+            print('FAIL: duplicate event for %s' % task_id)
+            failed = True
+        seen[task_id] = event
+        if task_id not in changes:
+            print('FAIL: unexpected %s event for %s' %
+                  (event['event'], task_id))
+            failed = True
+            continue
+        made, kind, list_id = changes[task_id]
+        if (event['event'], event['list_id']) != (kind, list_id):
+            print('FAIL: %s in list %s reported as %s in list %s' %
+                  (kind, list_id, event['event'], event['list_id']))
+            failed = True
+        latencies.append(received - made)
+    missing = set(changes) - set(seen)
+    if missing:
+        print('FAIL: no event for %d changes' % len(missing))
+        failed = True
+
+    polls = elapsed / options.interval
+    print('%d lists, %d changes over %.0f s, interval %s-%s s' %
+          (len(list_ids), len(changes), elapsed, options.interval,
+           options.max_interval))
+    print('watch:      %6d requests %10d bytes' % (requests, size))
+    print('re-download every %s s: %6d requests %10d bytes' %
+          (options.interval, full_requests * polls, full_bytes * polls))
+    if latencies:
+        print('event latency: median %.2f s, max %.2f s' %
+              (statistics.median(latencies), max(latencies)))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,13 +4,31 @@ setup(
     name='clicli',
     version='0.1.0',
     package_dir={'': 'src'},
-    py_modules=['main'],
+    py_modules=[
+        'api',
+        'bulk',
+        'cache',
+        'completion',
+        'constants',
+        'daemon',
+        'decoding',
+        'executor',
+        'main',
+        'mirror',
+        'models',
+        'names',
+        'output',
+        'projection',
+        'query',
+        'tracing',
+    ],
+    packages=['commands'],
     install_requires=[
         'Click',
     ],
     entry_points={
         'console_scripts': [
-            'clicli = main:cli',
+            'clicli = daemon:main',
         ],
     },
 )
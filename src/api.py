@@ -1,14 +1,64 @@
+import atexit
 import click
+import heapq
 import http.client
+import io
+import queue
+import random
+import socket
+import ssl
+import threading
+import time
+import tracing
 import urllib
 import sys
 import json
+from collections import deque, namedtuple
+from concurrent.futures import FIRST_COMPLETED, wait
 from typing import Union
 from enum import Enum
+from cache import get_response_cache, ttl_for
+from decoding import (ACCEPT_ENCODING, CHUNK_SIZE, decode_chunks,
+                      decompress)
 from commands.config import direct_get
+from constants import PAGE_CONCURRENCY, PAGE_SIZE, POOL_SIZE
+from executor import ThreadPoolExecutor
+from projection import project, project_response
 
 HOST = 'api.clickup.com'
 BASE_PATH = '/api/v2/'
+# Pages of each list fetched ahead of the reader by merge_tasks
+PAGES_AHEAD = 2
+TIMEOUT = 30
+MAX_RETRIES = 5
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30
+INITIAL_CONCURRENCY = 4
+# Task fields that `order_by` sorts on
+TASK_ORDER_FIELDS = {
+    'id': 'id',
+    'created': 'date_created',
+    'updated': 'date_updated',
+    'due_date': 'due_date',
+}
+
+IDEMPOTENT_METHODS = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+RETRY_STATUSES = {500, 502, 503, 504}
+NETWORK_ERRORS = (ConnectionError, socket.timeout, http.client.HTTPException)
+
+# Errors raised when a pooled keep-alive socket was closed by the server
+# while it sat idle. Raised while sending or before the status line of the
+# response arrived, the request never reached the server, so it is safe to
+# reconnect and send it again.
+STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected,
+                           http.client.CannotSendRequest,
+                           http.client.BadStatusLine, BrokenPipeError,
+                           ConnectionResetError)
+
+# `data` holds the decoded JSON when the client decoded the body while
+# reading it, in which case `body` is None.
+Response = namedtuple('Response', ['status', 'headers', 'body', 'data'],
+                      defaults=[None])
 
 
 class MethodType(Enum):
@@ -18,30 +68,849 @@ class MethodType(Enum):
     DELETE = 'DELETE'
 
 
-def make_api_request(path: str,
-                     method: MethodType = 'GET',
-                     body: Union[str, dict] = None,
-                     verbose: bool = False):
-    connection = http.client.HTTPSConnection(HOST)
-    headers = {'Authorization': direct_get('api-key')}
+class RateLimiter:
+    # Token bucket seeded from the X-RateLimit-* response headers. Tokens
+    # are spent locally as requests go out and the bucket refills when the
+    # server's window resets.
+    def __init__(self):
+        self.limit = None
+        self.remaining = None
+        self.reset_at = None
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        # Takes a token and returns 0, or returns how long to wait before
+        # trying again.
+        with self._lock:
+            now = time.time()
+            if self.reset_at is not None and now >= self.reset_at:
+                self.remaining = self.limit
+                self.reset_at = None
+            if self.remaining is None or self.remaining > 0:
+                if self.remaining is not None:
+                    self.remaining -= 1
+                return 0
+            return min((self.reset_at or now + 1) - now, BACKOFF_MAX)
+
+    def wait(self):
+        delay = self.reserve()
+        while delay:
+            time.sleep(delay)
+            delay = self.reserve()
+
+    def update(self, headers):
+        try:
+            limit = int(headers['X-RateLimit-Limit'])
+            remaining = int(headers['X-RateLimit-Remaining'])
+            reset_at = float(headers['X-RateLimit-Reset'])
+        except (KeyError, TypeError, ValueError):
+            return
+        with self._lock:
+            self.limit = limit
+            if self.reset_at is not None and reset_at == self.reset_at:
+                # Responses to concurrent requests arrive out of order, so
+                # within a window trust whichever count is lower.
+                remaining = min(remaining, self.remaining)
+            self.remaining = remaining
+            self.reset_at = reset_at
+
+    def pause_until(self, resume_at: float):
+        with self._lock:
+            self.remaining = 0
+            self.reset_at = max(resume_at, self.reset_at or 0)
+
+
+class ConcurrencyLimit:
+    # Additive increase, multiplicative decrease: every successful response
+    # raises the limit by 1/limit (about one per round of requests), and
+    # every throttled or failed one halves it.
+    def __init__(self,
+                 initial: int = INITIAL_CONCURRENCY,
+                 minimum: int = 1,
+                 maximum: int = POOL_SIZE):
+        self.limit = float(min(initial, maximum))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self, congested: bool = False):
+        with self._condition:
+            self.in_flight -= 1
+            self.adjust(congested)
+            self._condition.notify_all()
+
+    def adjust(self, congested: bool):
+        if congested:
+            self.limit = max(self.minimum, self.limit / 2)
+        else:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+
+
+class AsyncConcurrencyLimit(ConcurrencyLimit):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._condition = None
+
+    async def acquire(self):
+        import asyncio
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        async with self._condition:
+            while self.in_flight >= int(self.limit):
+                await self._condition.wait()
+            self.in_flight += 1
+
+    async def release(self, congested: bool = False):
+        async with self._condition:
+            self.in_flight -= 1
+            self.adjust(congested)
+            self._condition.notify_all()
+
+
+def backoff_delay(attempt: int):
+    # Exponential backoff with full jitter
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2**attempt))
+
+
+def classify(method: str, status: int):
+    # Returns (retryable, congested). A 429 means the request was rejected
+    # without being acted on, so it is retried for every method. Server
+    # errors are only retried for idempotent methods.
+    congested = status == 429 or status in RETRY_STATUSES
+    retryable = status == 429 or (status in RETRY_STATUSES
+                                  and method in IDEMPOTENT_METHODS)
+    return retryable, congested
+
+
+def retry_after(headers):
+    try:
+        return time.time() + float(headers['Retry-After'])
+    except (KeyError, TypeError, ValueError):
+        pass
+    try:
+        return float(headers['X-RateLimit-Reset'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class ClickUpClient:
+    def __init__(self,
+                 host: str = HOST,
+                 pool_size: int = POOL_SIZE,
+                 timeout: float = TIMEOUT,
+                 max_retries: int = MAX_RETRIES,
+                 port: int = None,
+                 use_ssl: bool = True):
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.rate_limiter = RateLimiter()
+        self.concurrency = ConcurrencyLimit(maximum=pool_size)
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(pool_size)
+
+    def _new_connection(self):
+        if not self.use_ssl:
+            return http.client.HTTPConnection(self.host,
+                                              self.port,
+                                              timeout=self.timeout)
+        return http.client.HTTPSConnection(self.host,
+                                           self.port,
+                                           timeout=self.timeout)
+
+    def _acquire(self):
+        self._slots.acquire()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._new_connection()
+
+    def _release(self, connection, reusable: bool):
+        if reusable:
+            self._idle.put(connection)
+        else:
+            connection.close()
+        self._slots.release()
+
+    def request(self,
+                method: str,
+                url: str,
+                headers: dict = None,
+                body: Union[str, bytes] = None,
+                decode: bool = False,
+                fields: dict = None) -> Response:
+        # Network failures are only retried for idempotent methods; see
+        # classify for responses. With `decode`, successful JSON responses
+        # are decoded as they are read (see decoding.StreamDecoder), and
+        # trimmed to `fields` as they are.
+        attempt = 0
+        while True:
+            self.concurrency.acquire()
+            try:
+                self.rate_limiter.wait()
+                response = self._send(method, url, headers, body, attempt,
+                                      decode, fields)
+            except NETWORK_ERRORS:
+                self.concurrency.release(congested=True)
+                if method not in IDEMPOTENT_METHODS or \
+                        attempt >= self.max_retries:
+                    raise
+                time.sleep(backoff_delay(attempt))
+                attempt += 1
+                continue
+            self.rate_limiter.update(response.headers)
+            retryable, congested = classify(method, response.status)
+            self.concurrency.release(congested=congested)
+            if not retryable or attempt >= self.max_retries:
+                return response
+            if response.status == 429:
+                resume_at = retry_after(response.headers)
+                if resume_at is not None:
+                    self.rate_limiter.pause_until(resume_at)
+            time.sleep(backoff_delay(attempt))
+            attempt += 1
+
+    def _send(self,
+              method: str,
+              url: str,
+              headers: dict,
+              body: Union[str, bytes],
+              attempt: int = 0,
+              decode: bool = False,
+              fields: dict = None) -> Response:
+        tracer = tracing.tracer
+        start = tracing.now()
+        timings = {}
+        connection = self._acquire()
+        reusable = False
+        try:
+            while True:
+                reused = connection.sock is not None
+                try:
+                    if tracer is not None and not reused:
+                        self._connect(connection, timings)
+                    mark = tracing.now()
+                    connection.request(method,
+                                       url,
+                                       body=body,
+                                       headers=headers or {})
+                    timings['send'] = (mark, tracing.now() - mark)
+                    mark = tracing.now()
+                    response = connection.getresponse()
+                    timings['ttfb'] = (mark, tracing.now() - mark)
+                    break
+                except STALE_CONNECTION_ERRORS:
+                    connection.close()
+                    if not reused:
+                        raise
+            # The server has answered, so a failure from here on is not a
+            # stale connection and the request must not be sent again here;
+            # request() retries it for idempotent methods only.
+            mark = tracing.now()
+            data, decoded, size = self._read(response, decode, fields)
+            timings['download'] = (mark, tracing.now() - mark)
+            reusable = not response.will_close
+            if tracer is not None:
+                tracer.request(method, url, start, timings, response.status,
+                               size, response.headers, attempt)
+            return Response(response.status, response.headers, data, decoded)
+        except BaseException as error:
+            connection.close()
+            if tracer is not None:
+                tracer.request(method, url, start, timings,
+                               type(error).__name__, 0, None, attempt)
+            raise
+        finally:
+            self._release(connection, reusable)
+
+    def _read(self, response, decode: bool, fields: dict = None):
+        # Returns (body, decoded JSON, bytes on the wire). Only one of body
+        # and decoded JSON is set.
+        size = 0
+
+        def chunks():
+            nonlocal size
+            for chunk in iter(lambda: response.read(CHUNK_SIZE), b''):
+                size += len(chunk)
+                yield chunk
+
+        body = decompress(chunks(), response.getheader('Content-Encoding'))
+        if decode and 200 <= response.status < 300:
+            # Overlaps with the download, since decoding pulls the chunks.
+            with tracing.span('decode'):
+                decoded = decode_chunks(body, fields=fields)
+            return None, decoded, size
+        body = b''.join(body)
+        return body, None, size
+
+    def _connect(self, connection, timings: dict):
+        # Connects one step at a time so --trace can tell DNS, TCP and TLS
+        # apart; HTTPConnection.connect does all three at once.
+        mark = tracing.now()
+        address = socket.getaddrinfo(connection.host, connection.port, 0,
+                                     socket.SOCK_STREAM)[0][4]
+        timings['dns'] = (mark, tracing.now() - mark)
+        mark = tracing.now()
+        sock = socket.create_connection(address[:2], connection.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        timings['connect'] = (mark, tracing.now() - mark)
+        context = getattr(connection, '_context', None)
+        if context is not None:
+            mark = tracing.now()
+            sock = context.wrap_socket(sock, server_hostname=connection.host)
+            timings['tls'] = (mark, tracing.now() - mark)
+        connection.sock = sock
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class AsyncClickUpClient:
+    # The asyncio counterpart of ClickUpClient, for callers that fan out
+    # many requests from one event loop. Speaks HTTP/1.1 over asyncio
+    # streams with the same keep-alive pool, rate limiting, concurrency
+    # limit and retry rules. asyncio is imported on first use so the sync
+    # commands do not pay for it at startup.
+    def __init__(self,
+                 host: str = HOST,
+                 port: int = None,
+                 use_ssl: bool = True,
+                 pool_size: int = POOL_SIZE,
+                 timeout: float = TIMEOUT,
+                 max_retries: int = MAX_RETRIES):
+        self.host = host
+        self.port = port or (443 if use_ssl else 80)
+        self.use_ssl = use_ssl
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.rate_limiter = RateLimiter()
+        self.concurrency = AsyncConcurrencyLimit(maximum=pool_size)
+        self._idle = []
+        self._slots = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _new_connection(self):
+        import asyncio
+        return await asyncio.wait_for(
+            asyncio.open_connection(
+                self.host,
+                self.port,
+                ssl=ssl.create_default_context() if self.use_ssl else None),
+            self.timeout)
+
+    async def _acquire(self):
+        import asyncio
+        if self._slots is None:
+            self._slots = asyncio.BoundedSemaphore(self.pool_size)
+        await self._slots.acquire()
+        if self._idle:
+            return self._idle.pop(), True
+        try:
+            return await self._new_connection(), False
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _release(self, connection, reusable: bool):
+        if reusable:
+            self._idle.append(connection)
+        else:
+            connection[1].close()
+        self._slots.release()
+
+    async def request(self,
+                      path: str,
+                      method: str = 'GET',
+                      body: Union[str, dict] = None,
+                      verbose: bool = False,
+                      fields: dict = None):
+        # Same contract as make_api_request: errors are reported on stderr
+        # and the decoded body is returned either way.
+        cached = cached_response(method, path, verbose, fields)
+        if cached is not None:
+            return cached
+        url, headers, body = prepare_request(path, method, body)
+        response = await self.send(method, url, headers, body)
+        return handle_response(path, method, response, verbose, fields)
+
+    async def send(self,
+                   method: str,
+                   url: str,
+                   headers: dict = None,
+                   body: Union[str, bytes] = None) -> Response:
+        import asyncio
+        network_errors = NETWORK_ERRORS + (asyncio.TimeoutError,
+                                           asyncio.IncompleteReadError)
+        attempt = 0
+        while True:
+            await self.concurrency.acquire()
+            try:
+                delay = self.rate_limiter.reserve()
+                while delay:
+                    await asyncio.sleep(delay)
+                    delay = self.rate_limiter.reserve()
+                response = await self._send(method, url, headers, body,
+                                            attempt)
+            except network_errors:
+                await self.concurrency.release(congested=True)
+                if method not in IDEMPOTENT_METHODS or \
+                        attempt >= self.max_retries:
+                    raise
+                await asyncio.sleep(backoff_delay(attempt))
+                attempt += 1
+                continue
+            self.rate_limiter.update(response.headers)
+            retryable, congested = classify(method, response.status)
+            await self.concurrency.release(congested=congested)
+            if not retryable or attempt >= self.max_retries:
+                return response
+            if response.status == 429:
+                resume_at = retry_after(response.headers)
+                if resume_at is not None:
+                    self.rate_limiter.pause_until(resume_at)
+            await asyncio.sleep(backoff_delay(attempt))
+            attempt += 1
+
+    async def _send(self,
+                    method: str,
+                    url: str,
+                    headers: dict,
+                    body: Union[str, bytes],
+                    attempt: int = 0) -> Response:
+        import asyncio
+        tracer = tracing.tracer
+        start = tracing.now()
+        timings = {}
+        if isinstance(body, str):
+            body = body.encode()
+        lines = ['%s %s HTTP/1.1' % (method, url), 'Host: %s' % self.host]
+        lines += ['%s: %s' % item for item in (headers or {}).items()]
+        if body is not None or method in ('POST', 'PUT'):
+            lines.append('Content-Length: %d' % len(body or b''))
+        request = ('\r\n'.join(lines) + '\r\n\r\n').encode() + (body or b'')
+        mark = tracing.now()
+        connection, reused = await self._acquire()
+        if not reused:
+            timings['connect'] = (mark, tracing.now() - mark)
+        reusable = False
+        try:
+            while True:
+                reader, writer = connection
+                try:
+                    mark = tracing.now()
+                    writer.write(request)
+                    await writer.drain()
+                    timings['send'] = (mark, tracing.now() - mark)
+                    mark = tracing.now()
+                    status_line = await asyncio.wait_for(
+                        reader.readline(), self.timeout)
+                    timings['ttfb'] = (mark, tracing.now() - mark)
+                    if not status_line:
+                        raise http.client.RemoteDisconnected(
+                            'Remote end closed connection without response')
+                    break
+                except STALE_CONNECTION_ERRORS:
+                    writer.close()
+                    if not reused:
+                        raise
+                    mark = tracing.now()
+                    connection, reused = await self._new_connection(), False
+                    timings['connect'] = (mark, tracing.now() - mark)
+            mark = tracing.now()
+            status, headers, data = await asyncio.wait_for(
+                self._read_response(reader, status_line, method),
+                self.timeout)
+            reusable = data is not None and \
+                headers.get('Connection', '').lower() != 'close'
+            if data is None:
+                data = await asyncio.wait_for(reader.read(), self.timeout)
+            timings['download'] = (mark, tracing.now() - mark)
+            if tracer is not None:
+                tracer.request(method, url, start, timings, status,
+                               len(data), headers, attempt)
+            data = b''.join(
+                decompress([data], headers.get('Content-Encoding')))
+            return Response(status, headers, data)
+        except BaseException as error:
+            connection[1].close()
+            if tracer is not None:
+                tracer.request(method, url, start, timings,
+                               type(error).__name__, 0, None, attempt)
+            raise
+        finally:
+            self._release(connection, reusable)
+
+    async def _read_response(self, reader, status_line: bytes, method: str):
+        # Returns the body as None when it is delimited by the connection
+        # closing, which the caller reads once it knows not to reuse it.
+        parts = status_line.decode('iso-8859-1').split(None, 2)
+        if len(parts) < 2 or not parts[0].startswith('HTTP/') or \
+                not parts[1].isdigit():
+            raise http.client.BadStatusLine(status_line)
+        status = int(parts[1])
+        header_lines = []
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            header_lines.append(line)
+        headers = http.client.parse_headers(io.BytesIO(b''.join(header_lines)))
+        if status in (204, 304) or 100 <= status < 200 or method == 'HEAD':
+            return status, headers, b''
+        if headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    while (await reader.readline()) not in (b'\r\n', b''):
+                        pass
+                    return status, headers, b''.join(chunks)
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+        if headers.get('Content-Length') is not None:
+            return status, headers, await reader.readexactly(
+                int(headers['Content-Length']))
+        return status, headers, None
+
+    async def close(self):
+        while self._idle:
+            self._idle.pop()[1].close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def api_endpoint():
+    # (host, port, use_ssl), normally api.clickup.com over HTTPS. The api-url
+    # setting (or CLICKUP_API_URL) points clicli somewhere else, such as the
+    # stand-in server in benchmarks/.
+    url = direct_get('api-url', silent=True)
+    if not url:
+        return HOST, None, True
+    parsed = urllib.parse.urlsplit(url)
+    return parsed.hostname, parsed.port, parsed.scheme != 'http'
+
+
+def get_client() -> ClickUpClient:
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                host, port, use_ssl = api_endpoint()
+                _client = ClickUpClient(host, port=port, use_ssl=use_ssl)
+                atexit.register(_client.close)
+    return _client
+
+
+def cached_response(method: str, path: str, verbose: bool, fields: dict):
+    response_cache = get_response_cache()
+    if response_cache is None:
+        return None
+    cached_body = response_cache.get(method, path)
+    if cached_body is None:
+        return None
+    if sys.stdout.isatty():
+        click.echo(
+            click.style(urllib.parse.urljoin(BASE_PATH, path) + ' (cached)',
+                        fg='blue'))
+    if verbose:
+        click.echo(cached_body.decode())
+    return project_response(json.loads(cached_body), fields)
+
+
+def prepare_request(path: str, method: str, body: Union[str, dict]):
     url = urllib.parse.urljoin(BASE_PATH, path)
+    headers = {
+        'Authorization': direct_get('api-key'),
+        'Accept-Encoding': ACCEPT_ENCODING
+    }
     if sys.stdout.isatty():
         click.echo(click.style(url, fg='blue'))
     if method != 'GET' and body is not None:
         if type(body) is dict:
             body = json.dumps(body)
         headers['Content-Type'] = 'application/json'
-        connection.request(method, url, headers=headers, body=body)
     else:
-        connection.request(method, url, headers=headers)
-    response = connection.getresponse()
-    response_body = response.read().decode()
-    if verbose:
-        click.echo(response_body)
-    response_json = json.loads(response_body)
-    if response.code >= 400:
+        body = None
+    return url, headers, body
+
+
+def handle_response(path: str, method: str, response: Response,
+                    verbose: bool, fields: dict):
+    if response.data is not None:
+        response_json = response.data
+    else:
+        if verbose:
+            click.echo(response.body.decode())
+        with tracing.span('decode', url=path):
+            response_json = json.loads(response.body)
+    response_cache = get_response_cache()
+    if response_cache is not None:
+        if method != 'GET':
+            response_cache.invalidate(path)
+        elif response.status < 400:
+            response_cache.put(method, path, response.body, response_json)
+    if response.status >= 400:
         click.echo(click.style('Error', fg='red') +
-                   ': server responded with a %s status code.' % response.code,
+                   ': server responded with a %s status code.' %
+                   response.status,
                    err=True)
         click.echo(response_json, err=True)
-    return response_json
+    if response.data is not None:
+        # Decoded while it was read, with `fields` applied then.
+        return response_json
+    return project_response(response_json, fields)
+
+
+def streamable(path: str, method: str, verbose: bool):
+    # Bodies can be decoded while they are read unless they are echoed or
+    # kept for the response cache.
+    if verbose:
+        return False
+    return method != 'GET' or get_response_cache() is None or \
+        ttl_for(path) is None
+
+
+def make_api_request(path: str,
+                     method: MethodType = 'GET',
+                     body: Union[str, dict] = None,
+                     verbose: bool = False,
+                     fields: dict = None):
+    # `fields` (see projection.parse_fields) trims the response, the items of
+    # a collection one by one as they are decoded when the body is streamed,
+    # so callers accumulating many pages only ever hold what they asked for.
+    cached = cached_response(method, path, verbose, fields)
+    if cached is not None:
+        return cached
+    url, headers, body = prepare_request(path, method, body)
+    response = get_client().request(method,
+                                     url,
+                                     headers=headers,
+                                     body=body,
+                                     decode=streamable(path, method, verbose),
+                                     fields=fields)
+    return handle_response(path, method, response, verbose, fields)
+
+
+def checked(response, key: str, what: str):
+    # A response without `key` is the server's error response, which must
+    # stop the caller rather than read as an empty one.
+    if not isinstance(response, dict) or key not in response:
+        error = response.get('err') if isinstance(response, dict) else None
+        raise click.ClickException('could not fetch %s: %s' %
+                                   (what, error or response))
+    return response
+
+
+def checked_page(response, key: str, path: str, page: int):
+    # Likewise, rather than read as an empty last page.
+    return checked(response, key, 'page %s of %s' % (page, path))
+
+
+def iter_pages(path: str,
+               key: str,
+               query: str = '',
+               page: int = 0,
+               concurrency: int = PAGE_CONCURRENCY,
+               fields: dict = None):
+    # Pages are requested speculatively: the window of pages in flight starts
+    # at one, so single page results cost a single request, and doubles up to
+    # `concurrency` while full pages keep coming back. Responses are yielded
+    # in page order and fetching stops at the first short page. An error
+    # response raises a ClickException.
+    executor = ThreadPoolExecutor(max_workers=max(concurrency, 1))
+    in_flight = deque()
+    window = 1
+    try:
+        while True:
+            while len(in_flight) < window:
+                in_flight.append(
+                    (page,
+                     executor.submit(make_api_request,
+                                     '%s?page=%s&%s' % (path, page, query),
+                                     fields=fields)))
+                page += 1
+            number, future = in_flight.popleft()
+            response = checked_page(future.result(), key, path, number)
+            yield response
+            if len(response.get(key, [])) < PAGE_SIZE:
+                return
+            window = min(window * 2, max(concurrency, 1))
+    finally:
+        for _, future in in_flight:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+def iter_tasks(list_id,
+               query: str = '',
+               page: int = 0,
+               concurrency: int = PAGE_CONCURRENCY,
+               fields: dict = None):
+    for response in iter_pages('list/%s/task' % list_id,
+                               'tasks',
+                               query=query,
+                               page=page,
+                               concurrency=concurrency,
+                               fields=fields):
+        yield from response.get('tasks', [])
+
+
+def task_sort_key(order: str, reverse: bool = False):
+    # Sorts tasks the way `order_by=<order>` does when merged with
+    # heapq.merge(..., reverse=not reverse): newest first unless reversed,
+    # with tasks missing the field (e.g. without a due date) last either way.
+    field = TASK_ORDER_FIELDS[order]
+    missing = (1, 0) if reverse else (0, 0)
+
+    def key(task):
+        value = task.get(field)
+        if value is None:
+            return missing
+        return (missing[0] ^ 1, value if field == 'id' else int(value))
+
+    return key
+
+
+class TaskStream:
+    # The tasks of one list, with pages fetched ahead of the reader: each
+    # next page is requested as soon as the one before it arrives full,
+    # until PAGES_AHEAD pages are waiting to be read.
+    def __init__(self, executor, list_id, query: str, fields: dict):
+        self.executor = executor
+        self.list_id = list_id
+        self.query = query
+        self.fields = fields
+        self.page = 0
+        # The number of the first page in self.pages.
+        self.taken = 0
+        self.pages = deque()
+        self.last = None
+        self.finished = False
+        self._lock = threading.RLock()
+        with self._lock:
+            self._request()
+
+    def _request(self):
+        self.last = self.executor.submit(
+            make_api_request,
+            'list/%s/task?page=%s&%s' % (self.list_id, self.page, self.query),
+            fields=self.fields)
+        self.page += 1
+        self.pages.append(self.last)
+        self.last.add_done_callback(self._fetched)
+
+    def _fetched(self, future):
+        with self._lock:
+            self._fetch_more()
+
+    def _fetch_more(self):
+        if self.finished or not self.last.done():
+            return
+        try:
+            full = len(self.last.result().get('tasks', [])) >= PAGE_SIZE
+        except Exception:  # raised again to the reader
+            full = False
+        if not full:
+            self.finished = True
+        elif len(self.pages) < PAGES_AHEAD:
+            self._request()
+
+    def take(self):
+        # The tasks of the next page, waiting for it if need be. None after
+        # the last page. A page that failed raises, so a list is never left
+        # out of the merge.
+        with self._lock:
+            if not self.pages:
+                return None
+            future = self.pages[0]
+        tasks = checked_page(future.result(), 'tasks',
+                             'list/%s/task' % self.list_id,
+                             self.taken)['tasks']
+        with self._lock:
+            self.pages.popleft()
+            self.taken += 1
+            self._fetch_more()
+        return tasks
+
+    def __iter__(self):
+        while True:
+            tasks = self.take()
+            if tasks is None:
+                return
+            yield from tasks
+
+    def close(self):
+        with self._lock:
+            self.finished = True
+
+
+def arrival_order(streams):
+    # Pages of all streams as they arrive, each stream's in page order.
+    waiting = {stream.pages[0]: stream for stream in streams if stream.pages}
+    while waiting:
+        done, _ = wait(waiting, return_when=FIRST_COMPLETED)
+        for future in done:
+            stream = waiting.pop(future)
+            yield from stream.take()
+            if stream.pages:
+                waiting[stream.pages[0]] = stream
+
+
+def merge_tasks(list_ids,
+                query: str = '',
+                order: str = None,
+                reverse: bool = False,
+                concurrency: int = PAGE_CONCURRENCY,
+                fields: dict = None):
+    # The tasks of several lists as one stream, fetching pages of every list
+    # at once, at most `concurrency` at a time. With `order` (which `query`
+    # must also ask the server for, with the same `reverse`) the sorted
+    # lists are merged by it, newest first unless reversed.
+    # Otherwise pages are passed on as they arrive.
+    fetch_fields = fields
+    if order and fields and TASK_ORDER_FIELDS[order] not in fields:
+        fetch_fields = dict(fields, **{TASK_ORDER_FIELDS[order]: {}})
+    executor = ThreadPoolExecutor(max_workers=max(concurrency, 1))
+    streams = []
+    try:
+        streams = [
+            TaskStream(executor, list_id, query, fetch_fields)
+            for list_id in list_ids
+        ]
+        if order:
+            tasks = heapq.merge(*streams,
+                                key=task_sort_key(order, reverse),
+                                reverse=not reverse)
+        else:
+            tasks = arrival_order(streams)
+        if fetch_fields is fields:
+            yield from tasks
+        else:
+            for task in tasks:
+                yield project(task, fields)
+    finally:
+        for stream in streams:
+            stream.close()
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,166 @@
+import click
+import fnmatch
+import re
+from constants import POOL_SIZE
+from output import emit_pages
+
+# Selecting many lists or folders at once for update, rename or removal.
+# --match and --regex pick them by name from one fetch of the enclosing
+# space or folder, --ids-from reads IDs from a file. The changes then run
+# concurrently and one result per target is written as it finishes.
+
+# Parameters that say what to change. --name is only prompted for when none
+# of them is given.
+SELECTORS = ['id', 'match', 'regex', 'ids_from']
+
+
+def bulk_options(noun: str):
+    options = [
+        click.option('--match',
+                     help='Select every %s whose name matches this glob, '
+                     "e.g. 'Sprint *', ignoring case" % noun),
+        click.option('--regex',
+                     help='Select every %s whose name contains a match for '
+                     'this regular expression, ignoring case' % noun),
+        click.option('--ids-from',
+                     help='Select the %ss whose IDs are read from this file, '
+                     'one per line, or - for stdin' % noun,
+                     type=click.File('r')),
+        click.option('--dry-run',
+                     is_flag=True,
+                     help='Only show which %ss would change' % noun),
+        click.option('-j',
+                     '--concurrency',
+                     help='Maximum number of %ss to change at once' % noun,
+                     default=POOL_SIZE,
+                     show_default=True,
+                     type=click.IntRange(min=1)),
+    ]
+
+    def decorator(f):
+        for option in reversed(options):
+            f = option(f)
+        return f
+
+    return decorator
+
+
+def prompt_unless_selected(ctx, param, value):
+    # Parameters given on the command line are processed first, so any
+    # other selector that was passed is already in ctx.params.
+    if value is None and not ctx.resilient_parsing and \
+            not any(ctx.params.get(name) for name in SELECTORS):
+        value = click.prompt(param.name.capitalize())
+    return value
+
+
+def confirm_unless_dry_run(prompt: str):
+    def callback(ctx, param, value):
+        if value or ctx.resilient_parsing or ctx.params.get('dry_run'):
+            return
+        ids_from = ctx.params.get('ids_from')
+        if ids_from is not None and ids_from.name == '<stdin>':
+            raise click.UsageError(
+                'IDs are read from stdin, so pass --quiet instead of '
+                'confirming.')
+        click.confirm(prompt, abort=True)
+
+    return callback
+
+
+def bulk_selected(name, id, match, regex, ids_from, dry_run):
+    # True when --match, --regex or --ids-from is given, which can't be
+    # combined with each other or with --name and --id.
+    selected = [value for value in (match, regex, ids_from) if value]
+    if not selected:
+        if dry_run:
+            raise click.UsageError(
+                '--dry-run needs --match, --regex or --ids-from.')
+        return False
+    if len(selected) > 1 or name or id:
+        raise click.UsageError(
+            'use only one of --name, --id, --match, --regex and --ids-from.')
+    return True
+
+
+def read_ids(file):
+    # The first word of each line, skipping empty lines.
+    return [line.split()[0] for line in file if line.strip()]
+
+
+def renamed(template: str, target: dict, path: str):
+    # {name} and {id} in a new name stand for each target's current name and
+    # ID. Targets read with --ids-from have no name until it is fetched.
+    from api import make_api_request
+    if '{name}' in template and target.get('name') is None:
+        target['name'] = make_api_request(path).get('name')
+    return template.replace('{name}', target.get('name') or '').replace(
+        '{id}', str(target['id']))
+
+
+def matching(items, match: str = None, regex: str = None):
+    if match is not None:
+        pattern = match.casefold()
+        return [
+            item for item in items
+            if fnmatch.fnmatchcase(item['name'].casefold(), pattern)
+        ]
+    try:
+        pattern = re.compile(regex, re.IGNORECASE)
+    except re.error as error:
+        raise click.BadParameter(str(error), param_hint='--regex')
+    return [item for item in items if pattern.search(item['name'])]
+
+
+def run_bulk(noun: str, targets, change, concurrency: int, dry_run: bool,
+             preview=None):
+    # Calls change(target) for every target on a thread pool, and writes
+    # one {'id', 'name', 'status', ...} result per target as it finishes.
+    # preview(target) returns fields describing the change, which are also
+    # all that is written with --dry-run.
+    from concurrent.futures import as_completed
+    from executor import ThreadPoolExecutor
+    if not targets:
+        click.echo(click.style('Warning', fg='yellow') +
+                   ': no %ss selected.' % noun,
+                   err=True)
+    failed = 0
+
+    def run(target):
+        report = {'id': str(target['id']), 'name': target.get('name')}
+        try:
+            if preview is not None:
+                # The preview may have fetched the name.
+                report.update(preview(target), name=target.get('name'))
+            if dry_run:
+                report['status'] = 'dry-run'
+                return report
+            response = change(target)
+            if isinstance(response, dict) and 'err' in response:
+                report.update(status='error', error=response['err'])
+            else:
+                report.update(status='ok', result=response)
+        except (click.ClickException, click.Abort) as error:
+            report.update(status='error',
+                          error=str(error) or type(error).__name__)
+        except Exception as error:
+            report.update(status='error',
+                          error='%s: %s' % (type(error).__name__, error))
+        return report
+
+    def results():
+        nonlocal failed
+        executor = ThreadPoolExecutor(max_workers=concurrency)
+        try:
+            futures = [executor.submit(run, target) for target in targets]
+            for future in as_completed(futures):
+                report = future.result()
+                failed += report['status'] == 'error'
+                yield {'results': [report]}
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    emit_pages(results(), 'results')
+    if failed:
+        raise click.ClickException('%s of %s %ss could not be changed.' %
+                                   (failed, len(targets), noun))
@@ -0,0 +1,260 @@
+import os
+import re
+import threading
+import time
+from constants import CACHE_DIR, HOUR, MINUTE
+
+RESPONSE_CACHE_FILE = os.path.join(CACHE_DIR, 'responses.db')
+MAX_CACHE_SIZE = 32 * 1024 * 1024
+
+# Only the hierarchy endpoints are cached. Anything not matched here (tasks,
+# mutations, ...) always goes to the network.
+CACHE_TTLS = [
+    (re.compile(r'^team$'), 24 * HOUR),
+    (re.compile(r'^team/[^/]+/space$'), HOUR),
+    (re.compile(r'^space/[^/]+$'), HOUR),
+    (re.compile(r'^space/[^/]+/(folder|list)$'), 10 * MINUTE),
+    (re.compile(r'^folder/[^/]+(/list)?$'), 10 * MINUTE),
+    (re.compile(r'^list/[^/]+$'), 10 * MINUTE),
+]
+
+PATH_TAG_PATTERN = re.compile(r'(team|space|folder|list)/([^/?]+)')
+COLLECTION_KINDS = {
+    'teams': 'team',
+    'spaces': 'space',
+    'folders': 'folder',
+    'lists': 'list',
+}
+PARENT_KINDS = ['team', 'space', 'folder', 'list']
+
+_enabled = None
+_refresh = False
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def configure(enabled: bool = None, refresh: bool = False):
+    global _enabled, _refresh
+    _enabled = enabled
+    _refresh = refresh
+
+
+def is_enabled():
+    global _enabled
+    if _enabled is None:
+        from commands.config import direct_get
+        setting = direct_get('cache', silent=True)
+        _enabled = str(setting).lower() in ('1', 'true', 'on', 'yes')
+    return _enabled
+
+
+def get_response_cache():
+    global _cache
+    if not is_enabled():
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache()
+    return _cache
+
+
+def cache_scope():
+    # Responses depend on the server and on whose API key asks, so entries
+    # are kept apart by both. Only a hash of the key is stored. Read on
+    # every request, since a daemon serves commands with different
+    # CLICKUP_* environments.
+    import hashlib
+    from commands.config import direct_get
+    url = direct_get('api-url', silent=True) or ''
+    api_key = direct_get('api-key', silent=True) or ''
+    return hashlib.sha256(
+        ('%s\n%s' % (url, api_key)).encode()).hexdigest()[:16]
+
+
+def ttl_for(path: str):
+    endpoint = path.split('?', 1)[0]
+    for pattern, ttl in CACHE_TTLS:
+        if pattern.match(endpoint):
+            return ttl
+    return None
+
+
+def path_tags(path: str):
+    endpoint = path.split('?', 1)[0]
+    return {'%s:%s' % match for match in PATH_TAG_PATTERN.findall(endpoint)}
+
+
+def body_tags(body):
+    # Tag a response with every hierarchy object it mentions, so a mutation
+    # of any of those objects (or of a child collection underneath them)
+    # drops it from the cache.
+    tags = set()
+    objects = [body] if isinstance(body, dict) else []
+    while objects:
+        obj = objects.pop()
+        for key, kind in COLLECTION_KINDS.items():
+            for item in obj.get(key) or []:
+                if isinstance(item, dict):
+                    if 'id' in item:
+                        tags.add('%s:%s' % (kind, item['id']))
+                    objects.append(item)
+        for kind in PARENT_KINDS:
+            parent = obj.get(kind)
+            if isinstance(parent, dict) and 'id' in parent:
+                tags.add('%s:%s' % (kind, parent['id']))
+    return tags
+
+
+class ResponseCache:
+    # Entries are keyed by `scope`, by default that of each request's API
+    # URL and key (see cache_scope), as well as by request. Invalidation and
+    # eviction go across scopes.
+    def __init__(self,
+                 filename: str = RESPONSE_CACHE_FILE,
+                 max_size: int = MAX_CACHE_SIZE,
+                 scope: str = None):
+        import sqlite3
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        self.filename = filename
+        self.max_size = max_size
+        self.scope = scope
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(filename,
+                                   timeout=5,
+                                   check_same_thread=False,
+                                   isolation_level=None)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                stored_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS tags (
+                tag TEXT NOT NULL,
+                key TEXT NOT NULL,
+                PRIMARY KEY (tag, key)
+            );
+            CREATE INDEX IF NOT EXISTS tags_key ON tags (key);
+            CREATE INDEX IF NOT EXISTS entries_accessed_at
+                ON entries (accessed_at);
+            CREATE TABLE IF NOT EXISTS counters (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            );
+        """)
+
+    def _count(self, name: str):
+        self._db.execute(
+            'INSERT INTO counters (name, value) VALUES (?, 1) '
+            'ON CONFLICT (name) DO UPDATE SET value = value + 1', (name, ))
+
+    def _key(self, method: str, path: str):
+        scope = cache_scope() if self.scope is None else self.scope
+        return '%s %s %s' % (scope, method, path)
+
+    def _delete(self, keys):
+        for key in keys:
+            self._db.execute('DELETE FROM entries WHERE key = ?', (key, ))
+            self._db.execute('DELETE FROM tags WHERE key = ?', (key, ))
+
+    def get(self, method: str, path: str):
+        if _refresh or method != 'GET' or ttl_for(path) is None:
+            return None
+        key = self._key(method, path)
+        now = time.time()
+        with self._lock:
+            row = self._db.execute(
+                'SELECT body, expires_at FROM entries WHERE key = ?',
+                (key, )).fetchone()
+            if row is None or row[1] < now:
+                self._count('misses')
+                return None
+            self._db.execute(
+                'UPDATE entries SET accessed_at = ? WHERE key = ?',
+                (now, key))
+            self._count('hits')
+            return row[0]
+
+    def put(self, method: str, path: str, body: bytes, decoded):
+        ttl = ttl_for(path)
+        if method != 'GET' or ttl is None:
+            return
+        key = self._key(method, path)
+        now = time.time()
+        tags = path_tags(path) | body_tags(decoded)
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                self._delete([key])
+                self._db.execute(
+                    'INSERT INTO entries (key, body, size, stored_at, '
+                    'expires_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)',
+                    (key, body, len(body), now, now + ttl, now))
+                self._db.executemany(
+                    'INSERT OR IGNORE INTO tags (tag, key) VALUES (?, ?)',
+                    [(tag, key) for tag in tags])
+                self._evict()
+                self._db.execute('COMMIT')
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+
+    def _evict(self):
+        total = self._db.execute(
+            'SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+        if total <= self.max_size:
+            return
+        evicted = []
+        for key, size in self._db.execute(
+                'SELECT key, size FROM entries ORDER BY accessed_at'):
+            if total <= self.max_size:
+                break
+            evicted.append(key)
+            total -= size
+        self._delete(evicted)
+
+    def invalidate(self, path: str):
+        tags = path_tags(path)
+        if not tags:
+            return 0
+        with self._lock:
+            keys = [
+                row[0] for row in self._db.execute(
+                    'SELECT DISTINCT key FROM tags WHERE tag IN (%s)' %
+                    ','.join('?' * len(tags)), sorted(tags))
+            ]
+            self._delete(keys)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            count = self._db.execute(
+                'SELECT COUNT(*) FROM entries').fetchone()[0]
+            self._db.execute('DELETE FROM entries')
+            self._db.execute('DELETE FROM tags')
+            self._db.execute('DELETE FROM counters')
+            self._db.execute('VACUUM')
+            return count
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            entries, size, expired = self._db.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0), '
+                'COALESCE(SUM(expires_at < ?), 0) FROM entries',
+                (now, )).fetchone()
+            counters = dict(
+                self._db.execute('SELECT name, value FROM counters'))
+        return {
+            'file': self.filename,
+            'entries': entries,
+            'expired': expired,
+            'size': size,
+            'max_size': self.max_size,
+            'hits': counters.get('hits', 0),
+            'misses': counters.get('misses', 0),
+        }
@@ -1,5 +1,5 @@
 import click
-from commands.config import config_get, config_set
+from commands.config import direct_get, set_value
 
 
 @click.group('auth', help='See and manage auth information')
@@ -11,13 +11,15 @@ def auth():
                help='Set your access token within the .cliclirc file.')
 @click.argument('access_token')
 def set_access_token(access_token):
-    config_set('api-key', access_token)
+    set_value('api-key', access_token)
 
 
 @click.command('get-access-token',
                help='Get your access token from the .cliclirc file.')
 def get_token():
-    config_get(["api-key"])
+    value = direct_get('api-key')
+    if value is not None:
+        click.echo(value)
 
 
 auth.add_command(set_access_token)
@@ -0,0 +1,289 @@
+import click
+import io
+import json
+import re
+import sys
+import time
+from constants import POOL_SIZE
+from output import ThreadLocalStream, collect
+
+# Argument values such as "$sprint-folder.id" are replaced with a field of
+# the result of the operation with that id, which must run first.
+REFERENCE_PATTERN = re.compile(r'^\$([\w-]+)((?:\.[\w-]+)*)$')
+
+
+class BatchError(Exception):
+    pass
+
+
+class Operation:
+    def __init__(self, line: int, spec):
+        self.line = line
+        self.id = None
+        self.op = None
+        self.args = {}
+        self.after = set()
+        self.status = None
+        self.result = None
+        self.error = None
+        self.messages = ''
+        self.latency = None
+        try:
+            if not isinstance(spec, dict) or 'op' not in spec:
+                raise BatchError('expected an object with an "op" key')
+            self.id = spec.get('id')
+            self.op = spec['op']
+            self.args = spec.get('args')
+            if self.args is None:
+                self.args = {}
+            if not isinstance(self.args, dict):
+                raise BatchError('"args" must be an object')
+            after = spec.get('after') or []
+            self.after = {after} if isinstance(after, str) else set(after)
+            for value in self.args.values():
+                match = isinstance(value, str) and REFERENCE_PATTERN.match(
+                    value)
+                if match:
+                    self.after.add(match.group(1))
+        except BatchError as error:
+            self.fail(str(error))
+
+    def fail(self, error, status='error'):
+        self.status = status
+        self.error = error
+
+    def report(self):
+        report = {
+            'line': self.line,
+            'id': self.id,
+            'op': self.op,
+            'status': self.status,
+            'latency_ms':
+            round(self.latency * 1000, 1) if self.latency is not None else None,
+        }
+        if self.result is not None:
+            report['result'] = self.result
+        if self.error:
+            report['error'] = self.error
+        if self.messages:
+            report['messages'] = self.messages
+        return report
+
+
+def resolve_reference(value, results):
+    match = isinstance(value, str) and REFERENCE_PATTERN.match(value)
+    if not match:
+        return value
+    resolved = results[match.group(1)]
+    for field in filter(None, match.group(2).split('.')):
+        if not isinstance(resolved, dict) or field not in resolved:
+            raise BatchError('%s does not resolve' % value)
+        resolved = resolved[field]
+    return resolved
+
+
+def find_command(ctx, name: str):
+    root = ctx.find_root()
+    command = root.command
+    for part in name.split('.'):
+        if not isinstance(command, click.MultiCommand):
+            command = None
+            break
+        command = command.get_command(root, part)
+        if command is None:
+            break
+    if command is None or isinstance(command, click.MultiCommand) or \
+            command is ctx.command:
+        raise BatchError('unknown operation %s' % name)
+    return command
+
+
+def invoke(ctx, operation: Operation, results):
+    # Run the click command's callback directly, filling in parameters the
+    # same way the command line would, callbacks included, minus prompts and
+    # confirmations: the context is resilient, which the interactive
+    # callbacks (see bulk.py) take as "don't ask".
+    command = find_command(ctx, operation.op)
+    command_ctx = click.Context(command,
+                                info_name=operation.op,
+                                parent=ctx.find_root(),
+                                resilient_parsing=True)
+    args = {
+        name.replace('-', '_'): resolve_reference(value, results)
+        for name, value in operation.args.items()
+    }
+    params = {param.name: param for param in command.params}
+    unknown = set(args) - set(params)
+    if unknown:
+        raise BatchError('unknown arguments %s' % ', '.join(sorted(unknown)))
+    for name, param in params.items():
+        if not param.expose_value:
+            continue
+        value = args.get(name)
+        if value is None:
+            value = param.get_default(command_ctx)
+        if value is None and param.required:
+            raise BatchError('missing argument %s' % name)
+        command_ctx.params[name] = param.process_value(command_ctx, value)
+    with command_ctx:
+        with collect() as emitted:
+            command_ctx.invoke(command.callback, **command_ctx.params)
+    return emitted
+
+
+def run_operation(ctx, operation: Operation, results, stdout, stderr):
+    messages = io.StringIO()
+    start = time.perf_counter()
+    try:
+        with stdout.redirect(messages), stderr.redirect(messages):
+            emitted = invoke(ctx, operation, results)
+        if not emitted:
+            operation.fail('no result')
+        else:
+            operation.result = emitted[-1]
+            if isinstance(operation.result, dict) and \
+                    'err' in operation.result:
+                operation.fail(operation.result['err'])
+            else:
+                operation.status = 'ok'
+    except BatchError as error:
+        operation.fail(str(error))
+    except (click.ClickException, click.Abort) as error:
+        operation.fail(str(error) or type(error).__name__)
+    except Exception as error:
+        operation.fail('%s: %s' % (type(error).__name__, error))
+    operation.latency = time.perf_counter() - start
+    operation.messages = click.unstyle(messages.getvalue()).strip()
+    return operation
+
+
+def in_cycle(operation: Operation, waiting):
+    # Whether the operation depends on itself through waiting operations.
+    by_id = {other.id: other for other in waiting if other.id}
+    stack = [operation]
+    seen = set()
+    while stack:
+        for id in stack.pop().after:
+            if id == operation.id:
+                return True
+            if id in by_id and id not in seen:
+                seen.add(id)
+                stack.append(by_id[id])
+    return False
+
+
+def parse_operations(input):
+    operations = []
+    for line_number, line in enumerate(input, start=1):
+        if not line.strip():
+            continue
+        try:
+            spec = json.loads(line)
+        except ValueError as error:
+            operation = Operation(line_number, {})
+            operation.fail('invalid JSON: %s' % error)
+        else:
+            operation = Operation(line_number, spec)
+        operations.append(operation)
+    ids = [operation.id for operation in operations if operation.id]
+    for operation in operations:
+        if operation.status is None:
+            missing = operation.after - set(ids)
+            if missing:
+                operation.fail('unknown dependency %s' %
+                               ', '.join(sorted(missing)))
+            elif operation.id and ids.count(operation.id) > 1:
+                operation.fail('duplicate id %s' % operation.id)
+    return operations
+
+
+@click.command(
+    'batch',
+    help='Run a stream of operations, one JSON object per line, e.g. '
+    '{"id": "f", "op": "folders.create", "args": {"name": "Sprints"}} '
+    'followed by '
+    '{"op": "lists.create", "args": {"name": "Sprint 1", '
+    '"folder_id": "$f.id"}}. '
+    'Operations run concurrently on a shared connection pool, after any '
+    'operation they reference or list under "after". One JSON result line '
+    'is written per operation as it finishes.')
+@click.argument('input', type=click.File('r'), default='-')
+@click.option('-j',
+              '--concurrency',
+              help='Maximum number of operations to run at once',
+              default=POOL_SIZE,
+              show_default=True,
+              type=click.IntRange(min=1))
+@click.pass_context
+def batch(ctx, input, concurrency):
+    from concurrent.futures import FIRST_COMPLETED, wait
+    from executor import ThreadPoolExecutor
+    operations = parse_operations(input)
+    output = click.get_text_stream('stdout')
+    failed = False
+
+    def finish(operation):
+        nonlocal failed
+        failed = failed or operation.status != 'ok'
+        if operation.id:
+            finished[operation.id] = operation
+        output.write(json.dumps(operation.report()) + '\n')
+        output.flush()
+
+    # Only this thread reads or writes `finished` and `results`, so an
+    # operation never starts before the results it references are stored.
+    finished = {}
+    results = {}
+    waiting = []
+    for operation in operations:
+        if operation.status is None:
+            waiting.append(operation)
+        else:
+            finish(operation)
+
+    # Under `clicli daemon` the streams already are ThreadLocalStreams.
+    original_stdout, original_stderr = sys.stdout, sys.stderr
+    stdout = original_stdout if isinstance(
+        original_stdout, ThreadLocalStream) else ThreadLocalStream(
+            original_stdout)
+    stderr = original_stderr if isinstance(
+        original_stderr, ThreadLocalStream) else ThreadLocalStream(
+            original_stderr)
+    sys.stdout, sys.stderr = stdout, stderr
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            running = set()
+            while waiting or running:
+                for operation in list(waiting):
+                    if not operation.after.issubset(finished):
+                        continue
+                    waiting.remove(operation)
+                    if any(finished[id].status != 'ok'
+                           for id in operation.after):
+                        operation.fail('dependency failed', status='skipped')
+                        finish(operation)
+                    else:
+                        running.add(
+                            executor.submit(run_operation, ctx, operation,
+                                            results, stdout, stderr))
+                if not running:
+                    # Nothing can start: the operations in a cycle fail, and
+                    # the next round skips the ones depending on them.
+                    for operation in [
+                            operation for operation in waiting
+                            if in_cycle(operation, waiting)
+                    ]:
+                        waiting.remove(operation)
+                        operation.fail('circular dependency')
+                        finish(operation)
+                    continue
+                done, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    operation = future.result()
+                    if operation.id:
+                        results[operation.id] = operation.result
+                    finish(operation)
+    finally:
+        sys.stdout, sys.stderr = original_stdout, original_stderr
+    if failed:
+        ctx.exit(1)
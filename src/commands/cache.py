@@ -0,0 +1,33 @@
+import click
+import completion
+import json
+from cache import ResponseCache
+from names import get_name_index
+
+
+@click.group('cache',
+             help='Inspect and clear the on-disk response cache. '
+             'Enable it with ' +
+             click.style('config set cache on', fg='green') + '.')
+def cache():
+    pass
+
+
+@click.command('stats', help='Show response cache size and hit rate')
+def cache_stats():
+    click.echo(json.dumps(ResponseCache().stats(), indent=4, sort_keys=True))
+
+
+@click.command('clear',
+               help='Remove every cached response, indexed name and shell '
+               'completion')
+def cache_clear():
+    count = ResponseCache().clear()
+    names = get_name_index().clear()
+    completions = completion.clear()
+    click.echo('Removed %s cached responses, %s indexed names and %s '
+               'completions' % (count, names, completions))
+
+
+cache.add_command(cache_stats)
+cache.add_command(cache_clear)
@@ -1,20 +1,119 @@
 import click
 import json
+import threading
+from completion import complete_config_value
+from contextlib import contextmanager
 from os.path import expanduser
+import os
 import os.path
 
+try:
+    import fcntl
+except ImportError:  # Windows has no advisory file locks
+    fcntl = None
+
 CONFIG_FILE = expanduser('~/.cliclirc')
+ENV_PREFIX = 'CLICKUP_'
 CONFIG_OPTIONS_TYPE = click.Choice(
-    ['space-id', 'team-id', 'workspace-id', 'user', 'api-key', 'folder-id'])
+    ['space-id', 'team-id', 'workspace-id', 'user', 'api-key', 'folder-id',
+     'cache', 'api-url'])
+
+
+_config = None
+_config_mtime = None
+_config_lock = threading.Lock()
+
+
+# The config holds the API token, so files clicli creates next to it are
+# only readable by the user.
+PRIVATE_MODE = 0o600
+
+
+def open_private(filename: str, flags: int):
+    return os.fdopen(os.open(filename, flags, PRIVATE_MODE), 'w')
 
 
 def ensure_config_file():
     if not os.path.isfile(CONFIG_FILE):
-        with open(CONFIG_FILE, 'w') as file:
+        with open_private(CONFIG_FILE, os.O_WRONLY | os.O_CREAT) as file:
             file.write('{}')
         click.echo('Created config file')
 
 
+def env_var_name(config_key):
+    return ENV_PREFIX + config_key.upper().replace('-', '_')
+
+
+def load_config():
+    # The parsed file is kept for the lifetime of the process and only
+    # re-read when its modification time changes.
+    global _config, _config_mtime
+    with _config_lock:
+        try:
+            mtime = os.stat(CONFIG_FILE).st_mtime_ns
+        except FileNotFoundError:
+            ensure_config_file()
+            mtime = os.stat(CONFIG_FILE).st_mtime_ns
+        if _config is None or mtime != _config_mtime:
+            with open(CONFIG_FILE, 'r') as file:
+                _config = json.load(file)
+            _config_mtime = mtime
+        return _config
+
+
+@contextmanager
+def locked_config_file():
+    ensure_config_file()
+    with open_private(CONFIG_FILE + '.lock', os.O_WRONLY | os.O_CREAT) as lock:
+        # Lock files left by older versions were created world-readable.
+        os.chmod(CONFIG_FILE + '.lock', PRIVATE_MODE)
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def write_config(config):
+    # Write to a temporary file next to the config and rename it over the
+    # original, so readers never observe a partially written file. The new
+    # file keeps the original's permissions.
+    temp_file = '%s.%s.tmp' % (CONFIG_FILE, os.getpid())
+    try:
+        mode = os.stat(CONFIG_FILE).st_mode & 0o777
+    except FileNotFoundError:
+        mode = PRIVATE_MODE
+    try:
+        os.remove(temp_file)  # left by a crash of a process with our PID
+    except FileNotFoundError:
+        pass
+    with open_private(temp_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL) as file:
+        os.fchmod(file.fileno(), mode)
+        file.write(json.dumps(config, indent=4, sort_keys=True))
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_file, CONFIG_FILE)
+
+
+def set_value(key, value):
+    with locked_config_file():
+        with open(CONFIG_FILE, 'r') as file:
+            config = json.load(file)
+        config[key] = value
+        write_config(config)
+
+
+def remove_value(key):
+    with locked_config_file():
+        with open(CONFIG_FILE, 'r') as file:
+            config = json.load(file)
+        if key in config:
+            del config[key]
+            write_config(config)
+
+
 def value_or_config(value, config_key, silent=False):
     if value:
         return value
@@ -22,41 +121,39 @@ def value_or_config(value, config_key, silent=False):
 
 
 def direct_get(config_key, silent=False):
-    ensure_config_file()
-    with open(CONFIG_FILE, 'r') as file:
-        config = json.load(file)
-        if config_key in config:
-            return config[config_key]
-        if not silent:
-            click.echo(click.style('Error', fg='red') + ': ' +
-                       click.style(config_key, fg='green') +
-                       ' not present in config file.',
-                       err=True)
-
-
-@click.group('config', help='Set config values')
+    env_value = os.environ.get(env_var_name(config_key))
+    if env_value:
+        return env_value
+    config = load_config()
+    if config_key in config:
+        return config[config_key]
+    if not silent:
+        click.echo(click.style('Error', fg='red') + ': ' +
+                   click.style(config_key, fg='green') +
+                   ' not present in config file.',
+                   err=True)
+
+
+@click.group('config',
+             help='Set config values. Any value can be overridden with a '
+             'CLICKUP_* environment variable, e.g. CLICKUP_API_KEY.')
 def config():
     pass
 
 
 @click.command('set', help='Set various configuration values')
 @click.argument('key', type=CONFIG_OPTIONS_TYPE)
-@click.argument('value')
+@click.argument('value', shell_complete=complete_config_value)
 def config_set(key, value):
-    ensure_config_file()
-    with open(CONFIG_FILE, 'r+') as file:
-        config = json.load(file)
-        config[key] = value
-        file.seek(0)
-        file.write(json.dumps(config, indent=4, sort_keys=True))
-        file.truncate()
+    set_value(key, value)
 
 
 @click.command('get', help='Get various configuration values')
 @click.argument('key', type=CONFIG_OPTIONS_TYPE)
 def config_get(key):
-    ensure_config_file()
-    direct_get(key)
+    value = direct_get(key)
+    if value is not None:
+        click.echo(value)
 
 
 @click.command('show', help='Show the full config file')
@@ -69,14 +166,7 @@ def config_show():
 @click.command('remove', help='Remove a specific key from the config file')
 @click.argument('key', type=CONFIG_OPTIONS_TYPE)
 def config_remove(key):
-    ensure_config_file()
-    with open(CONFIG_FILE, 'r+') as file:
-        config = json.load(file)
-        if key in config:
-            del config[key]
-            file.seek(0)
-            file.write(json.dumps(config, indent=4, sort_keys=True))
-            file.truncate()
+    remove_value(key)
 
 
 @click.command('setup',
@@ -0,0 +1,96 @@
+import click
+import json
+import os
+from cache import CACHE_DIR
+from daemon import IDLE_TIMEOUT, control, listen, serve, socket_path
+
+LOG_FILE = os.path.join(CACHE_DIR, 'daemon.log')
+
+
+@click.group('daemon',
+             help='Keep clicli running in the background so that each call '
+             'skips interpreter start-up, imports and connecting to the API. '
+             'While it runs, `clicli` hands every command to it. Set '
+             'CLICKUP_DAEMON=0 to run a command in-process anyway.')
+def daemon():
+    pass
+
+
+def detach():
+    # Double fork, so the daemon is not a child of the shell and has no
+    # controlling terminal. Returns True in the daemon.
+    if os.fork():
+        os.wait()
+        return False
+    os.setsid()
+    if os.fork():
+        os._exit(0)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    log = os.open(LOG_FILE, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+    os.dup2(devnull, 0)
+    os.dup2(log, 1)
+    os.dup2(log, 2)
+    os.close(devnull)
+    os.close(log)
+    return True
+
+
+@click.command('start', help='Start the daemon')
+@click.option('--foreground',
+              is_flag=True,
+              help='Serve from this process instead of in the background')
+@click.option('--idle-timeout',
+              help='Exit after this many seconds without calls, 0 for never',
+              default=IDLE_TIMEOUT,
+              show_default=True,
+              type=click.IntRange(min=0))
+@click.pass_context
+def daemon_start(ctx, foreground, idle_timeout):
+    try:
+        server = listen()
+    except OSError as error:
+        click.echo(click.style('Error', fg='red') + ': %s' % error, err=True)
+        ctx.exit(1)
+    if server is None:
+        click.echo('The daemon is already running (pid %s)' %
+                   control({'status': True})['pid'])
+        return
+    if foreground:
+        click.echo('Listening on %s' % socket_path())
+        serve(server, idle_timeout)
+        return
+    if not detach():
+        server.close()
+        click.echo('Started the daemon (pid %s), listening on %s' %
+                   (control({'status': True})['pid'], socket_path()))
+        return
+    try:
+        serve(server, idle_timeout)
+    finally:
+        os._exit(0)
+
+
+@click.command('stop',
+               help='Stop the daemon once the commands it is running finish')
+def daemon_stop():
+    reply = control({'stop': True})
+    if reply is None:
+        click.echo('The daemon is not running')
+    else:
+        click.echo('Stopped the daemon (pid %s)' % reply['stopped'])
+
+
+@click.command('status', help='Show whether the daemon is running')
+@click.pass_context
+def daemon_status(ctx):
+    reply = control({'status': True})
+    if reply is None:
+        click.echo('The daemon is not running')
+        ctx.exit(1)
+    click.echo(json.dumps(reply, indent=4, sort_keys=True))
+
+
+daemon.add_command(daemon_start)
+daemon.add_command(daemon_stop)
+daemon.add_command(daemon_status)
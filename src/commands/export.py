@@ -0,0 +1,278 @@
+import click
+import json
+import os
+from urllib import parse
+from commands.config import value_or_config
+from commands.tasks import scope_list_ids
+from completion import completer
+from constants import PAGE_SIZE
+from output import PageRenderer, emit, output_option
+from projection import fields_option, project
+
+# Writes the tasks of many lists to an ndjson, csv or tsv file. After each
+# page is written and flushed, a checkpoint next to the file records where
+# in the list to continue from and how many bytes of the file the pages
+# before it take. --resume cuts the file back to that length, dropping a
+# page that was only partly written, and carries on from there, so every
+# task ends up in the file once however often the export is interrupted.
+#
+# Lists are read oldest task first by a cursor rather than a page number:
+# each request asks for the tasks created at or after the newest one
+# written, skipping the IDs already written at that time. Tasks that leave
+# the filter during the export (closed, moved) can't shift the tasks after
+# them past a page boundary, and tasks created meanwhile land at the end.
+
+FORMATS = ['ndjson', 'csv', 'tsv']
+CHECKPOINT_VERSION = 2
+# What the cursor reads from every task, whatever --fields keeps.
+CURSOR_FIELDS = {'id': {}, 'date_created': {}}
+
+
+def checkpoint_file(filename: str):
+    return filename + '.checkpoint'
+
+
+def load_checkpoint(filename: str):
+    try:
+        with open(checkpoint_file(filename)) as file:
+            checkpoint = json.load(file)
+    except FileNotFoundError:
+        return None
+    except ValueError:
+        raise click.ClickException('%s is not a checkpoint.' %
+                                   checkpoint_file(filename))
+    if checkpoint.get('version') != CHECKPOINT_VERSION:
+        raise click.ClickException(
+            '%s was written by another version of clicli.' %
+            checkpoint_file(filename))
+    return checkpoint
+
+
+def save_checkpoint(filename: str, checkpoint: dict):
+    # Replaced atomically, so a crash leaves the old or the new checkpoint.
+    path = checkpoint_file(filename)
+    temp_file = '%s.%s.tmp' % (path, os.getpid())
+    with open(temp_file, 'w') as file:
+        json.dump(checkpoint, file)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp_file, path)
+
+
+def format_for(filename: str):
+    extension = os.path.splitext(filename)[1].lower().lstrip('.')
+    return extension if extension in ('csv', 'tsv') else 'ndjson'
+
+
+def export_list_ids(list_ids, space_id, folder_id, team_id):
+    from api import make_api_request
+    if list_ids:
+        return list(list_ids)
+    if space_id is not None or folder_id is not None:
+        return scope_list_ids(space_id, folder_id)
+    team_id = value_or_config(team_id, 'team-id')
+    if not team_id:
+        raise click.UsageError('provide list IDs, --space-id, --folder-id '
+                               'or --team-id.')
+    response = make_api_request('team/%s/space?archived=false' % team_id)
+    if 'spaces' not in response:
+        raise click.ClickException('could not fetch the spaces of team %s' %
+                                   team_id)
+    return [
+        list_id for space in response['spaces']
+        for list_id in scope_list_ids(space['id'], None)
+    ]
+
+
+def run_export(filename: str, checkpoint: dict):
+    from api import NETWORK_ERRORS
+    renderer = PageRenderer('tasks',
+                            checkpoint['format'],
+                            fields=checkpoint['fields'])
+    # csv and tsv keep the columns of the header already written.
+    renderer.columns = checkpoint['columns']
+    with open(filename, 'r+b') as file:
+        file.seek(0, os.SEEK_END)
+        if file.tell() < checkpoint['offset']:
+            raise click.ClickException(
+                '%s is shorter than its checkpoint says; it was changed '
+                'since the export stopped.' % filename)
+        file.truncate(checkpoint['offset'])
+        file.seek(checkpoint['offset'])
+        try:
+            export_pages(file, renderer, filename, checkpoint)
+        except NETWORK_ERRORS + (OSError, ) as error:
+            raise stopped(filename, checkpoint,
+                          '%s: %s' % (type(error).__name__, error))
+
+
+def cursor_fields(fields):
+    if not fields:
+        return None
+    return dict(CURSOR_FIELDS, **fields)
+
+
+def fetch_page(filename: str, checkpoint: dict, fields: dict):
+    # The tasks of the current list created at or after the cursor.
+    from api import checked_page, make_api_request
+    path = 'list/%s/task' % checkpoint['lists'][checkpoint['list']]
+    query = checkpoint['query']
+    if checkpoint['after'] is not None:
+        query += '&date_created_gt=%s' % (checkpoint['after'] - 1)
+    response = make_api_request('%s?page=%s&%s' %
+                                (path, checkpoint['page'], query),
+                                fields=fields)
+    try:
+        return checked_page(response, 'tasks', path,
+                            checkpoint['page'])['tasks']
+    except click.ClickException as error:
+        raise stopped(filename, checkpoint, error.message)
+
+
+def advance(checkpoint: dict, tasks):
+    # Moves the cursor to the newest task of a page. A full page of tasks
+    # all created at the cursor can't move it, so the next page of the same
+    # query is read instead.
+    from models import timestamp
+    last = timestamp(tasks[-1].get('date_created'))
+    ids = [str(task['id']) for task in tasks]
+    if last is not None and last != checkpoint['after']:
+        checkpoint.update(after=last,
+                          page=0,
+                          seen=[
+                              id for id, task in zip(ids, tasks) if
+                              timestamp(task.get('date_created')) == last
+                          ])
+    else:
+        checkpoint.update(page=checkpoint['page'] + 1,
+                          seen=checkpoint['seen'] + ids)
+
+
+def export_pages(file, renderer, filename: str, checkpoint: dict):
+    fields = cursor_fields(checkpoint['fields'])
+    while checkpoint['list'] < len(checkpoint['lists']):
+        tasks = fetch_page(filename, checkpoint, fields)
+        seen = set(checkpoint['seen'])
+        new = [task for task in tasks if str(task['id']) not in seen]
+        if checkpoint['fields']:
+            new = project(new, checkpoint['fields'])
+        file.write(renderer.render(new))
+        file.flush()
+        os.fsync(file.fileno())
+        if len(tasks) < PAGE_SIZE:
+            # The list's last page, whose checkpoint moves on to the next
+            # list, so that a list is finished by the same write that
+            # records its last tasks.
+            checkpoint.update(list=checkpoint['list'] + 1,
+                              after=None,
+                              page=0,
+                              seen=[])
+        else:
+            advance(checkpoint, tasks)
+        checkpoint.update(offset=file.tell(),
+                          columns=renderer.columns,
+                          tasks=checkpoint['tasks'] + len(new))
+        save_checkpoint(filename, checkpoint)
+
+
+def stopped(filename: str, checkpoint: dict, reason: str):
+    return click.ClickException(
+        '%s\nExported %s of %s lists (%s tasks) so far. Run `clicli export '
+        '%s --resume` to continue.' %
+        (reason, checkpoint['list'], len(checkpoint['lists']),
+         checkpoint['tasks'], filename))
+
+
+@click.command('export',
+               help='Write the tasks of lists to FILENAME, one per line as '
+               'ndjson, csv or tsv. Without list IDs, --space-id or '
+               '--folder-id, every list of the team is exported. Progress '
+               'is checkpointed after every page, so an export that stops '
+               'can be continued with --resume. csv and tsv columns are '
+               'the --fields given, or else the fields of the first task.')
+@click.argument('filename', type=click.Path(dir_okay=False, writable=True))
+@click.argument('list_ids', nargs=-1, shell_complete=completer('list'))
+@click.option('--space-id',
+              shell_complete=completer('space'),
+              help='Export every list of this space.')
+@click.option('--folder-id',
+              shell_complete=completer('folder'),
+              help='Export every list of this folder.')
+@click.option('--team-id',
+              shell_complete=completer('team'),
+              help='Export every list of this team. Defaults to the '
+              'configured team.')
+@click.option('--format',
+              'format',
+              type=click.Choice(FORMATS),
+              help='Defaults to csv or tsv for files with those extensions, '
+              'and ndjson otherwise.')
+@click.option('--resume',
+              is_flag=True,
+              help='Continue an export that stopped, with the lists and '
+              'options it was started with.')
+@click.option('-a',
+              '--archived',
+              is_flag=True,
+              help='Include archived tasks')
+@click.option('--subtasks', is_flag=True, help='Include subtasks')
+@click.option('--include-closed',
+              is_flag=True,
+              help='Include closed tasks')
+@fields_option
+@output_option
+def export(filename, list_ids, space_id, folder_id, team_id, format, resume,
+           archived, subtasks, include_closed, fields):
+    checkpoint = load_checkpoint(filename)
+    if resume:
+        if checkpoint is None:
+            raise click.UsageError('there is no unfinished export to %s.' %
+                                   filename)
+        if list_ids or space_id or folder_id or team_id or format or fields:
+            raise click.UsageError(
+                '--resume continues with the lists and options the export '
+                'was started with.')
+    else:
+        if checkpoint is not None:
+            raise click.UsageError(
+                'an export to %s was not finished. Pass --resume to '
+                'continue it, or remove %s to start over.' %
+                (filename, checkpoint_file(filename)))
+        query = {
+            'order_by': 'created',
+            'reverse': 'true',
+            'archived': str(archived).lower(),
+            'subtasks': str(subtasks).lower(),
+            'include_closed': str(include_closed).lower(),
+        }
+        checkpoint = {
+            'version': CHECKPOINT_VERSION,
+            'format': format or format_for(filename),
+            'query': parse.urlencode(query),
+            'fields': fields,
+            'lists': [
+                str(id) for id in export_list_ids(list_ids, space_id,
+                                                  folder_id, team_id)
+            ],
+            # The list being exported, the cursor into it (the creation
+            # time of the newest task written, the IDs written at that time
+            # and the page of the query from there), and the length of the
+            # file up to it.
+            'list': 0,
+            'after': None,
+            'seen': [],
+            'page': 0,
+            'offset': 0,
+            'columns': None,
+            'tasks': 0,
+        }
+        open(filename, 'wb').close()
+        save_checkpoint(filename, checkpoint)
+    run_export(filename, checkpoint)
+    os.remove(checkpoint_file(filename))
+    emit({
+        'file': filename,
+        'format': checkpoint['format'],
+        'lists': len(checkpoint['lists']),
+        'tasks': checkpoint['tasks'],
+    })
@@ -1,21 +1,77 @@
 import click
-import json
 import sys
-from api import make_api_request
+from bulk import (bulk_options, bulk_selected, confirm_unless_dry_run,
+                  matching, prompt_unless_selected, read_ids, renamed,
+                  run_bulk)
 from commands.config import value_or_config
+from completion import completer
+from names import get_name_index, trusted
+from output import emit, output_option
+from projection import fields_option, project_response
 
 
-def abort_if_false(ctx, param, value):
-    if not value:
-        ctx.abort()
+def index_folders(space_id, folders, archived=False):
+    name_index = get_name_index()
+    name_index.replace('folder', 'space:%s' % space_id, folders, archived)
+    for folder in folders:
+        if 'lists' in folder:
+            name_index.replace('list', 'folder:%s' % folder['id'],
+                               folder['lists'], archived)
 
 
-def find_folder_by_name(name: str, space_id: int, archived=False):
-    response = make_api_request('space/%s/folder?archived=%s' %
-                                (space_id, str(archived)))
-    for folder in response['folders']:
-        if folder['name'] == name:
-            return folder
+def find_folder_by_name(name: str,
+                        space_id: int,
+                        archived=False,
+                        refresh=False):
+    from api import make_api_request
+    name_index = get_name_index()
+    parent = 'space:%s' % space_id
+    folder = None
+    if not refresh:
+        folder = name_index.lookup('folder', parent, name, archived)
+    if folder is None:
+        response = make_api_request('space/%s/folder?archived=%s' %
+                                    (space_id, str(archived)))
+        if response is None or 'folders' not in response:
+            return
+        index_folders(space_id, response['folders'], archived)
+        folder = name_index.lookup('folder', parent, name, archived)
+    return folder
+
+
+def find_current_folder(name: str, space_id: int, fetch=True):
+    # As lists.find_current_list: the folder named `name` as the API has it
+    # now, or None.
+    from api import make_api_request
+    folder = find_folder_by_name(name, space_id)
+    if folder is None:
+        return None
+    if not fetch and trusted(folder):
+        return folder
+    response = make_api_request('folder/%s' % folder['id'])
+    if response.get('name', '').casefold() == name.casefold():
+        return response
+    get_name_index().forget('folder', folder['id'])
+    folder = find_folder_by_name(name, space_id, refresh=True)
+    if folder is None:
+        return None
+    return make_api_request('folder/%s' % folder['id'])
+
+
+def select_folders(space_id, match, regex, ids_from):
+    # Folders of a space picked by --match or --regex, or read with
+    # --ids-from.
+    from api import make_api_request
+    if ids_from is not None:
+        return [{'id': id, 'name': None} for id in read_ids(ids_from)]
+    if not space_id:
+        raise click.UsageError('provide --space-id.')
+    response = make_api_request('space/%s/folder' % space_id)
+    if 'folders' not in response:
+        raise click.ClickException('could not fetch the folders of space %s' %
+                                   space_id)
+    index_folders(space_id, response['folders'])
+    return matching(response['folders'], match, regex)
 
 
 @click.group('folders',
@@ -27,6 +83,7 @@ def folders():
 @click.command('list', help='List all folders that belong to a space')
 @click.option('-s',
               '--space-id',
+              shell_complete=completer('space'),
               help='The ID of the space to return folders for. '
               'Will use config values if not provided.')
 @click.option('-a',
@@ -45,11 +102,29 @@ def folders():
               is_flag=True,
               default=False,
               required=False)
-def folders_list(space_id, archived, include_lists, include_list_statuses):
+@click.option('--local',
+              is_flag=True,
+              help='Read from the local mirror kept by ' +
+              click.style('clicli sync', fg='green') + '.')
+@fields_option
+@output_option
+def folders_list(space_id, archived, include_lists, include_list_statuses,
+                 local, fields):
+    from api import make_api_request
+    from mirror import get_mirror
     space_id = value_or_config(space_id, 'space-id')
-    response = make_api_request('space/%s/folder?archived=%s' %
-                                (space_id, str(archived)))
+    if local:
+        response = {
+            'folders': [
+                folder.to_dict()
+                for folder in get_mirror().folders(space_id, archived)
+            ]
+        }
+    else:
+        response = make_api_request('space/%s/folder?archived=%s' %
+                                    (space_id, str(archived)))
     if 'folders' in response:
+        index_folders(space_id, response['folders'], archived)
         for folder in response['folders']:
             if not include_lists and 'lists' in folder:
                 del folder['lists']
@@ -57,11 +132,11 @@ def folders_list(space_id, archived, include_lists, include_list_statuses):
                 for list in folder['lists']:
                     if 'statuses' in list:
                         del list['statuses']
-    click.echo(json.dumps(response, indent=4, sort_keys=True))
+    emit(project_response(response, fields))
 
 
 @click.command('get', help='Get a single folder by ID')
-@click.argument('folder-id')
+@click.argument('folder-id', shell_complete=completer('folder'))
 @click.option('--include-lists',
               help='Include feature information',
               is_flag=True,
@@ -72,7 +147,10 @@ def folders_list(space_id, archived, include_lists, include_list_statuses):
               is_flag=True,
               default=False,
               required=False)
-def folders_get(folder_id, include_lists, include_list_statuses):
+@fields_option
+@output_option
+def folders_get(folder_id, include_lists, include_list_statuses, fields):
+    from api import make_api_request
     response = make_api_request('folder/%s' % folder_id)
     if not include_lists and 'lists' in response:
         del response['lists']
@@ -80,40 +158,79 @@ def folders_get(folder_id, include_lists, include_list_statuses):
         for list in response['lists']:
             if 'statuses' in list:
                 del list['statuses']
-    click.echo(json.dumps(response, indent=4, sort_keys=True))
+    emit(project_response(response, fields))
 
 
 @click.command('create', help='Create a new folder within an existing space')
 @click.argument('name')
 @click.option('-s',
               '--space-id',
+              shell_complete=completer('space'),
               help='The space ID to create the folder under. '
               'If no value is provided, default value from .cliclirc is used.')
+@output_option
 def folders_create(space_id, name):
+    from api import make_api_request
     space_id = value_or_config(space_id, 'space-id')
     body = {'name': name}
     response = make_api_request('space/%s/folder' % space_id,
                                 method='POST',
                                 body=body)
-    click.echo(json.dumps(response, indent=4, sort_keys=True))
+    get_name_index().record('folder', 'space:%s' % space_id, response)
+    emit(response)
 
 
 @click.command('rename',
-               help='Renames a file by utilizing either the name or id option')
+               help='Renames a file by utilizing either the name or id option. '
+               'With --match, --regex or --ids-from every selected folder is '
+               'renamed, and {name} and {id} in NEW_NAME stand for its '
+               'current name and ID.')
 @click.option('-n',
               '--name',
               required=False,
               help='The original name of the folder to rename.',
-              prompt=True)
+              shell_complete=completer('folder', 'name'),
+              callback=prompt_unless_selected)
 @click.argument('new-name')
-@click.option('--id', help='Rename by ID instead of by name', required=False)
+@click.option('--id',
+              help='Rename by ID instead of by name',
+              required=False,
+              shell_complete=completer('folder'))
 @click.option('-s',
               '--space-id',
+              shell_complete=completer('space'),
               help='If a name is specified, '
               'look for folders in the given space. '
               'Defaults to the space ID in the .cliclirc config.')
-def folders_rename(name, space_id, id, new_name):
+@bulk_options('folder')
+@output_option
+def folders_rename(name, space_id, id, new_name, match, regex, ids_from,
+                   dry_run, concurrency):
+    from api import make_api_request
     body = {'name': new_name}
+    if bulk_selected(name, id, match, regex, ids_from, dry_run):
+        name_index = get_name_index()
+
+        def preview(folder):
+            return {
+                'new_name':
+                renamed(new_name, folder, 'folder/%s' % folder['id'])
+            }
+
+        def rename(folder):
+            folder_name = renamed(new_name, folder,
+                                  'folder/%s' % folder['id'])
+            response = make_api_request('folder/%s' % folder['id'],
+                                        method='PUT',
+                                        body={'name': folder_name})
+            if 'err' not in response:
+                name_index.rename('folder', folder['id'], folder_name)
+            return response
+
+        space_id = value_or_config(space_id, 'space-id', silent=True)
+        run_bulk('folder', select_folders(space_id, match, regex, ids_from),
+                 rename, concurrency, dry_run, preview)
+        return
     if not name and not id:
         click.echo(click.style('Error', fg='red') +
                    ': No name or id provided.',
@@ -126,37 +243,70 @@ def folders_rename(name, space_id, id, new_name):
                 ': both name and ID provided. Defaulting to id.')
     if id:
         response = make_api_request('folder/%s' % id, method='PUT', body=body)
+        folder_id = id
     else:
         space_id = value_or_config(space_id, 'space-id')
-        folder = find_folder_by_name(name, space_id)
-        if folder is not None:
-            response = make_api_request('folder/%s' % folder['id'],
-                                        method='PUT',
-                                        body=body,
-                                        verbose=True)
-        else:
+        folder = find_current_folder(name, space_id, fetch=False)
+        if folder is None or 'id' not in folder:
             click.echo(
                 click.style('Error', fg='red') + ': No such folder found')
             return
-    click.echo(json.dumps(response, indent=4, sort_keys=True))
+        response = make_api_request('folder/%s' % folder['id'],
+                                    method='PUT',
+                                    body=body,
+                                    verbose=True)
+        folder_id = folder['id']
+    if 'err' not in response:
+        get_name_index().rename('folder', folder_id, new_name)
+    emit(response)
 
 
-@click.command('remove', help='Delete a folder')
+@click.command('remove',
+               help='Delete a folder, or every folder of a space selected '
+               'with --match, --regex or --ids-from')
 @click.option('-q',
               '--quiet',
               help='Do not prompt prior to deletion.',
-              prompt='Are you sure you want to delete the list? '
-              'This is not the same as archiving.',
               is_flag=True,
               expose_value=False,
-              callback=abort_if_false)
-@click.argument('id')
-def folders_remove(id):
+              callback=confirm_unless_dry_run(
+                  'Are you sure you want to delete the list? '
+                  'This is not the same as archiving.'))
+@click.argument('id', required=False, shell_complete=completer('folder'))
+@click.option('-s',
+              '--space-id',
+              shell_complete=completer('space'),
+              help='The space to select folders from. '
+              'Defaults to the space ID in the .cliclirc config.')
+@bulk_options('folder')
+@output_option
+def folders_remove(id, space_id, match, regex, ids_from, dry_run,
+                   concurrency):
+    from api import make_api_request
+    if bulk_selected(None, id, match, regex, ids_from, dry_run):
+        name_index = get_name_index()
+
+        def remove(folder):
+            response = make_api_request('folder/%s' % folder['id'],
+                                        method='DELETE')
+            if 'err' not in response:
+                name_index.forget('folder', folder['id'])
+            return response
+
+        space_id = value_or_config(space_id, 'space-id', silent=True)
+        run_bulk('folder', select_folders(space_id, match, regex, ids_from),
+                 remove, concurrency, dry_run)
+        return
+    if not id:
+        raise click.UsageError(
+            'provide an ID, or one of --match, --regex and --ids-from.')
     response = make_api_request('folder/%s' % id, method='DELETE')
-    click.echo(json.dumps(response, indent=4, sort_keys=True))
+    get_name_index().forget('folder', id)
+    emit(response)
 
 
 folders.add_command(folders_list)
 folders.add_command(folders_get)
 folders.add_command(folders_create)
 folders.add_command(folders_rename)
+folders.add_command(folders_remove)
@@ -1,37 +1,116 @@
 import click
 import sys
-import json
-from api import make_api_request
+from bulk import (bulk_options, bulk_selected, confirm_unless_dry_run,
+                  matching, prompt_unless_selected, read_ids, renamed,
+                  run_bulk)
 from commands.config import value_or_config
+from commands.folders import index_folders
+from completion import completer
+from names import get_name_index, trusted
+from output import emit, output_option
+from projection import fields_option, project_response
 
 CLICKUP_PRIORITIES = click.Choice(['1', '2', '3', '4'])
 
 
-def abort_if_false(ctx, param, value):
-    if not value:
-        ctx.abort()
+def list_parent(space_id=None, folder_id=None):
+    if folder_id:
+        return 'folder:%s' % folder_id
+    return 'space:%s' % space_id
 
 
 def find_list_by_name(name: str,
                       space_id: int = None,
                       folder_id: int = None,
-                      archived=False):
-    if folder_id:
-        response = make_api_request('folder/%s/list?archived=%s' %
-                                    (folder_id, str(archived)))
-        if response is None:
+                      archived=False,
+                      refresh=False):
+    from api import make_api_request
+    name_index = get_name_index()
+    parent = list_parent(space_id, folder_id)
+    list = None
+    if not refresh:
+        list = name_index.lookup('list', parent, name, archived)
+    if list is None:
+        if folder_id:
+            response = make_api_request('folder/%s/list?archived=%s' %
+                                        (folder_id, str(archived)))
+        else:
+            response = make_api_request('space/%s/list?archived=%s' %
+                                        (space_id, str(archived)))
+        if response is None or 'lists' not in response:
             return
-        for list in response['lists']:
-            if list['name'].upper() == name.upper():
-                return list
+        name_index.replace('list', parent, response['lists'], archived)
+        list = name_index.lookup('list', parent, name, archived)
+    return list
+
+
+def find_current_list(name: str,
+                      space_id: int = None,
+                      folder_id: int = None,
+                      fetch=True):
+    # The list named `name` as the API has it now, or None. Name index
+    # entries are kept for a day, so one for a list renamed or deleted since
+    # it was indexed is dropped and the name looked up again from the API.
+    # Callers that only need the ID pass fetch=False, and then an entry
+    # indexed within NAME_TRUST_AGE is returned as is, without a request.
+    from api import make_api_request
+    list = find_list_by_name(name, space_id=space_id, folder_id=folder_id)
+    if list is None:
+        return None
+    if not fetch and trusted(list):
+        return list
+    response = make_api_request('list/%s' % list['id'])
+    if response.get('name', '').casefold() == name.casefold():
+        return response
+    get_name_index().forget('list', list['id'])
+    list = find_list_by_name(name,
+                             space_id=space_id,
+                             folder_id=folder_id,
+                             refresh=True)
+    if list is None:
+        return None
+    return make_api_request('list/%s' % list['id'])
+
+
+def select_lists(space_id, folder_id, match, regex, ids_from):
+    # Lists picked by --match or --regex among those of a folder, or among
+    # every list of a space, or read with --ids-from.
+    from api import make_api_request
+    if ids_from is not None:
+        return [{'id': id, 'name': None} for id in read_ids(ids_from)]
+    name_index = get_name_index()
+    if folder_id:
+        response = make_api_request('folder/%s/list' % folder_id)
+        if 'lists' not in response:
+            raise click.ClickException(
+                'could not fetch the lists of folder %s' % folder_id)
+        name_index.replace('list', 'folder:%s' % folder_id, response['lists'])
+        lists = response['lists']
+    elif space_id:
+        folders = make_api_request('space/%s/folder' % space_id)
+        folderless = make_api_request('space/%s/list' % space_id)
+        if 'folders' not in folders or 'lists' not in folderless:
+            raise click.ClickException(
+                'could not fetch the lists of space %s' % space_id)
+        index_folders(space_id, folders['folders'])
+        name_index.replace('list', 'space:%s' % space_id,
+                           folderless['lists'])
+        lists = [
+            list for folder in folders['folders']
+            for list in folder.get('lists') or []
+        ] + folderless['lists']
     else:
-        response = make_api_request('space/%s/list?archived=%s' %
-                                    (space_id, str(archived)))
-        if response is None:
-            return
-        for list in response['lists']:
-            if list['name'].upper() == name.upper():
-                return list
+        raise click.UsageError('provide either --space-id or --folder-id.')
+    return matching(lists, match, regex)
+
+
+def select_scope(space_id, folder_id):
+    # A folder given with --folder-id, or configured while --space-id is
+    # not given, is searched instead of the space.
+    real_folder_id = value_or_config(folder_id, 'folder-id', silent=True)
+    if folder_id or real_folder_id and not space_id:
+        return None, real_folder_id
+    return value_or_config(space_id, 'space-id', silent=True), None
 
 
 @click.group('lists', help='Get, create, update, delete, and more for lists')
@@ -49,9 +128,11 @@ def lists():
 @click.argument('content', required=False)
 @click.option('-f',
               '--folder-id',
+              shell_complete=completer('folder'),
               help='The folder to create the list within.')
 @click.option('-s',
               '--space-id',
+              shell_complete=completer('space'),
               help='Create a folderless list within a space.')
 @click.option(
     '-p',
@@ -64,8 +145,10 @@ def lists():
               '--due-date-time',
               help='Specify a due date time for the the list')
 @click.option('-s', '--status', help='Specify a status for the list')
+@output_option
 def lists_create(name, folder_id, space_id, priority, assignee, content,
                  due_date, due_date_time, status):
+    from api import make_api_request
     real_space_id = value_or_config(space_id, 'space-id', silent=True)
     real_folder_id = value_or_config(folder_id, 'folder-id', silent=True)
     body = {
@@ -92,12 +175,16 @@ def lists_create(name, folder_id, space_id, priority, assignee, content,
         response = make_api_request('folder/%s/list' % real_folder_id,
                                     method='POST',
                                     body=body)
-        click.echo(json.dumps(response, indent=4, sort_keys=True))
+        get_name_index().record('list', 'folder:%s' % real_folder_id,
+                                response)
+        emit(response)
     else:
         response = make_api_request('space/%s/list' % real_space_id,
                                     method='POST',
                                     body=body)
-        click.echo(json.dumps(response, indent=4, sort_keys=True))
+        get_name_index().record('list', 'space:%s' % real_space_id,
+                                response)
+        emit(response)
 
 
 @click.command(
@@ -106,8 +193,12 @@ def lists_create(name, folder_id, space_id, priority, assignee, content,
     'If you specify a folder ID, folderless lists will not be included.')
 @click.option('-s',
               '--space-id',
+              shell_complete=completer('space'),
               help='The space to find folderless lists within.')
-@click.option('-f', '--folder-id', help='The folder to find lists within.')
+@click.option('-f',
+              '--folder-id',
+              shell_complete=completer('folder'),
+              help='The folder to find lists within.')
 @click.option('-a',
               '--archived',
               help='Include archived spaces',
@@ -122,7 +213,16 @@ def lists_create(name, folder_id, space_id, priority, assignee, content,
               default=False,
               required=False)
 @click.option('-u', '--user', help='Return lists assigned to the given user.')
-def lists_list(space_id, folder_id, archived, me, user):
+@click.option('--local',
+              is_flag=True,
+              help='Read from the local mirror kept by ' +
+              click.style('clicli sync', fg='green') + '.')
+@fields_option
+@output_option
+def lists_list(space_id, folder_id, archived, me, user, local, fields):
+    from api import make_api_request
+    from mirror import get_mirror
+    from models import List
     real_space_id = value_or_config(space_id, 'space-id', silent=True)
     real_folder_id = value_or_config(folder_id, 'folder-id', silent=True)
     assigned_user = value_or_config(user, 'user')
@@ -138,83 +238,147 @@ def lists_list(space_id, folder_id, archived, me, user):
                 ': both --space-id and --folder-id provided.' +
                 'Defaulting to --folder-id value.')
     if folder_id or (real_folder_id and not space_id):
-        response = make_api_request('folder/%s/list?archived=%s' %
-                                    (real_folder_id, str(archived)))
-        if user or me:
-            lists = [
-                list for list in response['lists'] if list['assignee'] == user
-            ]
-            response['lists'] = lists
-        click.echo(json.dumps(response, indent=4, sort_keys=True))
+        parent = {'folder_id': real_folder_id}
+        path = 'folder/%s/list' % real_folder_id
+        index_parent = 'folder:%s' % real_folder_id
+    else:
+        parent = {'space_id': real_space_id}
+        path = 'space/%s/list' % real_space_id
+        index_parent = 'space:%s' % real_space_id
+    if local:
+        response = {'lists': get_mirror().lists(archived=archived, **parent)}
     else:
-        response = make_api_request('space/%s/list?archived=%s' %
-                                    (real_space_id, str(archived)))
+        response = make_api_request('%s?archived=%s' % (path, str(archived)))
+        if 'lists' in response:
+            response['lists'] = [
+                List.from_dict(list, archived=archived, **parent)
+                for list in response['lists']
+            ]
+    if 'lists' in response:
+        lists = response['lists']
+        get_name_index().replace('list', index_parent,
+                                 [{
+                                     'id': list.id,
+                                     'name': list.name
+                                 } for list in lists], archived)
         if user or me:
             lists = [
-                list for list in response['lists']
-                if list['assignee'] == assigned_user
+                list for list in lists
+                if list.assignee_id == str(assigned_user)
             ]
-            response['lists'] = lists
-        click.echo(json.dumps(response, indent=4, sort_keys=True))
+        response['lists'] = [list.to_dict() for list in lists]
+    emit(project_response(response, fields))
 
 
-@click.command('remove', help='Delete a list')
+@click.command('remove',
+               help='Delete a list, or every list selected with --match, '
+               '--regex or --ids-from. --match and --regex search the lists '
+               'of --folder-id, or of every folder and the folderless lists '
+               'of --space-id.')
 @click.option('-q',
               '--quiet',
               help='Do not prompt prior to deletion.',
-              prompt='Are you sure you want to delete the list? '
-              'This is not the same as archiving.',
               is_flag=True,
               expose_value=False,
-              callback=abort_if_false)
-@click.argument('id')
-def lists_remove(id):
+              callback=confirm_unless_dry_run(
+                  'Are you sure you want to delete the list? '
+                  'This is not the same as archiving.'))
+@click.argument('id', required=False, shell_complete=completer('list'))
+@click.option('-s',
+              '--space-id',
+              shell_complete=completer('space'),
+              help='The space to select lists from. '
+              'Defaults to the space ID in the .cliclirc config.')
+@click.option('-f',
+              '--folder-id',
+              shell_complete=completer('folder'),
+              help='The folder to select lists from. '
+              'Defaults to the folder ID in the .cliclirc config.')
+@bulk_options('list')
+@output_option
+def lists_remove(id, space_id, folder_id, match, regex, ids_from, dry_run,
+                 concurrency):
+    from api import make_api_request
+    if bulk_selected(None, id, match, regex, ids_from, dry_run):
+        name_index = get_name_index()
+
+        def remove(list):
+            response = make_api_request('list/%s' % list['id'],
+                                        method='DELETE')
+            if 'err' not in response:
+                name_index.forget('list', list['id'])
+            return response
+
+        run_bulk('list',
+                 select_lists(*select_scope(space_id, folder_id), match,
+                              regex, ids_from), remove, concurrency, dry_run)
+        return
+    if not id:
+        raise click.UsageError(
+            'provide an ID, or one of --match, --regex and --ids-from.')
     response = make_api_request('list/%s' % id, method='DELETE')
-    click.echo(json.dumps(response, indent=4, sort_keys=True))
+    get_name_index().forget('list', id)
+    emit(response)
 
 
 @click.command('get', help='Get a list')
-@click.argument('id_or_name')
+@click.argument('id_or_name',
+                shell_complete=completer('list', 'id_or_name'))
 @click.option('-f',
               '--folder-id',
+              shell_complete=completer('folder'),
               help='ID of the folder to get the list from.')
 @click.option('-s',
               '--space-id',
+              shell_complete=completer('space'),
               help='ID of the space to get the folderless list from')
-def lists_get(id_or_name: str, space_id, folder_id):
+@fields_option
+@output_option
+def lists_get(id_or_name: str, space_id, folder_id, fields):
+    from api import make_api_request
     if id_or_name.isnumeric():
         response = make_api_request('list/%s' % id_or_name)
-        click.echo(json.dumps(response, indent=4, sort_keys=True))
+        emit(project_response(response, fields))
     else:
         space_id = value_or_config(space_id, 'space-id', silent=True)
         folder_id = value_or_config(folder_id, 'folder-id', silent=True)
-        small_response = find_list_by_name(id_or_name,
-                                           space_id=space_id,
-                                           folder_id=folder_id)
-        if small_response is not None:
-            response = make_api_request('list/%s' % small_response['id'])
-            click.echo(json.dumps(response, indent=4, sort_keys=True))
+        response = find_current_list(id_or_name,
+                                     space_id=space_id,
+                                     folder_id=folder_id)
+        if response is not None:
+            emit(project_response(response, fields))
         else:
             click.echo(click.style('Error', fg='red') + ': No list found')
 
 
 @click.command('update',
-               help='Renames a file by utilizing either the name or id option')
+               help='Renames a file by utilizing either the name or id option. '
+               'With --match, --regex or --ids-from every selected list is '
+               'updated, and {name} and {id} in NEW_NAME stand for its '
+               'current name and ID. --match and --regex search the lists of '
+               '--folder-id, or of every folder and the folderless lists of '
+               '--space-id.')
 @click.option('-n',
               '--name',
               required=False,
               help='The original name of the list to rename.',
-              prompt=True)
+              shell_complete=completer('list', 'name'),
+              callback=prompt_unless_selected)
 @click.argument('new-name')
 @click.option('-c', '--content', help='The content (string) of the list')
-@click.option('--id', help='Rename by ID instead of by name', required=False)
+@click.option('--id',
+              help='Rename by ID instead of by name',
+              required=False,
+              shell_complete=completer('list'))
 @click.option('-s',
               '--space-id',
+              shell_complete=completer('space'),
               help='If a name is specified, '
               'look for lists in the given space. '
               'Defaults to the space ID in the .cliclirc config.')
 @click.option('-f',
               '--folder-id',
+              shell_complete=completer('folder'),
               help='If a name is specified, '
               'look for lists in the given folder. '
               'Defaults to the folder ID in the .cliclirc config.')
@@ -230,8 +394,12 @@ def lists_get(id_or_name: str, space_id, folder_id):
               help='Specify a due date time for the the list')
 @click.option('-s', '--status', help='Specify a status for the list')
 @click.option('--unset-status', help='Remove the status of the list')
+@bulk_options('list')
+@output_option
 def lists_update(name, space_id, folder_id, id, new_name, priority, assignee,
-                 due_date, due_date_time, status, unset_status, content):
+                 due_date, due_date_time, status, unset_status, content, match,
+                 regex, ids_from, dry_run, concurrency):
+    from api import make_api_request
     body = {
         'name': new_name,
         'content': content,
@@ -242,6 +410,29 @@ def lists_update(name, space_id, folder_id, id, new_name, priority, assignee,
         'status': status,
         'unset_status': unset_status,
     }
+    if bulk_selected(name, id, match, regex, ids_from, dry_run):
+        name_index = get_name_index()
+
+        def preview(list):
+            return {
+                'new_name':
+                renamed(new_name, list, 'list/%s' % list['id'])
+            }
+
+        def update(list):
+            list_name = renamed(new_name, list, 'list/%s' % list['id'])
+            response = make_api_request('list/%s' % list['id'],
+                                        method='PUT',
+                                        body=dict(body, name=list_name))
+            if 'err' not in response:
+                name_index.rename('list', list['id'], list_name)
+            return response
+
+        run_bulk('list',
+                 select_lists(*select_scope(space_id, folder_id), match,
+                              regex, ids_from), update, concurrency, dry_run,
+                 preview)
+        return
     if not name and not id:
         click.echo(click.style('Error', fg='red') +
                    ': No name or id provided.',
@@ -254,34 +445,30 @@ def lists_update(name, space_id, folder_id, id, new_name, priority, assignee,
                 ': both name and ID provided. Defaulting to id.')
     if id:
         response = make_api_request('list/%s' % id, method='PUT', body=body)
+        list_id = id
     else:
         real_space_id = value_or_config(space_id, 'space-id')
-        real_folder_id = value_or_config(space_id, 'folder_id')
+        real_folder_id = value_or_config(folder_id, 'folder-id', silent=True)
         if folder_id or real_folder_id and not space_id:
             # We are going to find the list within a folder
-            list = find_list_by_name(name, folder_id=real_folder_id)
-            if list is not None:
-                response = make_api_request('list/%s' % list['id'],
-                                            method='PUT',
-                                            body=body,
-                                            verbose=True)
-            else:
-                click.echo(
-                    click.style('Error', fg='red') + ': No such list found')
-                return
+            list = find_current_list(name,
+                                     folder_id=real_folder_id,
+                                     fetch=False)
         else:
-            # We are going to find the list within a folder
-            list = find_list_by_name(name, space_id=real_space_id)
-            if list is not None:
-                response = make_api_request('list/%s' % list['id'],
-                                            method='PUT',
-                                            body=body,
-                                            verbose=True)
-            else:
-                click.echo(
-                    click.style('Error', fg='red') + ': No such list found')
-                return
-    click.echo(json.dumps(response, indent=4, sort_keys=True))
+            list = find_current_list(name,
+                                     space_id=real_space_id,
+                                     fetch=False)
+        if list is None or 'id' not in list:
+            click.echo(click.style('Error', fg='red') + ': No such list found')
+            return
+        response = make_api_request('list/%s' % list['id'],
+                                    method='PUT',
+                                    body=body,
+                                    verbose=True)
+        list_id = list['id']
+    if 'err' not in response:
+        get_name_index().rename('list', list_id, new_name)
+    emit(response)
 
 
 lists.add_command(lists_list)
@@ -1,7 +1,8 @@
 import click
-import json
-from api import make_api_request
 from commands.config import value_or_config
+from completion import completer
+from output import emit, output_option
+from projection import fields_option, project_response
 
 
 @click.group('spaces', help='List, view, update, and delete spaces')
@@ -13,7 +14,8 @@ def spaces():
 @click.option('-t',
               '--team-id',
               help='The team ID you want to access',
-              required=False)
+              required=False,
+              shell_complete=completer('team'))
 @click.option('-a',
               '--archived',
               help='Include archived spaces',
@@ -30,21 +32,41 @@ def spaces():
               is_flag=True,
               default=False,
               required=False)
-def list_spaces(team_id, archived, include_features, include_statuses):
+@click.option('--local',
+              is_flag=True,
+              help='Read from the local mirror kept by ' +
+              click.style('clicli sync', fg='green') + '.')
+@fields_option
+@output_option
+def list_spaces(team_id, archived, include_features, include_statuses,
+                local, fields):
+    from api import make_api_request
+    from mirror import get_mirror
     team_id = value_or_config(team_id, 'team-id')
-    response = make_api_request('team/%s/space?archived=%s' %
-                                (team_id, str(archived)))
+    if local:
+        response = {
+            'spaces': [
+                space.to_dict()
+                for space in get_mirror().spaces(team_id, archived)
+            ]
+        }
+    else:
+        response = make_api_request('team/%s/space?archived=%s' %
+                                    (team_id, str(archived)))
     if 'spaces' in response:
         for space in response['spaces']:
             if not include_features and 'features' in space:
                 del space['features']
             if not include_statuses and 'statuses' in space:
                 del space['statuses']
-    click.echo(json.dumps(response, indent=4, sort_keys=True))
+    emit(project_response(response, fields))
 
 
 @click.command('get', help='Get a single space and associated information')
-@click.option('-s', '--space-id', help='The ID of the space to return')
+@click.option('-s',
+              '--space-id',
+              help='The ID of the space to return',
+              shell_complete=completer('space'))
 @click.option('--include-features',
               help='Include feature information',
               is_flag=True,
@@ -55,14 +77,17 @@ def list_spaces(team_id, archived, include_features, include_statuses):
               is_flag=True,
               default=False,
               required=False)
-def get_space(space_id, include_features, include_statuses):
+@fields_option
+@output_option
+def get_space(space_id, include_features, include_statuses, fields):
+    from api import make_api_request
     space_id = value_or_config(space_id, 'space-id')
     response = make_api_request('space/%s' % space_id)
     if not include_features and 'features' in response:
         del response['features']
     if not include_statuses and 'statuses' in response:
         del response['statuses']
-    click.echo(json.dumps(response, indent=4, sort_keys=True))
+    emit(project_response(response, fields))
 
 
 spaces.add_command(list_spaces)
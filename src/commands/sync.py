@@ -0,0 +1,182 @@
+import click
+import time
+from urllib import parse
+import cache as response_cache
+from commands.config import direct_get
+from completion import completer
+from constants import POOL_SIZE
+from output import emit, output_option
+
+# Incremental syncs can't see deleted tasks, so each list is fully
+# re-downloaded at least this often to drop them from the mirror.
+FULL_SYNC_INTERVAL = 24 * 60 * 60
+
+
+def fetch_collection(path: str, key: str, archived: bool):
+    from api import make_api_request
+    items = []
+    for include_archived in ([False, True] if archived else [False]):
+        response = make_api_request('%s?archived=%s' %
+                                    (path, str(include_archived)))
+        if key not in response:
+            raise click.ClickException('could not fetch %s' % path)
+        items.append(response[key])
+    return items
+
+
+def sync_space(mirror, space_id, archived: bool):
+    list_ids = []
+    for include_archived, folders in zip(
+        [False, True], fetch_collection('space/%s/folder' % space_id,
+                                        'folders', archived)):
+        mirror.replace_folders(space_id, folders, include_archived)
+        for folder in folders:
+            lists = folder.get('lists') or []
+            mirror.replace_lists(space_id, folder['id'], lists,
+                                 include_archived)
+            list_ids += [list['id'] for list in lists]
+    for include_archived, lists in zip(
+        [False, True], fetch_collection('space/%s/list' % space_id, 'lists',
+                                        archived)):
+        mirror.replace_lists(space_id, None, lists, include_archived)
+        list_ids += [list['id'] for list in lists]
+    return list_ids
+
+
+def sync_team(mirror, team_id, archived: bool, concurrency: int):
+    from api import make_api_request
+    from executor import ThreadPoolExecutor
+    response = make_api_request('team')
+    if 'teams' not in response:
+        raise click.ClickException('could not fetch teams')
+    mirror.replace_teams(response['teams'])
+    space_ids = []
+    for include_archived, spaces in zip(
+        [False, True], fetch_collection('team/%s/space' % team_id, 'spaces',
+                                        archived)):
+        mirror.replace_spaces(team_id, spaces, include_archived)
+        space_ids += [space['id'] for space in spaces]
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list_ids = executor.map(lambda id: sync_space(mirror, id, archived),
+                                space_ids)
+        return [id for ids in list_ids for id in ids]
+
+
+def fetch_list_tasks(mirror, list_id, full: bool):
+    from api import iter_tasks
+    high_water, full_synced_at = mirror.sync_state(list_id)
+    full = full or high_water is None or full_synced_at is None or \
+        full_synced_at < time.time() - FULL_SYNC_INTERVAL
+    tasks = []
+    for archived in (False, True):
+        query = {
+            'archived': str(archived).lower(),
+            'include_closed': 'true',
+            'subtasks': 'true',
+        }
+        if not full:
+            # Timestamps are in milliseconds; step back one so tasks updated
+            # in the same millisecond as the mark are not missed.
+            query['date_updated_gt'] = high_water - 1
+        # An error page raises, so a list is only stored, and with a full
+        # sync its missing tasks deleted, after every page was fetched.
+        try:
+            for task in iter_tasks(list_id, query=parse.urlencode(query)):
+                if archived:
+                    task['archived'] = True
+                tasks.append(task)
+        except click.ClickException as error:
+            raise click.ClickException(
+                'could not sync list %s, its tasks were left unchanged: %s'
+                % (list_id, error.format_message()))
+    return list_id, tasks, full
+
+
+@click.command(
+    'sync',
+    help='Mirror the hierarchy and tasks into a local SQLite database. '
+    'After the first run only tasks updated since the previous sync are '
+    'fetched. Read commands serve from the mirror with --local.')
+@click.option('-t',
+              '--team-id',
+              shell_complete=completer('team'),
+              help='Sync every space of this team. '
+              'Defaults to the team ID in the .cliclirc config.')
+@click.option('-s',
+              '--space-id',
+              multiple=True,
+              shell_complete=completer('space'),
+              help='Only sync the given space. Can be repeated.')
+@click.option('-l',
+              '--list-id',
+              multiple=True,
+              shell_complete=completer('list'),
+              help='Only sync the given list. Can be repeated.')
+@click.option('-a',
+              '--archived',
+              is_flag=True,
+              help='Include archived spaces, folders and lists')
+@click.option('--full',
+              is_flag=True,
+              help='Re-download every task, removing deleted ones')
+@click.option('-j',
+              '--concurrency',
+              help='Maximum number of lists to sync at once',
+              default=POOL_SIZE,
+              show_default=True,
+              type=click.IntRange(min=1))
+@output_option
+def sync(team_id, space_id, list_id, archived, full, concurrency):
+    from api import make_api_request
+    from executor import ThreadPoolExecutor
+    from mirror import get_mirror
+    start = time.perf_counter()
+    # The mirror must reflect the server, never a cached response, but
+    # fresh responses may still refresh the cache.
+    response_cache.configure(enabled=response_cache.is_enabled(),
+                             refresh=True)
+    mirror = get_mirror()
+    removed = 0
+    if list_id:
+        list_ids = list(list_id)
+        for id in list_ids:
+            response = make_api_request('list/%s' % id)
+            if 'id' not in response:
+                raise click.ClickException('could not fetch list %s' % id)
+            mirror.upsert_list(response)
+    elif space_id:
+        list_ids = []
+        for id in space_id:
+            list_ids += sync_space(mirror, id, archived)
+        removed += mirror.remove_orphans(hierarchy=False)
+    else:
+        team_id = team_id or direct_get('team-id')
+        if not team_id:
+            return
+        list_ids = sync_team(mirror, team_id, archived, concurrency)
+        removed += mirror.remove_orphans()
+
+    updated = 0
+    full_lists = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for id, tasks, was_full in executor.map(
+                lambda id: fetch_list_tasks(mirror, id, full), list_ids):
+            stored, deleted = mirror.store_tasks(
+                id,
+                tasks,
+                full=was_full,
+                seen_ids=[str(task['id']) for task in tasks])
+            updated += stored
+            removed += deleted
+            full_lists += was_full
+    if updated or removed:
+        mirror.analyze()
+
+    emit({
+        'lists': len(list_ids),
+        'full_lists': full_lists,
+        'tasks_updated': updated,
+        'tasks_removed': removed,
+        'seconds': round(time.perf_counter() - start, 3),
+        'mirror': mirror.filename,
+    })
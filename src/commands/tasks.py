@@ -1,20 +1,49 @@
 import click
-import json
+import heapq
+import time
 from datetime import datetime
-from api import make_api_request
 from commands.config import direct_get
+from completion import completer
+from constants import PAGE_CONCURRENCY, PAGE_SIZE, POOL_SIZE
+from output import (dumps, emit, emit_pages, output_option, stdout_closed,
+                    write)
+from projection import fields_option, project
 from urllib import parse
 
 CLICKUP_ORDER = click.Choice(['id', 'created', 'updated', 'due_date'])
 
+WATCH_INTERVAL = 5
+WATCH_MAX_INTERVAL = 60
+# Without --since, the first poll of each list looks back this far (in
+# milliseconds) and only records what it finds, so a server clock that is
+# behind ours doesn't hide the first changes.
+CLOCK_SKEW = 60 * 1000
+
 
 @click.group('tasks', help='Get, create, update, delete, and more for tasks')
 def tasks():
     pass
 
 
-@click.command('list', help='List all tasks from a list')
-@click.argument('list_id', type=int)
+@click.command('list',
+               help='List all tasks from a list, or from every list of a '
+               'space or folder with --space-id or --folder-id, or of a '
+               'team with --team-id.')
+@click.argument('list_id',
+                type=int,
+                required=False,
+                shell_complete=completer('list'))
+@click.option('--space-id',
+              shell_complete=completer('space'),
+              help='Fetch the tasks of every list in this space '
+              'concurrently. Implies --all.')
+@click.option('--folder-id',
+              shell_complete=completer('folder'),
+              help='Fetch the tasks of every list in this folder '
+              'concurrently. Implies --all.')
+@click.option('--team-id',
+              shell_complete=completer('team'),
+              help='Fetch the tasks of the whole team. Implies --all.')
 @click.option('--page',
               help='Page of tasks',
               required=False,
@@ -24,6 +53,28 @@ def tasks():
               is_flag=True,
               help='Automatically paginate through all pages '
               '(will make multiple requests)')
+@click.option('-j',
+              '--concurrency',
+              help='Maximum number of pages to fetch at once with --all, '
+              'or across lists',
+              default=PAGE_CONCURRENCY,
+              show_default=True,
+              type=click.IntRange(min=1))
+@click.option('--local',
+              is_flag=True,
+              help='Read from the local mirror kept by ' +
+              click.style('clicli sync', fg='green') + '.')
+@click.option('-w',
+              '--where',
+              help='Only with --local. Filter expression such as '
+              '\'status = "in progress" and (assignee = 123 or '
+              'due_date < 2021-06-01)\'. Fields: id, name, status, list, '
+              'assignee, parent, closed, archived, due_date, date_created, '
+              'date_updated, date_closed. Operators: = != < <= > >= ~')
+@click.option('-n',
+              '--limit',
+              help='Only with --local. Return at most this many tasks.',
+              type=click.IntRange(min=0))
 @click.option('-a',
               '--archived',
               is_flag=True,
@@ -76,12 +127,26 @@ def tasks():
 # TODO: Include flags to cut out list, project, folder, space info
 # (eg. --include-list)
 # TODO: Add flag for opening the tasks with prompting (--open or --web)
-def tasks_list(list_id, page, all, order, archived, reverse, subtasks,
+@fields_option
+@output_option
+def tasks_list(list_id, space_id, folder_id, team_id, page, all, concurrency,
+               local, where, limit, fields,
+               order, archived, reverse, subtasks,
                statuses: str, include_closed, assignees, me,
                due_date_gt: datetime, due_date_lt: datetime,
                date_created_gt: datetime, date_created_lt: datetime,
                date_updated_gt: datetime, date_updated_lt: datetime):
     # TODO: Need to resolve lookup of emails to user IDs (users module)
+    from api import make_api_request, iter_pages, merge_tasks
+    from mirror import get_mirror
+    from query import QueryError
+    scopes = [
+        scope for scope in (list_id, space_id, folder_id, team_id)
+        if scope is not None
+    ]
+    if len(scopes) != 1:
+        raise click.UsageError('Give a list ID or one of --space-id, '
+                               '--folder-id and --team-id')
     if me:
         me_user = direct_get('user')
         if assignees:
@@ -123,23 +188,304 @@ def tasks_list(list_id, page, all, order, archived, reverse, subtasks,
             del query_parameters[key]
     query_str = parse.urlencode(query_parameters)
 
+    if local:
+        mirror = get_mirror()
+        list_ids = [list_id] if list_id is not None else local_list_ids(
+            mirror, team_id, space_id, folder_id)
+        if not list_ids:
+            emit({'tasks': []})
+            return
+        try:
+            local_tasks = mirror.query_tasks(
+                list_ids=list_ids,
+                statuses=statuses,
+                include_closed=include_closed,
+                assignees=assignees,
+                archived=archived,
+                subtasks=subtasks,
+                due_date_gt=due_date_gt,
+                due_date_lt=due_date_lt,
+                date_created_gt=date_created_gt,
+                date_created_lt=date_created_lt,
+                date_updated_gt=date_updated_gt,
+                date_updated_lt=date_updated_lt,
+                where=where,
+                order=order,
+                reverse=reverse,
+                limit=limit)
+        except QueryError as error:
+            raise click.BadParameter(str(error), param_hint='--where')
+        # Each task is only decoded when its page is written.
+        emit_pages(task_pages(
+            project(task.to_dict(), fields) for task in local_tasks),
+                   'tasks',
+                   sort_keys=False)
+        return
+
+    if where or limit is not None:
+        raise click.UsageError('--where and --limit require --local')
+
+    if team_id is not None:
+        # One endpoint, sorted by the server, for every list of the team.
+        emit_pages(iter_pages('team/%s/task' % team_id,
+                              'tasks',
+                              query=query_str,
+                              page=page,
+                              concurrency=concurrency,
+                              fields=fields),
+                   'tasks',
+                   sort_keys=False)
+        return
+
+    if list_id is None:
+        emit_pages(task_pages(
+            merge_tasks(scope_list_ids(space_id, folder_id),
+                        query=query_str,
+                        order=order,
+                        reverse=reverse,
+                        concurrency=concurrency,
+                        fields=fields)),
+                   'tasks',
+                   sort_keys=False)
+        return
+
     if all:
-        # If we are getting all elements, let's do pagination
-        full_response = {'tasks': []}
-        while len(full_response['tasks']) == page * 100:
+        # If we are getting all elements, let's do pagination. Each page is
+        # written as soon as it arrives.
+        emit_pages(iter_pages('list/%s/task' % list_id,
+                              'tasks',
+                              query=query_str,
+                              page=page,
+                              concurrency=concurrency,
+                              fields=fields),
+                   'tasks',
+                   sort_keys=False)
+        return
+
+    response = make_api_request('list/%s/task?page=%s&%s' %
+                                (list_id, page, query_str),
+                                fields=fields)
+
+    if (len(response['tasks']) == 100 or page != 0):
+        response['page'] = page
+
+    emit(response, sort_keys=False)
+
+
+def scope_list_ids(space_id, folder_id):
+    # IDs of the lists in a folder, or of every list in a space: those in
+    # its folders followed by the folderless ones.
+    from api import make_api_request
+    if folder_id is not None:
+        responses = [('lists', make_api_request('folder/%s/list' % folder_id))]
+    else:
+        responses = [
+            ('folders', make_api_request('space/%s/folder' % space_id)),
+            ('lists', make_api_request('space/%s/list' % space_id)),
+        ]
+    list_ids = []
+    for key, response in responses:
+        if key not in response:
+            raise click.ClickException(
+                'could not fetch the lists of %s %s' %
+                (('folder', folder_id) if folder_id is not None else
+                 ('space', space_id)))
+        if key == 'folders':
+            list_ids += [
+                list['id'] for folder in response['folders']
+                for list in folder.get('lists') or []
+            ]
+        else:
+            list_ids += [list['id'] for list in response['lists']]
+    return list_ids
+
+
+def local_list_ids(mirror, team_id, space_id, folder_id):
+    if folder_id is not None:
+        return [list.id for list in mirror.lists(folder_id=folder_id)]
+    space_ids = [space_id] if space_id is not None else [
+        space.id for space in mirror.spaces(team_id)
+    ]
+    list_ids = []
+    for id in space_ids:
+        for folder in mirror.folders(id):
+            list_ids += [
+                list.id for list in mirror.lists(folder_id=folder.id)
+            ]
+        list_ids += [list.id for list in mirror.lists(space_id=id)]
+    return list_ids
+
+
+def task_pages(tasks):
+    page = []
+    for task in tasks:
+        page.append(task)
+        if len(page) == PAGE_SIZE:
+            yield {'tasks': page}
+            page = []
+    if page:
+        yield {'tasks': page}
+
+
+class WatchedList:
+    def __init__(self, list_id, since: int, primed: bool, interval: float):
+        self.id = list_id
+        # Tasks updated after `since` (milliseconds) are fetched next.
+        self.since = since
+        self.primed = primed
+        self.interval = interval
+        # Task ID -> (date_updated, closed) as last seen.
+        self.known = {}
+
+    def poll(self):
+        from api import make_api_request
+        query = parse.urlencode({
+            'include_closed': 'true',
+            'subtasks': 'true',
+            # Step back one millisecond so tasks updated in the same
+            # millisecond as the mark are not missed; they are recognized
+            # by their unchanged date_updated.
+            'date_updated_gt': self.since - 1,
+        })
+        tasks = []
+        page = 0
+        while True:
             response = make_api_request('list/%s/task?page=%s&%s' %
-                                        (list_id, page, query_str))
-            full_response['tasks'] = full_response['tasks'] + response['tasks']
+                                        (self.id, page, query))
+            if 'tasks' not in response:
+                raise click.ClickException('could not fetch tasks of list %s'
+                                           % self.id)
+            tasks += response['tasks']
+            if len(response['tasks']) < PAGE_SIZE:
+                return tasks
             page += 1
-        response = full_response
-    else:
-        response = make_api_request('list/%s/task?page=%s&%s' %
-                                    (list_id, page, query_str))
 
-        if (len(response['tasks']) == 100 or page != 0):
-            response['page'] = page
+    def diff(self, tasks):
+        # Returns (event, task) for every task that changed since it was last
+        # seen.
+        from models import is_closed, timestamp
+        events = []
+        since = self.since
+        for task in sorted(
+                tasks, key=lambda task: timestamp(task.get('date_updated'))
+                or 0):
+            updated = timestamp(task.get('date_updated')) or 0
+            closed = is_closed(task)
+            previous = self.known.get(task['id'])
+            if previous is not None and previous[0] >= updated:
+                continue
+            self.known[task['id']] = (updated, closed)
+            self.since = max(self.since, updated)
+            if not self.primed:
+                continue
+            if previous is not None:
+                was_closed = previous[1]
+            else:
+                # Closed before the mark, unless it was closed since.
+                was_closed = closed and \
+                    (timestamp(task.get('date_closed')) or 0) <= since
+            if previous is None and \
+                    (timestamp(task.get('date_created')) or 0) > since:
+                events.append(('created', task))
+            elif closed and not was_closed:
+                events.append(('closed', task))
+            else:
+                events.append(('updated', task))
+        self.primed = True
+        return events
 
-    click.echo(json.dumps(response, indent=4))
+
+@click.command('watch',
+               help='Follow changes to tasks in one or more lists, printing '
+               'one JSON line per created, updated or closed task. Each list '
+               'is polled for tasks updated since its previous poll, more '
+               'often while it is changing.')
+@click.argument('list_ids',
+                nargs=-1,
+                required=True,
+                type=int,
+                shell_complete=completer('list'))
+@click.option('--interval',
+              help='Seconds between polls of a list that is changing',
+              default=WATCH_INTERVAL,
+              show_default=True,
+              type=click.FloatRange(min=0.1))
+@click.option('--max-interval',
+              help='Polls of a quiet list back off up to this many seconds',
+              default=WATCH_MAX_INTERVAL,
+              show_default=True,
+              type=click.FloatRange(min=0.1))
+@click.option('--since',
+              help='Also report changes made since this time',
+              type=click.DateTime(
+                  formats=['%Y-%m-%d', '%Y-%m-%dT%H:%M:%S']))
+@click.option('-j',
+              '--concurrency',
+              help='Maximum number of lists to poll at once',
+              default=POOL_SIZE,
+              show_default=True,
+              type=click.IntRange(min=1))
+@fields_option
+def tasks_watch(list_ids, interval, max_interval, since: datetime,
+                concurrency, fields):
+    from concurrent.futures import FIRST_COMPLETED, wait
+    from executor import ThreadPoolExecutor
+    max_interval = max(interval, max_interval)
+    if since:
+        start, primed = int(since.timestamp() * 1000), True
+    else:
+        start, primed = int(time.time() * 1000) - CLOCK_SKEW, False
+    watched = [
+        WatchedList(list_id, start, primed, interval)
+        for list_id in dict.fromkeys(list_ids)
+    ]
+    # (when, index) of the next poll of each list that isn't being polled
+    due = [(time.monotonic(), index) for index in range(len(watched))]
+    running = {}
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    try:
+        while True:
+            while due and due[0][0] <= time.monotonic() and \
+                    len(running) < concurrency:
+                _, index = heapq.heappop(due)
+                running[executor.submit(watched[index].poll)] = index
+            timeout = max(0, due[0][0] - time.monotonic()) if due else None
+            if not running:
+                time.sleep(timeout)
+                continue
+            done, _ = wait(running,
+                           timeout=timeout,
+                           return_when=FIRST_COMPLETED)
+            for future in done:
+                index = running.pop(future)
+                watch = watched[index]
+                try:
+                    events = watch.diff(future.result())
+                except Exception as error:
+                    click.echo(click.style('Error', fg='red') + ': %s' %
+                               error,
+                               err=True)
+                    events = None
+                if events:
+                    watch.interval = interval
+                    write(b''.join(
+                        dumps({
+                            'event': event,
+                            'list_id': str(watch.id),
+                            'task': project(task, fields)
+                        }) + b'\n' for event, task in events))
+                else:
+                    watch.interval = max_interval if events is None else \
+                        min(watch.interval * 2, max_interval)
+                heapq.heappush(due,
+                               (time.monotonic() + watch.interval, index))
+    except KeyboardInterrupt:
+        pass
+    except BrokenPipeError:
+        stdout_closed()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
 
 
 tasks.add_command(tasks_list)
+tasks.add_command(tasks_watch)
@@ -1,6 +1,6 @@
 import click
-import json
-from api import make_api_request
+from output import emit, output_option
+from projection import fields_option, project_response
 
 
 @click.group(
@@ -20,15 +20,28 @@ def teams():
               help='True to include role information',
               default=False,
               is_flag=True)
-def list_teams(include_members, include_roles):
-    response = make_api_request('team')
+@click.option('--local',
+              is_flag=True,
+              help='Read from the local mirror kept by ' +
+              click.style('clicli sync', fg='green') + '.')
+@fields_option
+@output_option
+def list_teams(include_members, include_roles, local, fields):
+    from api import make_api_request
+    from mirror import get_mirror
+    if local:
+        response = {
+            'teams': [team.to_dict() for team in get_mirror().teams()]
+        }
+    else:
+        response = make_api_request('team')
     if 'teams' in response:
         for team in response['teams']:
             if not include_members and 'members' in team:
                 del team['members']
             if not include_roles and 'roles' in team:
                 del team['roles']
-    click.echo(json.dumps(response, indent=4, sort_keys=True))
+    emit(project_response(response, fields))
 
 
 teams.add_command(list_teams)
@@ -0,0 +1,175 @@
+import click
+import completion
+from constants import POOL_SIZE
+from names import get_name_index
+from output import FORMATS, emit, emit_pages, output_callback
+
+LEVELS = ['team', 'space', 'folder', 'list']
+TREE_FORMATS = click.Choice(['text'] + FORMATS)
+
+
+def node(type: str, item: dict, archived=False):
+    return {
+        'type': type,
+        'id': str(item['id']),
+        'name': item.get('name'),
+        'archived': bool(item.get('archived', archived)),
+        'children': [],
+    }
+
+
+def archived_flags(archived: bool):
+    # The archived values fetched, and so the ones the name index can be
+    # brought up to date for.
+    return [False, True] if archived else [False]
+
+
+def fetch(path: str, key: str, archived: bool):
+    # Returns (item, archived) pairs, including archived items if asked.
+    from api import checked, make_api_request
+    items = []
+    for include_archived in archived_flags(archived):
+        separator = '&' if '?' in path else '?'
+        response = make_api_request('%s%sarchived=%s' %
+                                    (path, separator, str(include_archived)))
+        items += [(item, include_archived)
+                  for item in checked(response, key, path)[key]]
+    return items
+
+
+def fetch_spaces(team, archived):
+    spaces = fetch('team/%s/space' % team['id'], 'spaces', archived)
+    for include_archived in archived_flags(archived):
+        get_name_index().replace(
+            'space', 'team:%s' % team['id'],
+            [space for space, flag in spaces if flag == include_archived],
+            include_archived)
+    team['children'] = [
+        node('space', space, flag) for space, flag in spaces
+    ]
+
+
+def fetch_folders(space, archived, depth):
+    name_index = get_name_index()
+    folders = fetch('space/%s/folder' % space['id'], 'folders', archived)
+    for folder, flag in folders:
+        child = node('folder', folder, flag)
+        if depth > 3:
+            child['children'] = [
+                node('list', list, flag) for list in folder.get('lists', [])
+            ]
+            name_index.replace('list', 'folder:%s' % folder['id'],
+                               folder.get('lists', []), flag)
+        space['children'].append(child)
+    for include_archived in archived_flags(archived):
+        name_index.replace(
+            'folder', 'space:%s' % space['id'],
+            [folder for folder, flag in folders if flag == include_archived],
+            include_archived)
+
+
+def fetch_folderless_lists(space, archived):
+    lists = fetch('space/%s/list' % space['id'], 'lists', archived)
+    for include_archived in archived_flags(archived):
+        get_name_index().replace(
+            'list', 'space:%s' % space['id'],
+            [list for list, flag in lists if flag == include_archived],
+            include_archived)
+    return [node('list', list, flag) for list, flag in lists]
+
+
+def build_tree(team_id=(), depth=4, archived=False, concurrency=POOL_SIZE):
+    # Returns the nested nodes of the given teams (all if none). Raises
+    # ClickException when any level can't be fetched, rather than return a
+    # tree with parts missing.
+    from api import checked, make_api_request
+    from executor import ThreadPoolExecutor
+    response = checked(make_api_request('team'), 'teams', 'team')
+    teams = [
+        node('team', team) for team in response['teams']
+        if not team_id or str(team['id']) in team_id
+    ]
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        if depth > 1:
+            list(executor.map(lambda team: fetch_spaces(team, archived),
+                              teams))
+        if depth > 2:
+            spaces = [space for team in teams for space in team['children']]
+            folderless = executor.map(
+                lambda space: fetch_folderless_lists(space, archived),
+                spaces) if depth > 3 else []
+            list(
+                executor.map(
+                    lambda space: fetch_folders(space, archived, depth),
+                    spaces))
+            for space, lists in zip(spaces, folderless):
+                space['children'] += lists
+    return teams
+
+
+def walk(nodes, depth=0, parent=None):
+    for item in nodes:
+        yield item, depth, parent
+        yield from walk(item['children'], depth + 1, item)
+
+
+@click.command(
+    'tree',
+    help='Show the Team -> Space -> Folder -> List hierarchy. '
+    'Each level is fetched in parallel, including folderless lists.')
+@click.option('-t',
+              '--team-id',
+              multiple=True,
+              shell_complete=completion.completer('team'),
+              help='Only show the given team. Can be repeated.')
+@click.option('-d',
+              '--depth',
+              help='How many levels to show: 1 teams, 2 spaces, 3 folders, '
+              '4 lists',
+              default=4,
+              show_default=True,
+              type=click.IntRange(1, 4))
+@click.option('-a',
+              '--archived',
+              is_flag=True,
+              help='Include archived spaces, folders and lists')
+@click.option('--output',
+              help='Indented text, one nested JSON document (json, '
+              'compact), or one line per node (ndjson, csv, tsv)',
+              default='text',
+              show_default=True,
+              type=TREE_FORMATS,
+              callback=output_callback)
+@click.option('-j',
+              '--concurrency',
+              help='Maximum number of requests in flight per level',
+              default=POOL_SIZE,
+              show_default=True,
+              type=click.IntRange(min=1))
+def tree(team_id, depth, archived, output, concurrency):
+    teams = build_tree(team_id, depth, archived, concurrency)
+    if not team_id and depth == 4:
+        # The whole hierarchy was fetched anyway; keep shell completion
+        # up to date with it.
+        completion.save(teams)
+
+    if output in ('json', 'compact'):
+        emit({'teams': teams}, sort_keys=False)
+    elif output != 'text':
+        lines = []
+        for item, level, parent in walk(teams):
+            line = {key: value for key, value in item.items()
+                    if key != 'children'}
+            line['depth'] = level
+            line['parent_id'] = parent['id'] if parent else None
+            lines.append(line)
+        emit_pages(iter([{'nodes': lines}]), 'nodes')
+    else:
+        for item, level, parent in walk(teams):
+            click.echo('%s%s %s%s' %
+                       ('    ' * level, click.style(item['name'] or '',
+                                                    bold=level == 0),
+                        click.style('(%s %s)' % (item['type'], item['id']),
+                                    fg='blue'),
+                        click.style(' archived', fg='yellow')
+                        if item['archived'] else ''))
@@ -0,0 +1,421 @@
+import os
+import sys
+import time
+from constants import CACHE_DIR, MINUTE
+
+# Shell completion of team, space, folder and list IDs and names. Completing
+# never waits for the network: candidates are read from a small
+# tab-separated file of the hierarchy, which `clicli tree` rewrites and which
+# a completion refreshes in a background process once it is stale.
+#
+# The shell starts a fresh process for every completion, so this module only
+# imports what reading the file needs. The callbacks are attached to
+# parameters with `shell_complete=completer(...)`.
+#
+# Importing click alone takes longer than a completion may, so the entry
+# point first tries answer(), which reads the command line against a spec of
+# the commands' options and arguments written by the first completion that
+# went through click. Only values of parameters with these callbacks are
+# answered there; everything else, and a spec older than the sources, falls
+# back to click.
+
+COMPLETION_FILE = os.path.join(CACHE_DIR, 'completion.tsv')
+SPEC_FILE = os.path.join(CACHE_DIR, 'completion-spec.json')
+COMPLETE_VAR = '_CLICLI_COMPLETE'
+COMPLETION_TTL = 10 * MINUTE
+# Refreshes fail while offline or logged out; wait this long before the next
+# attempt rather than starting one on every key press.
+REFRESH_RETRY = MINUTE
+# The kinds `config set` values name.
+CONFIG_KINDS = {
+    'team-id': 'team',
+    'workspace-id': 'team',
+    'space-id': 'space',
+    'folder-id': 'folder',
+}
+# As commands.config, which imports click.
+CONFIG_FILE = os.path.expanduser('~/.cliclirc')
+ENV_PREFIX = 'CLICKUP_'
+# click's output for a completion, by shell.
+ITEM_FORMATS = {
+    'bash': lambda value, help: 'plain,%s' % value,
+    'zsh': lambda value, help: 'plain\n%s\n%s' % (value, help or '_'),
+    'fish': lambda value, help: ('plain,%s\t%s' % (value, help)
+                                 if help else 'plain,%s' % value),
+}
+
+
+def read_items(filename: str = COMPLETION_FILE):
+    # Returns (kind, parent, id, name) tuples, where parent is e.g.
+    # 'space:10' and empty for teams.
+    try:
+        with open(filename, encoding='utf-8') as file:
+            return [tuple(line[:-1].split('\t', 3)) for line in file]
+    except FileNotFoundError:
+        return []
+
+
+def save(teams, filename: str = COMPLETION_FILE):
+    # Writes the nodes built by commands.tree.build_tree. Archived items are
+    # left out, since names are only looked up among unarchived ones.
+    lines = []
+
+    def add(nodes, parent):
+        for item in nodes:
+            if item['archived']:
+                continue
+            name = ' '.join((item['name'] or '').split())
+            lines.append('%s\t%s\t%s\t%s\n' %
+                         (item['type'], parent, item['id'], name))
+            add(item['children'], '%s:%s' % (item['type'], item['id']))
+
+    add(teams, '')
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    temp_file = '%s.%s.tmp' % (filename, os.getpid())
+    with open(temp_file, 'w', encoding='utf-8') as file:
+        file.writelines(lines)
+    os.replace(temp_file, filename)
+
+
+def clear(filename: str = COMPLETION_FILE):
+    count = len(read_items(filename))
+    try:
+        os.remove(filename)
+    except FileNotFoundError:
+        pass
+    return count
+
+
+def refresh(filename: str = COMPLETION_FILE):
+    # Fetches the hierarchy and rewrites the file, unless another refresh
+    # holds the lock. The lock file's mtime records the last attempt.
+    import fcntl
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    with open(filename + '.lock', 'w') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return
+        os.utime(filename + '.lock')
+        from click import ClickException
+        from commands.tree import build_tree
+        try:
+            teams = build_tree()
+        except ClickException:
+            return  # e.g. logged out; the lock's mtime delays a retry
+        save(teams, filename)
+
+
+def refresh_if_stale(filename: str = COMPLETION_FILE):
+    # Starts a refresh in a detached child and returns at once; the
+    # completion that noticed answers from the stale file.
+    now = time.time()
+    for path, max_age in ((filename, COMPLETION_TTL),
+                          (filename + '.lock', REFRESH_RETRY)):
+        try:
+            if now - os.stat(path).st_mtime < max_age:
+                return
+        except FileNotFoundError:
+            pass
+    if not hasattr(os, 'fork'):
+        return
+    # The child waits for this process to exit, which closes the pipe, so it
+    # doesn't compete with the completion for the CPU.
+    exited, running = os.pipe()
+    if os.fork():
+        os.close(exited)
+        return
+    # The child must not hold the shell's pipe open, or the shell would wait
+    # for the refresh before showing the completions.
+    try:
+        os.close(running)
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for fd in (0, 1, 2):
+            os.dup2(devnull, fd)
+        os.setsid()
+        os.nice(10)
+        os.read(exited, 1)
+        refresh(filename)
+    finally:
+        os._exit(0)
+
+
+def candidates(kind: str, incomplete: str, parent: str = None,
+               by: str = 'id'):
+    # Returns (value, help) pairs for the items of a kind whose ID or name
+    # starts with incomplete. by is 'id', 'name' or 'id_or_name'; the latter
+    # completes IDs once a digit is typed and names otherwise. Names are
+    # matched case-insensitively.
+    by_id = by == 'id' or by == 'id_or_name' and incomplete.isdigit()
+    prefix = incomplete.casefold()
+    matches = []
+    for item in read_items():
+        if len(item) != 4 or item[0] != kind or \
+                parent is not None and item[1] != parent:
+            continue
+        if by_id:
+            if item[2].startswith(incomplete):
+                matches.append((item[2], item[3]))
+        elif item[3].casefold().startswith(prefix):
+            matches.append((item[3], item[2]))
+    return matches
+
+
+def config_value(key: str):
+    # commands.config.direct_get without creating the file.
+    value = os.environ.get(ENV_PREFIX + key.upper().replace('-', '_'))
+    if value:
+        return value
+    import json
+    try:
+        with open(CONFIG_FILE) as file:
+            return json.load(file).get(key)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def scope(params: dict, kind: str, names: bool):
+    # The parent the command looks items up in: --folder-id or --space-id
+    # when given, and for names also the configured ones, as the commands
+    # fall back to those.
+    parents = {'list': ['folder', 'space'], 'folder': ['space']}
+    for parent in parents.get(kind, []):
+        if params.get('%s_id' % parent):
+            return '%s:%s' % (parent, params['%s_id' % parent])
+    if not names:
+        return None
+    for parent in parents.get(kind, []):
+        value = config_value('%s-id' % parent)
+        if value:
+            return '%s:%s' % (parent, value)
+
+
+def matches(params: dict, kind: str, incomplete: str, by: str = 'id'):
+    names = by == 'name' or by == 'id_or_name' and not incomplete.isdigit()
+    return candidates(kind, incomplete, scope(params, kind, names), by)
+
+
+def complete(ctx, kind: str, incomplete: str, by: str = 'id'):
+    from click.shell_completion import CompletionItem
+    refresh_if_stale()
+    if load_spec() is None:
+        save_spec(ctx.find_root().command)
+    return [
+        CompletionItem(value, help=help)
+        for value, help in matches(ctx.params, kind, incomplete, by)
+    ]
+
+
+def completer(kind: str, by: str = 'id'):
+    def shell_complete(ctx, param, incomplete):
+        return complete(ctx, kind, incomplete, by)
+
+    # Read by save_spec.
+    shell_complete.completes = (kind, by)
+    return shell_complete
+
+
+def complete_config_value(ctx, param, incomplete):
+    kind = CONFIG_KINDS.get(ctx.params.get('key'))
+    if kind is None:
+        return []
+    return complete(ctx, kind, incomplete)
+
+
+complete_config_value.completes = ('config', 'id')
+
+
+def sources_stamp():
+    # Changes whenever a command module does, e.g. after an upgrade.
+    directory = os.path.dirname(os.path.abspath(__file__))
+    stamp = 0
+    for path in (directory, os.path.join(directory, 'commands')):
+        for entry in os.scandir(path):
+            if entry.name.endswith('.py'):
+                stamp = max(stamp, entry.stat().st_mtime_ns)
+    return stamp
+
+
+def describe(command, ctx):
+    # The options, arguments and subcommands of a command, with the kind and
+    # by of the parameters completed here.
+    import click
+    spec = {'options': {}, 'arguments': [], 'commands': {}}
+    for param in command.get_params(ctx):
+        # click keeps the shell_complete callback under a private name.
+        completes = getattr(getattr(param, '_custom_shell_complete', None),
+                            'completes', None)
+        if isinstance(param, click.Option):
+            nargs = 0 if param.is_flag or param.count else param.nargs
+            for opt in param.opts:
+                spec['options'][opt] = [param.name, nargs, completes]
+            for opt in param.secondary_opts:
+                spec['options'][opt] = [param.name, 0, None]
+        else:
+            spec['arguments'].append([param.name, param.nargs, completes])
+    if isinstance(command, click.Group):
+        for name in command.list_commands(ctx):
+            subcommand = command.get_command(ctx, name)
+            spec['commands'][name] = describe(
+                subcommand, click.Context(subcommand, parent=ctx,
+                                          info_name=name))
+    return spec
+
+
+def save_spec(root, filename: str = SPEC_FILE):
+    import click
+    import json
+    spec = {
+        'sources': sources_stamp(),
+        'root': describe(root, click.Context(root, info_name='clicli')),
+    }
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    temp_file = '%s.%s.tmp' % (filename, os.getpid())
+    with open(temp_file, 'w') as file:
+        json.dump(spec, file)
+    os.replace(temp_file, filename)
+
+
+def load_spec(filename: str = SPEC_FILE):
+    import json
+    try:
+        with open(filename) as file:
+            spec = json.load(file)
+    except (FileNotFoundError, ValueError):
+        return None
+    if spec.get('sources') != sources_stamp():
+        return None
+    return spec['root']
+
+
+class Unanswered(Exception):
+    # The command line is one only click can complete.
+    pass
+
+
+def take_option(spec: dict, args, index: int, params: dict):
+    # Parses the option at args[index] into params and returns the index
+    # after it, or the option itself when its value is being completed.
+    arg = args[index]
+    name, equals, value = arg.partition('=')
+    if not equals and arg not in spec['options'] and len(arg) > 2 and \
+            not arg.startswith('--'):
+        # A short option with its value attached, e.g. -f10102.
+        name, equals, value = arg[:2], True, arg[2:]
+    option = spec['options'].get(name if equals else arg)
+    if option is None:
+        raise Unanswered
+    param, nargs, _ = option
+    if nargs == 0:
+        if equals:
+            raise Unanswered
+        return index + 1
+    if equals:
+        if nargs != 1:
+            raise Unanswered
+        params[param] = value
+        return index + 1
+    values = args[index + 1:index + 1 + nargs]
+    if len(values) < nargs:
+        return option
+    params[param] = values[0] if nargs == 1 else values
+    return index + 1 + nargs
+
+
+def target(spec: dict, args, incomplete: str):
+    # Follows click's parsing of a partial command line. Returns the
+    # parameter whose value is being completed and the parameters parsed
+    # before it.
+    if '--' not in args and incomplete.startswith('-'):
+        raise Unanswered  # option names
+    params = {}
+    index = 0
+    while spec['commands']:
+        # A group: its own options, then a subcommand.
+        while index < len(args) and args[index].startswith('-'):
+            index = take_option(spec, args, index, params)
+            if isinstance(index, list):
+                return index, params
+        if index == len(args) or args[index] not in spec['commands']:
+            raise Unanswered
+        spec = spec['commands'][args[index]]
+        index += 1
+    positional = []
+    while index < len(args):
+        if args[index] == '--':
+            positional.extend(args[index + 1:])
+            break
+        if args[index].startswith('-') and len(args[index]) > 1:
+            index = take_option(spec, args, index, params)
+            if isinstance(index, list):
+                return index, params
+        else:
+            positional.append(args[index])
+            index += 1
+    for argument in spec['arguments']:
+        _, nargs, _ = argument
+        if nargs == -1 or len(positional) < nargs:
+            return argument, params
+        params[argument[0]] = positional[0] if nargs == 1 else \
+            positional[:nargs]
+        positional = positional[nargs:]
+    raise Unanswered
+
+
+def split_arg_string(string: str):
+    # As click.shell_completion.split_arg_string: an unclosed quote keeps
+    # what follows it as the last word.
+    import shlex
+    lex = shlex.shlex(string, posix=True)
+    lex.whitespace_split = True
+    lex.commenters = ''
+    words = []
+    try:
+        for word in lex:
+            words.append(word)
+    except ValueError:
+        words.append(lex.token)
+    return words
+
+
+def answer():
+    # Answers a completion when the spec covers it, without importing click.
+    # Returns False when click has to.
+    shell, _, instruction = os.environ.get(COMPLETE_VAR, '').partition('_')
+    if instruction != 'complete' or shell not in ITEM_FORMATS:
+        return False
+    spec = load_spec()
+    if spec is None:
+        return False
+    try:
+        words = split_arg_string(os.environ['COMP_WORDS'])
+        if shell == 'fish':
+            incomplete = os.environ['COMP_CWORD']
+            args = words[1:]
+            if incomplete and args and args[-1] == incomplete:
+                args.pop()
+        else:
+            cword = int(os.environ['COMP_CWORD'])
+            args = words[1:cword]
+            incomplete = words[cword] if cword < len(words) else ''
+    except (KeyError, ValueError):
+        return False
+    if incomplete == '=':
+        incomplete = ''
+    elif '=' in incomplete and incomplete.startswith('-'):
+        name, _, incomplete = incomplete.partition('=')
+        args.append(name)
+    try:
+        (_, _, completes), params = target(spec, args, incomplete)
+    except Unanswered:
+        return False
+    if completes is None:
+        return False
+    kind, by = completes
+    if kind == 'config':
+        kind = CONFIG_KINDS.get(params.get('key'))
+    items = [] if kind is None else matches(params, kind, incomplete, by)
+    sys.stdout.write(''.join('%s\n' % ITEM_FORMATS[shell](value, help)
+                             for value, help in items) or '\n')
+    refresh_if_stale()
+    return True
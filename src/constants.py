@@ -0,0 +1,18 @@
+import os
+from os.path import expanduser
+
+# Values the API client and the response cache work with that are also read
+# where startup time matters: commands offer the sizes as option defaults,
+# and shell completion keeps its files in the cache directory. They live
+# apart from api and cache so that reading them imports neither, e.g. when
+# the shell asks for completions.
+
+CACHE_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or expanduser('~/.cache'), 'clicli')
+
+MINUTE = 60
+HOUR = 60 * MINUTE
+
+POOL_SIZE = 8
+PAGE_SIZE = 100
+PAGE_CONCURRENCY = 4
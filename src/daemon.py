@@ -0,0 +1,476 @@
+import os
+import sys
+
+# `clicli daemon start` leaves a warm process listening on a per-user Unix
+# socket, holding imported commands, parsed config and open API connections.
+# The `clicli` entry point hands its argv, working directory, CLICKUP_*
+# environment and stdin/stdout/stderr file descriptors to the daemon, which
+# runs the command on them and replies with the exit code. When no daemon is
+# listening the command runs in-process as usual.
+#
+# Every invocation imports this module, so the client half only uses the
+# standard library; the daemon imports click and the commands in `serve`.
+# Shell completions are mostly answered before anything is forwarded, so
+# even the socket and json modules are imported where they are used.
+
+PROTOCOL = 1
+IDLE_TIMEOUT = 30 * 60
+# Read once when the daemon starts (file locations, the API endpoint), so a
+# call with different values runs in-process instead.
+BOUND_ENV = ['HOME', 'XDG_CACHE_HOME', 'CLICKUP_API_URL']
+# Commands that always run in-process: managing the daemon itself, and ones
+# that run until interrupted, since interrupting the client does not stop
+# the command in the daemon.
+LOCAL_COMMANDS = [('daemon', ), ('tasks', 'watch')]
+MAX_MESSAGE_SIZE = 1024 * 1024
+
+
+def socket_path():
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        return os.path.join(runtime_dir, 'clicli.sock')
+    return os.path.join(os.environ.get('TMPDIR') or '/tmp',
+                        'clicli-%d' % os.getuid(), 'daemon.sock')
+
+
+def connect():
+    import socket
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        connection.connect(socket_path())
+    except OSError:
+        connection.close()
+        return None
+    return connection
+
+
+def send_message(connection, message: dict, fds=()):
+    import json
+    import socket
+    data = json.dumps(message).encode() + b'\n'
+    if fds:
+        socket.send_fds(connection, [data], list(fds))
+    else:
+        connection.sendall(data)
+
+
+def read_message(connection, data: bytes = b''):
+    import json
+    while not data.endswith(b'\n'):
+        if len(data) > MAX_MESSAGE_SIZE:
+            return None
+        chunk = connection.recv(65536)
+        if not chunk:
+            return None
+        data += chunk
+    return json.loads(data)
+
+
+def command_path(argv):
+    # The arguments that are neither options nor option values, e.g.
+    # ['tasks', 'list', '123'].
+    path = []
+    skip = False
+    for arg in argv:
+        if skip:
+            skip = False
+        elif arg.startswith('-'):
+            skip = arg == '--trace-file'
+        else:
+            path.append(arg)
+    return path
+
+
+def forwardable(argv):
+    if os.environ.get('CLICKUP_DAEMON', '').lower() in ('0', 'off', 'false',
+                                                        'no'):
+        return False
+    # Shell completion reads its own environment variables.
+    if any(key.startswith('_') and key.endswith('_COMPLETE')
+           for key in os.environ):
+        return False
+    path = tuple(command_path(argv))
+    return not any(path[:len(command)] == command
+                   for command in LOCAL_COMMANDS)
+
+
+def forward(argv):
+    # Runs the command in the daemon and returns its exit code, or None when
+    # it has to run in-process.
+    if not forwardable(argv):
+        return None
+    connection = connect()
+    if connection is None:
+        return None
+    try:
+        try:
+            send_message(connection, {
+                'protocol': PROTOCOL,
+                'argv': argv,
+                'cwd': os.getcwd(),
+                'env': {
+                    key: value
+                    for key, value in os.environ.items()
+                    if key.startswith('CLICKUP_') or key in BOUND_ENV
+                },
+                'encoding': getattr(sys.stdout, 'encoding', None) or 'utf-8',
+            }, fds=(0, 1, 2))
+        except OSError:  # e.g. stdin is closed
+            return None
+        try:
+            reply = read_message(connection)
+        except KeyboardInterrupt:
+            return 130
+        if reply is None:
+            sys.stderr.write('Error: the clicli daemon exited while running '
+                             'the command\n')
+            return 1
+        if reply.get('fallback'):
+            return None
+        return reply.get('exit', 1)
+    finally:
+        connection.close()
+
+
+def main():
+    if os.environ.get('_CLICLI_COMPLETE'):
+        import completion
+        if completion.answer():
+            # Nothing is left to clean up, so skip the interpreter's.
+            sys.stdout.flush()
+            os._exit(0)
+    code = forward(sys.argv[1:])
+    if code is not None:
+        sys.exit(code)
+    from main import cli
+    cli()
+
+
+def control(message: dict):
+    # Sends a stop or status message, returning the reply or None when no
+    # daemon is running.
+    connection = connect()
+    if connection is None:
+        return None
+    try:
+        send_message(connection, dict(message, protocol=PROTOCOL))
+        return read_message(connection)
+    finally:
+        connection.close()
+
+
+def listen():
+    # Binds the socket, or returns None when a daemon already answers on it.
+    import socket
+    path = socket_path()
+    if not os.environ.get('XDG_RUNTIME_DIR'):
+        directory = os.path.dirname(path)
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        info = os.lstat(directory)
+        if info.st_uid != os.getuid() or info.st_mode & 0o077:
+            raise OSError('%s must be a directory only you can access' %
+                          directory)
+    existing = connect()
+    if existing is not None:
+        existing.close()
+        return None
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    umask = os.umask(0o077)
+    try:
+        server.bind(path)
+    finally:
+        os.umask(umask)
+    server.listen(64)
+    return server
+
+
+def serve(server, idle_timeout: float = IDLE_TIMEOUT):
+    Daemon(server, idle_timeout).run()
+
+
+class Sessions:
+    # The working directory, the CLICKUP_* environment and clicli's global
+    # options are process-wide, so commands only run concurrently when they
+    # share them. A command with different ones waits for the running
+    # commands to finish, and commands start in the order they arrived.
+    def __init__(self):
+        import collections
+        import threading
+        self.condition = threading.Condition()
+        self.queue = collections.deque()
+        self.key = None
+        self.running = 0
+
+    def enter(self, key, activate):
+        ticket = object()
+        with self.condition:
+            self.queue.append(ticket)
+            while self.queue[0] is not ticket or \
+                    (self.running and self.key != key):
+                self.condition.wait()
+            self.queue.popleft()
+            self.condition.notify_all()
+            if self.key != key:
+                self.key = None
+                activate()
+                self.key = key
+            self.running += 1
+
+    def leave(self):
+        with self.condition:
+            self.running -= 1
+            self.condition.notify_all()
+
+
+class Daemon:
+    def __init__(self, server, idle_timeout: float = IDLE_TIMEOUT):
+        import threading
+        from main import cli
+        self.server = server
+        self.idle_timeout = idle_timeout
+        self.cli = cli
+        self.path = socket_path()
+        self.inode = os.stat(self.path).st_ino
+        self.bound_env = {key: os.environ.get(key) for key in BOUND_ENV}
+        self.value_options = {
+            opt
+            for param in cli.params if not getattr(param, 'is_flag', False)
+            for opt in param.opts
+        }
+        self.sessions = Sessions()
+        self.lock = threading.Condition()
+        self.active = 0
+        self.calls = 0
+        self.started = self.last_call = self.now()
+        self.stopping = False
+
+    @staticmethod
+    def now():
+        import time
+        return time.monotonic()
+
+    def warm(self):
+        # Import every command now rather than in the first calls.
+        import click
+        from commands.config import direct_get
+        ctx = click.Context(self.cli)
+        for name in self.cli.list_commands(ctx):
+            self.cli.get_command(ctx, name)
+        direct_get('api-key', silent=True)
+
+    def run(self):
+        import socket
+        import signal
+        import threading
+        from output import ThreadLocalStream
+        self.warm()
+        self.stdin = sys.stdin = ThreadLocalStream(sys.stdin)
+        self.stdout = sys.stdout = ThreadLocalStream(sys.stdout)
+        self.stderr = sys.stderr = ThreadLocalStream(sys.stderr)
+        signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+        self.server.settimeout(min(60, self.idle_timeout or 60))
+        try:
+            while not self.stopping:
+                try:
+                    connection, _ = self.server.accept()
+                except socket.timeout:
+                    with self.lock:
+                        if self.idle_timeout and not self.active and \
+                                self.now() - self.last_call > \
+                                self.idle_timeout:
+                            break
+                    continue
+                except OSError:
+                    if self.stopping:
+                        break
+                    raise
+                connection.setblocking(True)
+                with self.lock:
+                    self.active += 1
+                threading.Thread(target=self.handle,
+                                 args=(connection, ),
+                                 daemon=True).start()
+            with self.lock:
+                while self.active:
+                    self.lock.wait()
+        finally:
+            self.server.close()
+            self.remove_socket()
+
+    def remove_socket(self):
+        # Only if it is still ours and not that of a daemon started since.
+        try:
+            if os.stat(self.path).st_ino == self.inode:
+                os.unlink(self.path)
+        except OSError:
+            pass
+
+    def handle(self, connection):
+        import socket
+        import traceback
+        fds = []
+        try:
+            if not self.same_user(connection):
+                return
+            data, fds, _, _ = socket.recv_fds(connection, 65536, 3)
+            message = read_message(connection, data)
+            if message is None:
+                return  # e.g. `daemon start` checking for a running daemon
+            if message.get('protocol') != PROTOCOL:
+                send_message(connection, {'fallback': True})
+            elif message.get('stop'):
+                self.stop()
+                send_message(connection, {'stopped': os.getpid()})
+            elif message.get('status'):
+                send_message(connection, self.status())
+            elif len(fds) != 3 or any(
+                    message['env'].get(key) != value
+                    for key, value in self.bound_env.items()):
+                send_message(connection, {'fallback': True})
+            else:
+                # The streams own the descriptors from here on.
+                received, fds = fds, []
+                code = self.call(message,
+                                 *self.open_streams(received,
+                                                    message['encoding']))
+                send_message(connection, {'exit': code})
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client went away
+        except Exception:
+            traceback.print_exc()
+        finally:
+            connection.close()
+            for fd in fds:
+                os.close(fd)
+            with self.lock:
+                self.active -= 1
+                self.last_call = self.now()
+                self.lock.notify_all()
+
+    @staticmethod
+    def same_user(connection):
+        import socket
+        import struct
+        if not hasattr(socket, 'SO_PEERCRED'):
+            return True  # the socket directory is private
+        credentials = connection.getsockopt(socket.SOL_SOCKET,
+                                            socket.SO_PEERCRED,
+                                            struct.calcsize('3i'))
+        _, uid, _ = struct.unpack('3i', credentials)
+        return uid == os.getuid()
+
+    @staticmethod
+    def open_streams(fds, encoding: str):
+        # Line buffered like the interpreter's own streams: stdout when it
+        # is a terminal, stderr always.
+        stdin_fd, stdout_fd, stderr_fd = fds
+        return (open(stdin_fd, 'r', encoding=encoding),
+                open(stdout_fd,
+                     'w',
+                     buffering=1 if os.isatty(stdout_fd) else -1,
+                     encoding=encoding),
+                open(stderr_fd,
+                     'w',
+                     buffering=1,
+                     encoding=encoding,
+                     errors='backslashreplace'))
+
+    def global_args(self, argv):
+        args = []
+        arguments = iter(argv)
+        for arg in arguments:
+            if not arg.startswith('-'):
+                break
+            args.append(arg)
+            if arg in self.value_options:
+                args.append(next(arguments, None))
+        return tuple(args)
+
+    def call(self, message: dict, stdin, stdout, stderr):
+        argv = message['argv']
+        env = {
+            key: value
+            for key, value in message['env'].items()
+            if key.startswith('CLICKUP_')
+        }
+        key = (message['cwd'], tuple(sorted(env.items())),
+               self.global_args(argv))
+        traced = 'CLICKUP_TRACE' in env or any(
+            arg.startswith('--trace') for arg in key[2])
+        if traced:
+            # The tracer is process-wide, so traced commands run alone.
+            key += (object(), )
+        try:
+            try:
+                self.sessions.enter(
+                    key, lambda: self.activate(message['cwd'], env))
+            except OSError as error:
+                stderr.write('Error: %s\n' % error)
+                return 1
+            try:
+                return self.execute(argv, stdin, stdout, stderr, traced)
+            finally:
+                self.sessions.leave()
+        finally:
+            for stream in (stdout, stderr, stdin):
+                try:
+                    stream.close()
+                except OSError:
+                    pass
+
+    @staticmethod
+    def activate(cwd: str, env: dict):
+        os.chdir(cwd)
+        for key in list(os.environ):
+            if key.startswith('CLICKUP_') and key not in env:
+                del os.environ[key]
+        os.environ.update(env)
+
+    def execute(self, argv, stdin, stdout, stderr, traced: bool):
+        import traceback
+        import tracing
+        with self.lock:
+            self.calls += 1
+        with self.stdin.redirect(stdin), self.stdout.redirect(stdout), \
+                self.stderr.redirect(stderr):
+            try:
+                self.cli.main(args=argv, prog_name='clicli')
+                code = 0
+            except SystemExit as exit:
+                code = exit.code
+                if code is None:
+                    code = 0
+                elif not isinstance(code, int):
+                    stderr.write('%s\n' % code)
+                    code = 1
+            except Exception:
+                traceback.print_exc(file=stderr)
+                code = 1
+            finally:
+                if traced:
+                    tracing.configure(False)
+        return code
+
+    def stop(self):
+        # Stops accepting calls; the running ones still finish.
+        import socket
+        self.stopping = True
+        self.remove_socket()
+        try:
+            self.server.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    def status(self):
+        with self.lock:
+            return {
+                'pid': os.getpid(),
+                'socket': self.path,
+                'uptime_s': round(self.now() - self.started, 1),
+                'calls': self.calls,
+                'running': self.active - 1,
+            }
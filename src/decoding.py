@@ -0,0 +1,192 @@
+import codecs
+import json
+import re
+import zlib
+from projection import COLLECTION_KEYS, project, project_response
+
+# Response bodies are read in chunks, decompressed as they arrive and, when
+# large, decoded without ever holding the whole JSON text in memory. The
+# members of top-level arrays (e.g. the tasks of a task page) are decoded
+# one at a time and the text they came from is dropped right away. With
+# --fields (see projection.project_response), the members of a collection
+# are trimmed as soon as each is decoded, so the fields left out are never
+# held for a whole page.
+
+ACCEPT_ENCODING = 'gzip, deflate'
+CHUNK_SIZE = 64 * 1024
+# Bodies shorter than this (decompressed) are decoded in one json.loads call.
+STREAM_THRESHOLD = 256 * 1024
+
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+NUMBER_CHARS = re.compile(r'[0-9.eE+-]*')
+
+
+def decompress(chunks, encoding: str = None):
+    encoding = (encoding or '').strip().lower()
+    if encoding not in ('gzip', 'x-gzip', 'deflate'):
+        yield from chunks
+        return
+    # "deflate" is meant to be zlib-wrapped, but some servers send it raw.
+    wbits = 16 + zlib.MAX_WBITS if 'gzip' in encoding else zlib.MAX_WBITS
+    decompressor = zlib.decompressobj(wbits)
+    first = True
+    for chunk in chunks:
+        try:
+            data = decompressor.decompress(chunk, CHUNK_SIZE)
+        except zlib.error:
+            if not first or encoding != 'deflate':
+                raise
+            decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+            data = decompressor.decompress(chunk, CHUNK_SIZE)
+        first = False
+        # Output is capped per call, since a small compressed chunk can
+        # expand to many times its size.
+        while True:
+            if data:
+                yield data
+            if not decompressor.unconsumed_tail:
+                break
+            data = decompressor.decompress(decompressor.unconsumed_tail,
+                                           CHUNK_SIZE)
+    data = decompressor.flush()
+    if data:
+        yield data
+
+
+def decode_chunks(chunks,
+                  threshold: int = STREAM_THRESHOLD,
+                  fields: dict = None):
+    return StreamDecoder(chunks, threshold, fields).decode()
+
+
+class StreamDecoder:
+    def __init__(self,
+                 chunks,
+                 threshold: int = STREAM_THRESHOLD,
+                 fields: dict = None):
+        self.chunks = iter(chunks)
+        self.threshold = threshold
+        self.fields = fields
+        # Whether a collection was projected while it was decoded.
+        self.projected = False
+        self.text = codecs.getincrementaldecoder('utf-8')()
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.pos = 0
+        self.done = False
+
+    def fill(self):
+        # Appends the next chunk to what is left of the buffer. Returns False
+        # once the stream is exhausted.
+        if self.done:
+            return False
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.done = True
+            text = self.text.decode(b'', final=True)
+        else:
+            text = self.text.decode(chunk)
+        self.buffer = self.buffer[self.pos:] + text
+        self.pos = 0
+        return True
+
+    def error(self, message: str):
+        return json.JSONDecodeError(message, self.buffer, self.pos)
+
+    def peek(self):
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise self.error('Expecting %r' % char)
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # Incomplete; wait until the pending text has doubled so a
+                # large value is not rescanned once per chunk.
+                pending = len(self.buffer) - self.pos
+                if not self.fill():
+                    raise
+                while len(self.buffer) - self.pos < 2 * pending and \
+                        self.fill():
+                    pass
+                continue
+            # A number cut off by the end of the buffer (e.g. "3." of "3.25")
+            # may continue in the next chunk.
+            if self.done or not isinstance(value, (int, float)) or \
+                    NUMBER_CHARS.match(self.buffer, end).end() < \
+                    len(self.buffer):
+                self.pos = end
+                return value
+            self.fill()
+
+    def array(self, fields: dict = None):
+        # With `fields`, each member is projected as it is decoded.
+        self.expect('[')
+        result = []
+        if self.peek() == ']':
+            self.pos += 1
+            return result
+        while True:
+            result.append(project(self.value(), fields))
+            char = self.peek()
+            self.pos += 1
+            if char == ']':
+                return result
+            if char != ',':
+                raise self.error("Expecting ',' delimiter")
+
+    def object(self):
+        self.expect('{')
+        result = {}
+        if self.peek() == '}':
+            self.pos += 1
+            return result
+        while True:
+            if self.peek() != '"':
+                raise self.error('Expecting property name enclosed in '
+                                 'double quotes')
+            key = self.value()
+            self.expect(':')
+            if self.peek() != '[':
+                result[key] = self.value()
+            elif self.fields and key in COLLECTION_KEYS and \
+                    not self.projected:
+                result[key] = self.array(self.fields)
+                self.projected = True
+            else:
+                result[key] = self.array()
+            char = self.peek()
+            self.pos += 1
+            if char == '}':
+                return result
+            if char != ',':
+                raise self.error("Expecting ',' delimiter")
+
+    def decode(self):
+        while len(self.buffer) < self.threshold and self.fill():
+            pass
+        if self.done:
+            return project_response(json.loads(self.buffer), self.fields)
+        first = self.peek()
+        if first == '{':
+            result = self.object()
+        elif first == '[':
+            result = self.array()
+        else:
+            result = self.value()
+        if self.peek() != '':
+            raise self.error('Extra data')
+        if self.projected:
+            return result
+        return project_response(result, self.fields)
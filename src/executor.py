@@ -0,0 +1,13 @@
+import contextvars
+from concurrent import futures
+
+# A ThreadPoolExecutor whose tasks run in a copy of the context they were
+# submitted from. Context variables set by the caller, such as the streams
+# the daemon redirects for each call (see output.ThreadLocalStream), then
+# reach the worker threads too.
+
+
+class ThreadPoolExecutor(futures.ThreadPoolExecutor):
+    def submit(self, fn, /, *args, **kwargs):
+        context = contextvars.copy_context()
+        return super().submit(context.run, fn, *args, **kwargs)
@@ -1,22 +1,76 @@
 import click
-from commands import auth, config, folders, lists, spaces, tasks, teams
+import importlib
+import cache as response_cache
 
+# Subcommand groups are only imported when they are invoked (or when help
+# lists them), so e.g. `clicli config get` never imports the API client.
+COMMANDS = {
+    'auth': 'commands.auth:auth',
+    'batch': 'commands.batch:batch',
+    'cache': 'commands.cache:cache',
+    'config': 'commands.config:config',
+    'daemon': 'commands.daemon:daemon',
+    'export': 'commands.export:export',
+    'spaces': 'commands.spaces:spaces',
+    'teams': 'commands.teams:teams',
+    'folders': 'commands.folders:folders',
+    'lists': 'commands.lists:lists',
+    'tasks': 'commands.tasks:tasks',
+    'tree': 'commands.tree:tree',
+    'sync': 'commands.sync:sync',
+}
 
-@click.group(help="""A tool for getting, managing, and updating clickup issues.
+
+class LazyGroup(click.Group):
+    def __init__(self, *args, lazy_commands=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy_commands = lazy_commands or {}
+
+    def list_commands(self, ctx):
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_commands))
+
+    def get_command(self, ctx, cmd_name):
+        if cmd_name not in self.commands and cmd_name in self.lazy_commands:
+            module_name, attribute = self.lazy_commands[cmd_name].split(':')
+            module = importlib.import_module(module_name)
+            self.add_command(getattr(module, attribute), cmd_name)
+        return super().get_command(ctx, cmd_name)
+
+
+@click.group(cls=LazyGroup,
+             lazy_commands=COMMANDS,
+             help="""A tool for getting, managing, and updating clickup issues.
 
         Clickup is organized into Teams -> Spaces -> Folders -> Lists -> Tasks
-""")
-def cli():
-    pass
 
+        For shell completion of commands, IDs and names, add
+        eval "$(_CLICLI_COMPLETE=bash_source clicli)" to ~/.bashrc
+        (zsh_source for ~/.zshrc, fish_source for fish).
+""")
+@click.option('--no-cache',
+              is_flag=True,
+              help='Do not read or write the response cache.')
+@click.option('--refresh',
+              is_flag=True,
+              help='Ignore cached responses and fetch fresh ones.')
+@click.option('--trace',
+              is_flag=True,
+              envvar='CLICKUP_TRACE',
+              help='Time each request (DNS, connect, TLS, time to first '
+              'byte, download), JSON decoding and output, and print a '
+              'summary to stderr on exit.')
+@click.option('--trace-file',
+              type=click.Path(dir_okay=False, writable=True),
+              help='Also write a Chrome trace-event JSON file, viewable in '
+              'chrome://tracing or Perfetto. Implies --trace.')
+@click.pass_context
+def cli(ctx, no_cache, refresh, trace, trace_file):
+    response_cache.configure(enabled=False if no_cache else None,
+                             refresh=refresh)
+    if trace or trace_file:
+        import tracing
+        ctx.call_on_close(tracing.configure(True, trace_file).report)
 
-cli.add_command(auth.auth)
-cli.add_command(config.config)
-cli.add_command(spaces.spaces)
-cli.add_command(teams.teams)
-cli.add_command(folders.folders)
-cli.add_command(lists.lists)
-cli.add_command(tasks.tasks)
 
 if __name__ == '__main__':
     cli(auto_envvar_prefix='CLICKUP')
@@ -0,0 +1,364 @@
+import json
+import os
+import threading
+import time
+from os.path import expanduser
+from models import Folder, List, Space, Task, Team, nested_id, timestamp
+from query import build_task_query
+
+DATA_DIR = os.path.join(
+    os.environ.get('XDG_DATA_HOME') or expanduser('~/.local/share'),
+    'clicli')
+MIRROR_FILE = os.path.join(DATA_DIR, 'mirror.db')
+# Index entries ANALYZE samples per index
+ANALYSIS_LIMIT = 1000
+
+_mirror = None
+_mirror_lock = threading.Lock()
+
+
+def get_mirror():
+    global _mirror
+    if _mirror is None:
+        with _mirror_lock:
+            if _mirror is None:
+                _mirror = Mirror()
+    return _mirror
+
+
+def assignee_ids(task):
+    return [
+        str(assignee['id'] if isinstance(assignee, dict) else assignee)
+        for assignee in task.get('assignees') or []
+    ]
+
+
+class Mirror:
+    def __init__(self, filename: str = MIRROR_FILE):
+        import sqlite3
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        self.filename = filename
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(filename,
+                                   timeout=30,
+                                   check_same_thread=False,
+                                   isolation_level=None)
+        self._db.executescript("""
+            PRAGMA journal_mode = WAL;
+            CREATE TABLE IF NOT EXISTS teams (
+                id TEXT PRIMARY KEY,
+                name TEXT,
+                data TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS spaces (
+                id TEXT PRIMARY KEY,
+                team_id TEXT NOT NULL,
+                name TEXT,
+                archived INTEGER NOT NULL,
+                data TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS folders (
+                id TEXT PRIMARY KEY,
+                space_id TEXT NOT NULL,
+                name TEXT,
+                archived INTEGER NOT NULL,
+                data TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS lists (
+                id TEXT PRIMARY KEY,
+                space_id TEXT NOT NULL,
+                folder_id TEXT,
+                name TEXT,
+                archived INTEGER NOT NULL,
+                data TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS tasks (
+                id TEXT PRIMARY KEY,
+                list_id TEXT NOT NULL,
+                parent TEXT,
+                name TEXT,
+                status TEXT,
+                closed INTEGER NOT NULL,
+                archived INTEGER NOT NULL,
+                date_created INTEGER,
+                date_updated INTEGER,
+                date_closed INTEGER,
+                due_date INTEGER,
+                data TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS spaces_team ON spaces (team_id);
+            CREATE INDEX IF NOT EXISTS folders_space ON folders (space_id);
+            CREATE INDEX IF NOT EXISTS lists_space ON lists (space_id);
+            CREATE INDEX IF NOT EXISTS lists_folder ON lists (folder_id);
+            CREATE INDEX IF NOT EXISTS tasks_list ON tasks (list_id);
+            CREATE TABLE IF NOT EXISTS sync_state (
+                list_id TEXT PRIMARY KEY,
+                high_water INTEGER,
+                synced_at REAL,
+                full_synced_at REAL
+            );
+        """)
+        self._migrate()
+
+    def _migrate(self):
+        version = self._db.execute('PRAGMA user_version').fetchone()[0]
+        if version < 1:
+            # Secondary indexes for the local query engine
+            self._db.executescript("""
+                CREATE TABLE IF NOT EXISTS task_assignees (
+                    task_id TEXT NOT NULL,
+                    user_id TEXT NOT NULL,
+                    PRIMARY KEY (user_id, task_id)
+                ) WITHOUT ROWID;
+                CREATE INDEX IF NOT EXISTS task_assignees_task
+                    ON task_assignees (task_id);
+                CREATE TRIGGER IF NOT EXISTS tasks_delete_assignees
+                    AFTER DELETE ON tasks BEGIN
+                        DELETE FROM task_assignees
+                            WHERE task_id = old.id;
+                    END;
+                CREATE INDEX IF NOT EXISTS tasks_status
+                    ON tasks (status COLLATE NOCASE);
+                CREATE INDEX IF NOT EXISTS tasks_list_created
+                    ON tasks (list_id, date_created);
+                CREATE INDEX IF NOT EXISTS tasks_due_date
+                    ON tasks (due_date);
+                CREATE INDEX IF NOT EXISTS tasks_date_created
+                    ON tasks (date_created);
+                CREATE INDEX IF NOT EXISTS tasks_date_updated
+                    ON tasks (date_updated);
+            """)
+            with self.transaction() as db:
+                tasks = db.execute('SELECT id, data FROM tasks').fetchall()
+                db.executemany(
+                    'INSERT OR IGNORE INTO task_assignees (task_id, user_id) '
+                    'VALUES (?, ?)',
+                    [(id, user_id) for id, data in tasks
+                     for user_id in assignee_ids(json.loads(data))])
+                db.execute('PRAGMA user_version = 1')
+        if version < 2:
+            # Lets the filters of a task found by ID (e.g. through
+            # task_assignees) be checked without reading its row and data.
+            self._db.executescript("""
+                CREATE INDEX IF NOT EXISTS tasks_id_filters
+                    ON tasks (id, status COLLATE NOCASE, archived, parent,
+                              closed, name);
+                PRAGMA user_version = 2;
+            """)
+
+    def analyze(self):
+        # Refreshes the row counts the query planner goes by. Without them
+        # it can't tell that one assignee has far fewer tasks than a status,
+        # and reads every task of the status instead. Sampled, so it takes
+        # milliseconds however large the mirror is.
+        with self._lock:
+            self._db.execute('PRAGMA analysis_limit = %d' % ANALYSIS_LIMIT)
+            self._db.execute('ANALYZE')
+
+    def transaction(self):
+        return _Transaction(self)
+
+    def replace_teams(self, teams):
+        with self.transaction() as db:
+            seen = [str(team['id']) for team in teams]
+            db.execute('DELETE FROM teams WHERE id NOT IN (%s)' %
+                       ','.join('?' * len(seen)), seen)
+            db.executemany(
+                'INSERT OR REPLACE INTO teams (id, name, data) '
+                'VALUES (?, ?, ?)', [(str(team['id']), team.get('name'),
+                                      json.dumps(team)) for team in teams])
+
+    def replace_spaces(self, team_id, spaces, archived=False):
+        with self.transaction() as db:
+            db.execute('DELETE FROM spaces WHERE team_id = ? AND archived = ?',
+                       (str(team_id), int(archived)))
+            db.executemany(
+                'INSERT OR REPLACE INTO spaces (id, team_id, name, archived, '
+                'data) VALUES (?, ?, ?, ?, ?)',
+                [(str(space['id']), str(team_id), space.get('name'),
+                  int(space.get('archived', archived)), json.dumps(space))
+                 for space in spaces])
+
+    def replace_folders(self, space_id, folders, archived=False):
+        with self.transaction() as db:
+            db.execute(
+                'DELETE FROM folders WHERE space_id = ? AND archived = ?',
+                (str(space_id), int(archived)))
+            db.executemany(
+                'INSERT OR REPLACE INTO folders (id, space_id, name, '
+                'archived, data) VALUES (?, ?, ?, ?, ?)',
+                [(str(folder['id']), str(space_id), folder.get('name'),
+                  int(folder.get('archived', archived)), json.dumps(folder))
+                 for folder in folders])
+
+    def replace_lists(self, space_id, folder_id, lists, archived=False):
+        with self.transaction() as db:
+            if folder_id is None:
+                db.execute(
+                    'DELETE FROM lists WHERE space_id = ? AND '
+                    'folder_id IS NULL AND archived = ?',
+                    (str(space_id), int(archived)))
+            else:
+                db.execute(
+                    'DELETE FROM lists WHERE folder_id = ? AND archived = ?',
+                    (str(folder_id), int(archived)))
+            db.executemany(
+                'INSERT OR REPLACE INTO lists (id, space_id, folder_id, name, '
+                'archived, data) VALUES (?, ?, ?, ?, ?, ?)',
+                [(str(list['id']), str(space_id),
+                  None if folder_id is None else str(folder_id),
+                  list.get('name'), int(list.get('archived', archived)),
+                  json.dumps(list)) for list in lists])
+
+    def remove_orphans(self, hierarchy=True):
+        # Drop rows whose parent disappeared in the last hierarchy sync,
+        # including the tasks of deleted lists. Spaces, folders and lists
+        # are only checked against their team and space when the whole team
+        # was synced.
+        with self.transaction() as db:
+            if hierarchy:
+                db.execute('DELETE FROM spaces WHERE team_id NOT IN '
+                           '(SELECT id FROM teams)')
+                db.execute('DELETE FROM folders WHERE space_id NOT IN '
+                           '(SELECT id FROM spaces)')
+                db.execute('DELETE FROM lists WHERE space_id NOT IN '
+                           '(SELECT id FROM spaces)')
+            db.execute('DELETE FROM lists WHERE folder_id IS NOT NULL AND '
+                       'folder_id NOT IN (SELECT id FROM folders)')
+            removed = db.execute('DELETE FROM tasks WHERE list_id NOT IN '
+                                 '(SELECT id FROM lists)').rowcount
+            db.execute('DELETE FROM sync_state WHERE list_id NOT IN '
+                       '(SELECT id FROM lists)')
+            return removed
+
+    def upsert_list(self, list):
+        folder = list.get('folder') or {}
+        folder_id = None if folder.get('hidden') else folder.get('id')
+        with self.transaction() as db:
+            db.execute(
+                'INSERT OR REPLACE INTO lists (id, space_id, folder_id, name, '
+                'archived, data) VALUES (?, ?, ?, ?, ?, ?)',
+                (str(list['id']), str(nested_id(list, 'space')),
+                 None if folder_id is None else str(folder_id),
+                 list.get('name'), int(bool(list.get('archived'))),
+                 json.dumps(list)))
+
+    def sync_state(self, list_id):
+        with self._lock:
+            row = self._db.execute(
+                'SELECT high_water, full_synced_at FROM sync_state '
+                'WHERE list_id = ?', (str(list_id), )).fetchone()
+        return row if row is not None else (None, None)
+
+    def store_tasks(self, list_id, tasks, full=False, seen_ids=None):
+        # Upserts the given tasks and advances the list's high-water mark.
+        # A full sync also deletes tasks the API no longer returns.
+        now = time.time()
+        list_id = str(list_id)
+        with self.transaction() as db:
+            high_water, full_synced_at = db.execute(
+                'SELECT high_water, full_synced_at FROM sync_state '
+                'WHERE list_id = ?', (list_id, )).fetchone() or (None, None)
+            rows = []
+            assignments = []
+            for task in tasks:
+                date_updated = timestamp(task.get('date_updated'))
+                if date_updated is not None:
+                    high_water = max(high_water or 0, date_updated)
+                rows.append(self.task_row(list_id, task))
+                assignments += [(str(task['id']), user_id)
+                                for user_id in assignee_ids(task)]
+            self.upsert_task_rows(db, rows, assignments)
+            deleted = 0
+            if full:
+                full_synced_at = now
+                db.execute('CREATE TEMP TABLE IF NOT EXISTS seen (id TEXT)')
+                db.execute('DELETE FROM seen')
+                db.executemany('INSERT INTO seen (id) VALUES (?)',
+                               [(id, ) for id in seen_ids or ()])
+                deleted = db.execute(
+                    'DELETE FROM tasks WHERE list_id = ? AND id NOT IN '
+                    '(SELECT id FROM seen)', (list_id, )).rowcount
+            db.execute(
+                'INSERT OR REPLACE INTO sync_state (list_id, high_water, '
+                'synced_at, full_synced_at) VALUES (?, ?, ?, ?)',
+                (list_id, high_water, now, full_synced_at))
+            return len(rows), deleted
+
+    def task_row(self, list_id, task):
+        return Task.from_dict(task, list_id=list_id).row()
+
+    def upsert_task_rows(self, db, rows, assignments):
+        db.executemany('DELETE FROM task_assignees WHERE task_id = ?',
+                       [(row[0], ) for row in rows])
+        db.executemany(
+            'INSERT OR IGNORE INTO task_assignees (task_id, user_id) '
+            'VALUES (?, ?)', assignments)
+        db.executemany(
+            'INSERT OR REPLACE INTO tasks (id, list_id, parent, name, status, '
+            'closed, archived, date_created, date_updated, date_closed, '
+            'due_date, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            rows)
+
+    def select(self, model, where='1', params=(), order='rowid'):
+        with self._lock:
+            return [
+                model.from_row(row) for row in self._db.execute(
+                    'SELECT %s FROM %s WHERE %s ORDER BY %s' %
+                    (model.select_columns(), model.TABLE, where, order),
+                    params)
+            ]
+
+    def query_tasks(self, **filters):
+        # Returns Task models, so that large results stay compact until
+        # they are written.
+        sql, params = build_task_query(**filters)
+        with self._lock:
+            return [
+                Task.from_row(row) for row in self._db.execute(sql, params)
+            ]
+
+    def teams(self):
+        return self.select(Team)
+
+    def spaces(self, team_id, archived=False):
+        return self.select(Space, 'team_id = ? AND archived = ?',
+                           (str(team_id), int(archived)))
+
+    def folders(self, space_id, archived=False):
+        return self.select(Folder, 'space_id = ? AND archived = ?',
+                           (str(space_id), int(archived)))
+
+    def lists(self, space_id=None, folder_id=None, archived=False):
+        if folder_id:
+            return self.select(List, 'folder_id = ? AND archived = ?',
+                               (str(folder_id), int(archived)))
+        return self.select(
+            List, 'space_id = ? AND folder_id IS NULL AND archived = ?',
+            (str(space_id), int(archived)))
+
+    def stats(self):
+        with self._lock:
+            counts = {
+                table: self._db.execute('SELECT COUNT(*) FROM %s' %
+                                        table).fetchone()[0]
+                for table in ('teams', 'spaces', 'folders', 'lists', 'tasks')
+            }
+        counts['file'] = self.filename
+        return counts
+
+
+class _Transaction:
+    def __init__(self, mirror: Mirror):
+        self.mirror = mirror
+
+    def __enter__(self):
+        self.mirror._lock.acquire()
+        self.mirror._db.execute('BEGIN IMMEDIATE')
+        return self.mirror._db
+
+    def __exit__(self, exc_type, exc, traceback):
+        try:
+            self.mirror._db.execute('ROLLBACK' if exc_type else 'COMMIT')
+        finally:
+            self.mirror._lock.release()
@@ -0,0 +1,190 @@
+import abc
+import json
+
+try:
+    import orjson
+except ImportError:  # optional, only makes decoding faster
+    orjson = None
+
+# Teams, spaces, folders, lists and tasks as read from the mirror. The
+# fields commands filter and sort on are slots, filled from the mirror's
+# columns; the object as the API sent it is kept as its compact JSON bytes
+# and only decoded when a command needs any other field or writes the
+# object out. A task then costs its JSON and a dozen slots instead of a dict
+# for every status, assignee, checklist item and custom field.
+#
+# Heavy fields named in LAZY can be read as attributes too. The first one
+# read decodes the object, which the model then keeps for the others, so
+# only the models whose heavy fields are read carry the decoded object.
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(value):
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators=(',', ':'),
+                      ensure_ascii=False).encode()
+
+
+def timestamp(value):
+    # ClickUp sends dates as strings of milliseconds since the epoch
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def nested_id(obj, key):
+    value = obj.get(key)
+    if isinstance(value, dict):
+        return value.get('id')
+    return value
+
+
+def is_closed(task):
+    status = task.get('status') or {}
+    return status.get('type') == 'closed' or bool(task.get('date_closed'))
+
+
+def text(value):
+    return None if value is None else str(value)
+
+
+class Model(abc.ABC):
+    # The mirror table and its columns besides data, in order.
+    TABLE = None
+    FIELDS = ()
+    LAZY = ()
+    __slots__ = ('_json', '_data')
+
+    def __init__(self, data, *values):
+        self._json = data
+        self._data = None
+        for name, value in zip(self.FIELDS, values):
+            setattr(self, name, value)
+
+    @classmethod
+    def from_row(cls, row):
+        # The FIELDS columns followed by the data column, read as bytes.
+        return cls(row[-1], *row[:-1])
+
+    @classmethod
+    def from_dict(cls, data: dict, **parents):
+        # parents gives the IDs the API leaves out of nested responses,
+        # e.g. space_id for the lists of a space.
+        return cls(dumps(data), *cls.columns(data, **parents))
+
+    @classmethod
+    def select_columns(cls):
+        # What a SELECT from the table passes to from_row.
+        return ', '.join(['%s.%s' % (cls.TABLE, name) for name in cls.FIELDS]
+                         + ['CAST(%s.data AS BLOB)' % cls.TABLE])
+
+    @staticmethod
+    @abc.abstractmethod
+    def columns(data: dict, **parents):
+        # The FIELDS values of an object as the API sends it.
+        pass
+
+    def row(self):
+        return tuple(getattr(self, name) for name in self.FIELDS) + \
+            (self._json.decode(), )
+
+    def to_dict(self):
+        return loads(self._json)
+
+    def __getattr__(self, name):
+        # Only reached for names that are not slots.
+        if name in type(self).LAZY:
+            if self._data is None:
+                self._data = self.to_dict()
+            return self._data.get(name)
+        raise AttributeError('%r object has no attribute %r' %
+                             (type(self).__name__, name))
+
+    def __repr__(self):
+        return '<%s %s %r>' % (type(self).__name__, self.id, self.name)
+
+
+class Team(Model):
+    TABLE = 'teams'
+    FIELDS = ('id', 'name')
+    LAZY = ('members', )
+    __slots__ = FIELDS
+
+    @staticmethod
+    def columns(data, **parents):
+        return text(data['id']), data.get('name')
+
+
+class Space(Model):
+    TABLE = 'spaces'
+    FIELDS = ('id', 'team_id', 'name', 'archived')
+    LAZY = ('statuses', 'features')
+    __slots__ = FIELDS
+
+    @staticmethod
+    def columns(data, team_id=None, archived=False):
+        return (text(data['id']), text(team_id), data.get('name'),
+                int(bool(data.get('archived', archived))))
+
+
+class Folder(Model):
+    TABLE = 'folders'
+    FIELDS = ('id', 'space_id', 'name', 'archived')
+    LAZY = ('lists', 'statuses')
+    __slots__ = FIELDS
+
+    @staticmethod
+    def columns(data, space_id=None, archived=False):
+        return (text(data['id']), text(space_id or nested_id(data, 'space')),
+                data.get('name'), int(bool(data.get('archived', archived))))
+
+
+class List(Model):
+    TABLE = 'lists'
+    FIELDS = ('id', 'space_id', 'folder_id', 'name', 'archived')
+    LAZY = ('assignee', 'content', 'statuses')
+    __slots__ = FIELDS
+
+    @staticmethod
+    def columns(data, space_id=None, folder_id=None, archived=False):
+        folder = data.get('folder') or {}
+        if folder_id is None and not folder.get('hidden'):
+            folder_id = folder.get('id')
+        return (text(data['id']), text(space_id or nested_id(data, 'space')),
+                text(folder_id), data.get('name'),
+                int(bool(data.get('archived', archived))))
+
+    @property
+    def assignee_id(self):
+        assignee = self.assignee
+        if isinstance(assignee, dict):
+            assignee = assignee.get('id')
+        return text(assignee)
+
+
+class Task(Model):
+    TABLE = 'tasks'
+    FIELDS = ('id', 'list_id', 'parent', 'name', 'status', 'closed',
+              'archived', 'date_created', 'date_updated', 'date_closed',
+              'due_date')
+    LAZY = ('description', 'text_content', 'markdown_description',
+            'custom_fields', 'checklists', 'assignees', 'tags', 'attachments')
+    __slots__ = FIELDS
+
+    @staticmethod
+    def columns(data, list_id=None):
+        status = data.get('status') or {}
+        return (str(data['id']), nested_id(data, 'list') or text(list_id),
+                data.get('parent'), data.get('name'), status.get('status'),
+                int(is_closed(data)), int(bool(data.get('archived'))),
+                timestamp(data.get('date_created')),
+                timestamp(data.get('date_updated')),
+                timestamp(data.get('date_closed')),
+                timestamp(data.get('due_date')))
@@ -0,0 +1,120 @@
+import os
+import threading
+import time
+from cache import CACHE_DIR, HOUR, MINUTE
+
+NAME_INDEX_FILE = os.path.join(CACHE_DIR, 'names.db')
+NAME_INDEX_TTL = 24 * HOUR
+# How long an entry is taken to still name its item without asking the API,
+# e.g. to rename a list by name right after listing them.
+NAME_TRUST_AGE = 5 * MINUTE
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def name_key(name: str):
+    return name.casefold()
+
+
+def trusted(entry: dict):
+    return time.time() - entry['indexed_at'] < NAME_TRUST_AGE
+
+
+def get_name_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = NameIndex()
+    return _index
+
+
+class NameIndex:
+    # Maps (kind, parent, name) to an ID, where kind is one of space, folder
+    # or list and parent is e.g. 'team:1', 'space:10' or 'folder:100'.
+    # Names are matched case-insensitively.
+    def __init__(self, filename: str = NAME_INDEX_FILE,
+                 ttl: int = NAME_INDEX_TTL):
+        import sqlite3
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        self.filename = filename
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(filename,
+                                   timeout=5,
+                                   check_same_thread=False,
+                                   isolation_level=None)
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS names (
+                kind TEXT NOT NULL,
+                parent TEXT NOT NULL,
+                archived INTEGER NOT NULL,
+                key TEXT NOT NULL,
+                name TEXT NOT NULL,
+                id TEXT NOT NULL,
+                indexed_at REAL NOT NULL,
+                PRIMARY KEY (kind, parent, archived, key)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS names_id ON names (kind, id);
+        """)
+
+    def lookup(self, kind: str, parent: str, name: str, archived=False):
+        with self._lock:
+            row = self._db.execute(
+                'SELECT id, name, indexed_at FROM names WHERE kind = ? AND '
+                'parent = ? AND archived = ? AND key = ? AND indexed_at >= ?',
+                (kind, parent, int(archived), name_key(name),
+                 time.time() - self.ttl)).fetchone()
+        if row is not None:
+            return {'id': row[0], 'name': row[1], 'indexed_at': row[2]}
+
+    def replace(self, kind: str, parent: str, items, archived=False):
+        # First occurrence of a name wins, matching a linear scan of the
+        # API response.
+        now = time.time()
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            try:
+                self._db.execute(
+                    'DELETE FROM names WHERE kind = ? AND parent = ? '
+                    'AND archived = ?', (kind, parent, int(archived)))
+                self._db.executemany(
+                    'INSERT OR IGNORE INTO names (kind, parent, archived, '
+                    'key, name, id, indexed_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    [(kind, parent, int(archived), name_key(item['name']),
+                      item['name'], str(item['id']), now) for item in items
+                     if 'name' in item and 'id' in item])
+                self._db.execute('COMMIT')
+            except BaseException:
+                self._db.execute('ROLLBACK')
+                raise
+
+    def record(self, kind: str, parent: str, item: dict, archived=False):
+        if 'name' not in item or 'id' not in item:
+            return
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO names (kind, parent, archived, key, '
+                'name, id, indexed_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (kind, parent, int(archived), name_key(item['name']),
+                 item['name'], str(item['id']), time.time()))
+
+    def rename(self, kind: str, id, new_name: str):
+        # After the API renamed it, so the entry is as good as new.
+        with self._lock:
+            self._db.execute(
+                'UPDATE OR REPLACE names SET key = ?, name = ?, '
+                'indexed_at = ? WHERE kind = ? AND id = ?',
+                (name_key(new_name), new_name, time.time(), kind, str(id)))
+
+    def forget(self, kind: str, id):
+        with self._lock:
+            self._db.execute('DELETE FROM names WHERE kind = ? AND id = ?',
+                             (kind, str(id)))
+
+    def clear(self):
+        with self._lock:
+            count = self._db.execute('SELECT COUNT(*) FROM names').fetchone()[0]
+            self._db.execute('DELETE FROM names')
+            return count
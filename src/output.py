@@ -0,0 +1,312 @@
+import click
+import contextvars
+import csv
+import io
+import json
+import os
+import sys
+import threading
+import tracing
+from contextlib import contextmanager
+from projection import COLLECTION_KEYS, FIELDS_KEY, leaf_paths
+
+try:
+    import orjson
+except ImportError:  # optional, only makes rendering faster
+    orjson = None
+
+# json is the indented document commands have always printed. compact is
+# the same document on one line. ndjson, csv and tsv write one line per item
+# of a collection response (e.g. one per task). csv and tsv columns are the
+# item's top-level fields, with nested objects and lists written as JSON, or
+# with --fields exactly the requested paths, named like status.status.
+FORMATS = ['json', 'compact', 'ndjson', 'csv', 'tsv']
+OUTPUT_KEY = 'clicli.output'
+
+_encoders = {
+    sort_keys: json.JSONEncoder(separators=(',', ':'),
+                                ensure_ascii=False,
+                                sort_keys=sort_keys).encode
+    for sort_keys in (False, True)
+}
+
+_local = threading.local()
+
+
+def output_callback(ctx, param, value):
+    ctx.meta[OUTPUT_KEY] = value
+    return value
+
+
+output_option = click.option(
+    '--output',
+    help='json is indented, compact is one line. ndjson, csv and tsv write '
+    'one line per item.',
+    default='json',
+    show_default=True,
+    type=click.Choice(FORMATS),
+    expose_value=False,
+    callback=output_callback)
+
+
+def output_format():
+    ctx = click.get_current_context(silent=True)
+    if ctx is None:
+        return 'json'
+    return ctx.meta.get(OUTPUT_KEY, 'json')
+
+
+def output_fields():
+    ctx = click.get_current_context(silent=True)
+    if ctx is None:
+        return None
+    return ctx.meta.get(FIELDS_KEY)
+
+
+def dumps(value, sort_keys=False):
+    # Compact JSON as UTF-8 bytes, through orjson when it is installed.
+    if orjson is not None:
+        return orjson.dumps(value,
+                            option=orjson.OPT_SORT_KEYS if sort_keys else 0)
+    return _encoders[sort_keys](value).encode()
+
+
+def collection(data):
+    # (key, items) of a collection response, or (None, None).
+    if isinstance(data, dict):
+        for key in COLLECTION_KEYS:
+            if isinstance(data.get(key), list):
+                return key, data[key]
+    return None, None
+
+
+def pluck(value, path):
+    # The value at a path of keys, taken from every member of a list on the
+    # way, e.g. the IDs of all assignees for ('assignees', 'id').
+    for index, key in enumerate(path):
+        if isinstance(value, list):
+            return [pluck(member, path[index:]) for member in value]
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def cell(value):
+    kind = type(value)
+    if kind is str:
+        return value
+    if value is None:
+        return ''
+    if kind is bool:
+        return 'true' if value else 'false'
+    if kind is list or kind is dict:
+        if not value:
+            return '[]' if kind is list else '{}'
+        return dumps(value).decode()
+    return str(value)
+
+
+def indented(item, sort_keys=False):
+    # An item as json.dumps(..., indent=4) renders it two levels deep.
+    text = json.dumps(item, indent=4, sort_keys=sort_keys)
+    return ('        ' + text.replace('\n', '\n        ')).encode()
+
+
+class PageRenderer:
+    # Renders {key: [...]} a page of items at a time, byte for byte what
+    # render produces for the whole document. csv and tsv columns are the
+    # leaf paths of fields (see projection.parse_fields) when given, and
+    # otherwise the top-level fields of the first page. A field missing from
+    # the first page can't be added to the header already written, so it
+    # raises rather than being dropped.
+    def __init__(self, key: str, format: str, sort_keys=False, fields=None):
+        self.key = key
+        self.format = format
+        self.sort_keys = sort_keys
+        self.started = False
+        self.columns = None
+        self.paths = leaf_paths(fields) if fields else None
+
+    def render(self, items) -> bytes:
+        if self.format in ('csv', 'tsv'):
+            return self.render_rows(items)
+        if self.format == 'ndjson':
+            return b''.join(
+                dumps(item, self.sort_keys) + b'\n' for item in items)
+        if not items:
+            return b''
+        name = json.dumps(self.key).encode()
+        if self.format == 'compact':
+            opening, separator = b'{%s:[' % name, b','
+            chunk = separator.join(dumps(item, self.sort_keys)
+                                   for item in items)
+        else:
+            opening, separator = b'{\n    %s: [\n' % name, b',\n'
+            chunk = separator.join(indented(item, self.sort_keys)
+                                   for item in items)
+        chunk = (separator if self.started else opening) + chunk
+        self.started = True
+        return chunk
+
+    def render_rows(self, items) -> bytes:
+        if not items:
+            return b''
+        text = io.StringIO()
+        writer = csv.writer(text,
+                            delimiter='\t' if self.format == 'tsv' else ',',
+                            lineterminator='\n')
+        if self.columns is None:
+            if self.paths is not None:
+                self.columns = ['.'.join(path) for path in self.paths]
+            else:
+                columns = {}
+                for item in items:
+                    columns.update(dict.fromkeys(
+                        item if isinstance(item, dict) else ['value']))
+                self.columns = list(columns)
+            writer.writerow(self.columns)
+        if self.paths is not None:
+            rows = [[cell(pluck(item, path)) for path in self.paths]
+                    for item in items]
+        else:
+            rows = [self.row(item) for item in items]
+        writer.writerows(rows)
+        return text.getvalue().encode()
+
+    def row(self, item):
+        if not isinstance(item, dict):
+            item = {'value': item}
+        for name in item:
+            if name not in self.columns:
+                raise click.ClickException(
+                    'an item has the field %r, which is not a column of the '
+                    '%s header already written. Choose the columns with '
+                    '--fields.' % (name, self.format))
+        return [cell(item.get(column)) for column in self.columns]
+
+    def finish(self) -> bytes:
+        if self.format in ('csv', 'tsv', 'ndjson'):
+            return b''
+        name = json.dumps(self.key).encode()
+        if self.format == 'compact':
+            return b']}\n' if self.started else b'{%s:[]}\n' % name
+        return b'\n    ]\n}\n' if self.started else \
+            b'{\n    %s: []\n}\n' % name
+
+
+def render(data, format: str, sort_keys=True):
+    if format == 'json':
+        return json.dumps(data, indent=4, sort_keys=sort_keys).encode() + \
+            b'\n'
+    if format == 'compact':
+        return dumps(data, sort_keys) + b'\n'
+    key, items = collection(data)
+    if items is None:
+        items = data if isinstance(data, list) else [data]
+    renderer = PageRenderer(key, format, sort_keys, output_fields())
+    return renderer.render(items) + renderer.finish()
+
+
+def write(data: bytes):
+    stream = sys.stdout
+    stream.flush()
+    buffer = getattr(stream, 'buffer', None)
+    if buffer is not None:
+        buffer.write(data)
+        buffer.flush()
+    else:
+        stream.write(data.decode())
+        stream.flush()
+
+
+def emit(data, sort_keys=True):
+    # Every command renders its result through here. Code that runs commands
+    # programmatically (e.g. `clicli batch`) collects the result objects
+    # instead of printing them.
+    collector = getattr(_local, 'collector', None)
+    if collector is not None:
+        collector.append(data)
+        return
+    with tracing.span('render'):
+        write(render(data, output_format(), sort_keys))
+
+
+def emit_pages(pages, key: str, sort_keys=False):
+    # Writes {key: [...]} with each page flushed as soon as it is rendered,
+    # so consumers like jq or head see output right away. When the consumer
+    # closes the pipe, the remaining page fetches are cancelled.
+    collector = getattr(_local, 'collector', None)
+    if collector is not None:
+        collector.append(
+            {key: [item for page in pages for item in page.get(key, [])]})
+        return
+    renderer = PageRenderer(key, output_format(), sort_keys,
+                            output_fields())
+    try:
+        for page in pages:
+            with tracing.span('render'):
+                write(renderer.render(page.get(key, [])))
+        with tracing.span('render'):
+            write(renderer.finish())
+    except BrokenPipeError:
+        if hasattr(pages, 'close'):
+            pages.close()
+        stdout_closed()
+
+
+def stdout_closed():
+    # Called on BrokenPipeError. Output that is still buffered goes to
+    # /dev/null, so the interpreter does not fail again flushing it at exit.
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, sys.stdout.fileno())
+    os.close(devnull)
+    sys.exit(1)
+
+
+@contextmanager
+def collect():
+    previous = getattr(_local, 'collector', None)
+    _local.collector = []
+    try:
+        yield _local.collector
+    finally:
+        _local.collector = previous
+
+
+class ThreadLocalStream:
+    # Stands in for sys.stdout/sys.stderr so that each caller can send what
+    # it writes somewhere else, while other threads keep writing to the
+    # original stream. The redirect is a context variable, so it also holds
+    # in the workers of an executor.ThreadPoolExecutor the caller submits
+    # to.
+    def __init__(self, default):
+        self._default = default
+        self._stream = contextvars.ContextVar('stream', default=None)
+
+    @property
+    def current(self):
+        return self._stream.get() or self._default
+
+    @contextmanager
+    def redirect(self, stream):
+        token = self._stream.set(stream)
+        try:
+            yield stream
+        finally:
+            self._stream.reset(token)
+
+    def write(self, data):
+        return self.current.write(data)
+
+    def flush(self):
+        return self.current.flush()
+
+    def isatty(self):
+        return self.current.isatty()
+
+    def __iter__(self):
+        return iter(self.current)
+
+    def __getattr__(self, name):
+        return getattr(self.current, name)
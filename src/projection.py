@@ -0,0 +1,79 @@
+import click
+
+# Keys under which API responses return collections. When a response has
+# one, --fields applies to each item rather than to the envelope.
+COLLECTION_KEYS = ['tasks', 'lists', 'folders', 'spaces', 'teams']
+
+
+def parse_fields(spec: str):
+    # 'id,name,status.status' -> {'id': {}, 'name': {}, 'status': {'status':
+    # {}}}. An empty dict means "keep the whole value".
+    fields = {}
+    for path in spec.split(','):
+        path = path.strip()
+        if not path:
+            continue
+        node = fields
+        parts = path.split('.')
+        for part in parts:
+            if part in node and not node[part] and part != parts[-1]:
+                break  # an ancestor was already requested in full
+            node = node.setdefault(part, {})
+        else:
+            node.clear()
+    return fields
+
+
+def project(value, fields):
+    if not fields:
+        return value
+    if isinstance(value, list):
+        return [project(item, fields) for item in value]
+    if not isinstance(value, dict):
+        return value
+    return {
+        key: project(value[key], subfields)
+        for key, subfields in fields.items() if key in value
+    }
+
+
+def project_response(response, fields):
+    if not fields or not isinstance(response, dict):
+        return response
+    for key in COLLECTION_KEYS:
+        if isinstance(response.get(key), list):
+            projected = dict(response)
+            projected[key] = [project(item, fields) for item in response[key]]
+            return projected
+    if 'err' in response:
+        return response
+    return project(response, fields)
+
+
+# Where fields_callback leaves the parsed --fields for the csv and tsv
+# columns (see output.PageRenderer).
+FIELDS_KEY = 'clicli.fields'
+
+
+def fields_callback(ctx, param, value):
+    fields = parse_fields(value) if value else None
+    ctx.meta[FIELDS_KEY] = fields
+    return fields
+
+
+def leaf_paths(fields, prefix=()):
+    # {'id': {}, 'status': {'status': {}}} -> [('id',), ('status', 'status')]
+    paths = []
+    for key, subfields in fields.items():
+        if subfields:
+            paths += leaf_paths(subfields, prefix + (key, ))
+        else:
+            paths.append(prefix + (key, ))
+    return paths
+
+
+fields_option = click.option(
+    '--fields',
+    help='Comma separated fields to keep for each item, with dots for '
+    'nested fields, e.g. id,name,status.status',
+    callback=fields_callback)
@@ -0,0 +1,239 @@
+import re
+from datetime import datetime
+from models import Task
+
+# Compiles task filters into SQL over the mirror's tasks table. Filters come
+# from the same flags `tasks list` sends to the API, plus --where
+# expressions such as
+#
+#     status = "in progress" and (assignee = 123 or due_date < 2021-06-01)
+#
+# Supported operators are = != < <= > >= and ~ (case-insensitive
+# substring match), combined with and, or, not and parentheses. Values are
+# always bound as parameters; field names only ever select a column from
+# FIELD_COLUMNS.
+
+ORDER_COLUMNS = {
+    'id': 'tasks.id',
+    'created': 'tasks.date_created',
+    'updated': 'tasks.date_updated',
+    'due_date': 'tasks.due_date',
+}
+
+# Order columns that may be NULL, whose tasks come last either way as they
+# do from the API.
+NULLABLE_ORDERS = {'due_date'}
+
+FIELD_COLUMNS = {
+    'id': 'tasks.id',
+    'name': 'tasks.name',
+    'status': 'tasks.status',
+    'list': 'tasks.list_id',
+    'parent': 'tasks.parent',
+    'closed': 'tasks.closed',
+    'archived': 'tasks.archived',
+    'due_date': 'tasks.due_date',
+    'date_created': 'tasks.date_created',
+    'date_updated': 'tasks.date_updated',
+    'date_closed': 'tasks.date_closed',
+}
+DATE_FIELDS = {'due_date', 'date_created', 'date_updated', 'date_closed'}
+NOCASE_FIELDS = {'name', 'status'}
+OPERATORS = ['<=', '>=', '!=', '=', '<', '>', '~']
+
+TOKEN_PATTERN = re.compile(
+    r'\s*(?:(?P<string>"(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\')'
+    r'|(?P<op><=|>=|!=|=|<|>|~)'
+    r'|(?P<paren>[()])'
+    r'|(?P<word>[^\s()<>=!~"\']+))')
+
+
+class QueryError(ValueError):
+    pass
+
+
+def to_milliseconds(value: datetime):
+    return int(value.timestamp() * 1000)
+
+
+def parse_value(field: str, token):
+    kind, text = token
+    if kind == 'string':
+        text = re.sub(r'\\(.)', r'\1', text[1:-1])
+    elif kind != 'word':
+        raise QueryError('expected a value after %s' % field)
+    if field in DATE_FIELDS:
+        if re.fullmatch(r'\d+', text):
+            return int(text)
+        try:
+            return to_milliseconds(datetime.strptime(text, '%Y-%m-%d'))
+        except ValueError:
+            raise QueryError('%s expects a date (YYYY-MM-DD), not %s' %
+                             (field, text))
+    if field in ('closed', 'archived'):
+        if text.lower() not in ('true', 'false', '1', '0'):
+            raise QueryError('%s expects true or false' % field)
+        return int(text.lower() in ('true', '1'))
+    return text
+
+
+def tokenize(expression: str):
+    tokens = []
+    position = 0
+    expression = expression.strip()
+    while position < len(expression):
+        match = TOKEN_PATTERN.match(expression, position)
+        if match is None or match.end() == position:
+            raise QueryError('unexpected input at %r' % expression[position:])
+        tokens.append((match.lastgroup, match.group(match.lastgroup)))
+        position = match.end()
+    return tokens
+
+
+class WhereParser:
+    def __init__(self, expression: str):
+        self.tokens = tokenize(expression)
+        self.position = 0
+        self.params = []
+
+    def peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return (None, None)
+
+    def take(self):
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def keyword(self, word: str):
+        kind, text = self.peek()
+        if kind == 'word' and text.lower() == word:
+            self.position += 1
+            return True
+        return False
+
+    def parse(self):
+        sql = self.parse_or()
+        if self.position != len(self.tokens):
+            raise QueryError('unexpected %s' % self.peek()[1])
+        return sql, self.params
+
+    def parse_or(self):
+        parts = [self.parse_and()]
+        while self.keyword('or'):
+            parts.append(self.parse_and())
+        return parts[0] if len(parts) == 1 else '(%s)' % ' OR '.join(parts)
+
+    def parse_and(self):
+        parts = [self.parse_not()]
+        while self.keyword('and'):
+            parts.append(self.parse_not())
+        return parts[0] if len(parts) == 1 else '(%s)' % ' AND '.join(parts)
+
+    def parse_not(self):
+        if self.keyword('not'):
+            return 'NOT %s' % self.parse_not()
+        if self.peek() == ('paren', '('):
+            self.take()
+            sql = self.parse_or()
+            if self.take() != ('paren', ')'):
+                raise QueryError('missing )')
+            return sql
+        return self.parse_comparison()
+
+    def parse_comparison(self):
+        kind, field = self.take()
+        if kind is None:
+            raise QueryError('expected a field name at the end')
+        if kind != 'word':
+            raise QueryError('expected a field name, not %s' % field)
+        field = field.lower()
+        kind, operator = self.take()
+        if kind != 'op':
+            raise QueryError('expected an operator after %s' % field)
+        if field == 'assignee':
+            if operator not in ('=', '!='):
+                raise QueryError('assignee only supports = and !=')
+            self.params.append(parse_value(field, self.take()))
+            return '%stasks.id IN (SELECT task_id FROM task_assignees ' \
+                'WHERE user_id = ?)' % ('NOT ' if operator == '!=' else '')
+        if field not in FIELD_COLUMNS:
+            raise QueryError('unknown field %s, expected one of %s' %
+                             (field, ', '.join(sorted(FIELD_COLUMNS) +
+                                               ['assignee'])))
+        column = FIELD_COLUMNS[field]
+        value = parse_value(field, self.take())
+        if operator == '~':
+            # % and _ in the value are matched literally.
+            self.params.append('%%%s%%' %
+                               re.sub(r'([\\%_])', r'\\\1', str(value)))
+            return "%s LIKE ? ESCAPE '\\'" % column
+        self.params.append(value)
+        collate = ' COLLATE NOCASE' if field in NOCASE_FIELDS else ''
+        return '%s%s %s ?' % (column, collate, operator)
+
+
+def build_task_query(list_ids=None,
+                     statuses=None,
+                     include_closed=False,
+                     assignees=None,
+                     archived=False,
+                     subtasks=False,
+                     due_date_gt: datetime = None,
+                     due_date_lt: datetime = None,
+                     date_created_gt: datetime = None,
+                     date_created_lt: datetime = None,
+                     date_updated_gt: datetime = None,
+                     date_updated_lt: datetime = None,
+                     where: str = None,
+                     order: str = None,
+                     reverse=False,
+                     limit: int = None):
+    clauses = ['tasks.archived = ?']
+    params = [int(archived)]
+    if list_ids:
+        clauses.append('tasks.list_id IN (%s)' % ','.join('?' * len(list_ids)))
+        params += [str(id) for id in list_ids]
+    if statuses:
+        statuses = [status.strip() for status in statuses.split(',')]
+        clauses.append('tasks.status COLLATE NOCASE IN (%s)' %
+                       ','.join('?' * len(statuses)))
+        params += statuses
+    elif not include_closed:
+        clauses.append('tasks.closed = 0')
+    if assignees:
+        assignees = [assignee.strip() for assignee in assignees.split(',')]
+        clauses.append('tasks.id IN (SELECT task_id FROM task_assignees '
+                       'WHERE user_id IN (%s))' %
+                       ','.join('?' * len(assignees)))
+        params += assignees
+    if not subtasks:
+        clauses.append('tasks.parent IS NULL')
+    for column, operator, value in [
+        ('due_date', '>', due_date_gt),
+        ('due_date', '<', due_date_lt),
+        ('date_created', '>', date_created_gt),
+        ('date_created', '<', date_created_lt),
+        ('date_updated', '>', date_updated_gt),
+        ('date_updated', '<', date_updated_lt),
+    ]:
+        if value is not None:
+            clauses.append('tasks.%s %s ?' % (column, operator))
+            params.append(to_milliseconds(value))
+    if where:
+        where_sql, where_params = WhereParser(where).parse()
+        clauses.append(where_sql)
+        params += where_params
+    # Like the API, newest first unless reversed.
+    direction = 'ASC' if reverse else 'DESC'
+    column = ORDER_COLUMNS[order or 'created']
+    if order in NULLABLE_ORDERS:
+        column = '%s IS NULL, %s' % (column, column)
+    sql = 'SELECT %s FROM tasks WHERE %s ORDER BY %s %s, tasks.id %s' \
+        % (Task.select_columns(), ' AND '.join(clauses), column, direction,
+           direction)
+    if limit is not None:
+        sql += ' LIMIT ?'
+        params.append(limit)
+    return sql, params
@@ -0,0 +1,157 @@
+import click
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Per-request timing for `clicli --trace`. Nothing is recorded unless
+# tracing is configured, and the hot paths only check `tracer` for None.
+
+PHASES = ['dns', 'connect', 'tls', 'send', 'ttfb', 'download', 'decode',
+          'render']
+RATE_LIMIT_HEADERS = ['X-RateLimit-Limit', 'X-RateLimit-Remaining',
+                      'X-RateLimit-Reset']
+
+tracer = None
+
+
+def configure(enabled: bool, trace_file: str = None):
+    global tracer
+    tracer = Tracer(trace_file) if enabled or trace_file else None
+    return tracer
+
+
+def now():
+    return time.perf_counter()
+
+
+@contextmanager
+def span(phase: str, **args):
+    # Times a block under one of PHASES, e.g. decoding or rendering.
+    if tracer is None:
+        yield
+        return
+    start = now()
+    try:
+        yield
+    finally:
+        tracer.add(phase, start, now() - start, args)
+
+
+class Tracer:
+    def __init__(self, trace_file: str = None):
+        self.trace_file = trace_file
+        self.started = now()
+        self.events = []
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def add(self, phase: str, start: float, duration: float, args=None):
+        with self._lock:
+            self.events.append(
+                (phase, start, duration, threading.get_ident(), args or {}))
+
+    def request(self, method: str, url: str, start: float, timings: dict,
+                status: int, size: int, headers=None, attempt: int = 0):
+        # timings maps phase names to (start, duration) pairs.
+        rate_limit = {
+            name: headers.get(name)
+            for name in RATE_LIMIT_HEADERS
+            if headers is not None and headers.get(name) is not None
+        }
+        record = {
+            'method': method,
+            'url': url,
+            'status': status,
+            'bytes': size,
+            'attempt': attempt,
+            'rate_limit': rate_limit,
+            'duration': now() - start,
+            'phases': {phase: timing[1]
+                       for phase, timing in timings.items()},
+        }
+        with self._lock:
+            self.requests.append(record)
+        self.add('request', start, record['duration'], {
+            'method': method,
+            'url': url,
+            'status': status,
+            'bytes': size,
+            'attempt': attempt,
+            **rate_limit
+        })
+        for phase, (phase_start, duration) in timings.items():
+            self.add(phase, phase_start, duration, {'url': url})
+
+    def summary(self):
+        totals = {}
+        for phase, start, duration, thread, args in self.events:
+            totals.setdefault(phase, []).append(duration)
+        rows = []
+        for phase in ['request'] + PHASES:
+            durations = sorted(totals.get(phase, []))
+            if not durations:
+                continue
+            rows.append((phase, len(durations), sum(durations),
+                         sum(durations) / len(durations),
+                         durations[int(0.95 * (len(durations) - 1))],
+                         durations[-1]))
+        return rows
+
+    def report(self):
+        wall = now() - self.started
+
+        def echo(line=''):
+            click.echo(line, err=True)
+
+        echo()
+        echo(click.style('Trace', bold=True) +
+             ': %d requests, %d bytes, %.1f ms wall time' %
+             (len(self.requests),
+              sum(request['bytes'] for request in self.requests),
+              wall * 1000))
+        echo('%-10s %6s %10s %10s %10s %10s' %
+             ('phase', 'count', 'total ms', 'mean ms', 'p95 ms', 'max ms'))
+        for phase, count, total, mean, p95, maximum in self.summary():
+            echo('%-10s %6d %10.1f %10.2f %10.2f %10.2f' %
+                 (phase, count, total * 1000, mean * 1000, p95 * 1000,
+                  maximum * 1000))
+        statuses = {}
+        for request in self.requests:
+            statuses[request['status']] = statuses.get(request['status'],
+                                                       0) + 1
+        if statuses:
+            echo('statuses: %s' % ', '.join(
+                '%s x%d' % (status, count)
+                for status, count in sorted(statuses.items(), key=str)))
+        rate_limited = [
+            request['rate_limit'] for request in self.requests
+            if request['rate_limit']
+        ]
+        if rate_limited:
+            echo('rate limit: %s' % ', '.join(
+                '%s=%s' % (name[len('X-RateLimit-'):].lower(), value)
+                for name, value in rate_limited[-1].items()))
+        if self.trace_file:
+            self.write_chrome_trace(self.trace_file)
+            echo('trace written to %s' % self.trace_file)
+
+    def write_chrome_trace(self, filename: str):
+        # Trace Event Format, loadable in chrome://tracing or Perfetto.
+        pid = os.getpid()
+        with self._lock:
+            events = list(self.events)
+        trace = [{
+            'name': phase if phase != 'request' else
+            '%s %s' % (args.get('method'), args.get('url')),
+            'cat': 'request' if phase == 'request' else 'phase',
+            'ph': 'X',
+            'ts': round((start - self.started) * 1e6, 1),
+            'dur': round(duration * 1e6, 1),
+            'pid': pid,
+            'tid': thread,
+            'args': args,
+        } for phase, start, duration, thread, args in events]
+        with open(filename, 'w') as file:
+            json.dump({'traceEvents': trace, 'displayTimeUnit': 'ms'}, file)
@@ -0,0 +1,12 @@
+import os
+import sys
+
+# The modules live in src/ and import each other as top-level modules, as
+# they do when installed.
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+# The stand-in ClickUp server of the benchmarks, appended so that its
+# scripts don't shadow the modules of the same name.
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                 'benchmarks'))
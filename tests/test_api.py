@@ -0,0 +1,236 @@
+import http.client
+import threading
+import time
+import urllib.parse
+
+import pytest
+
+import api
+from api import (BACKOFF_MAX, ClickUpClient, ConcurrencyLimit, RateLimiter,
+                 Response, classify, retry_after)
+from constants import PAGE_SIZE
+
+
+def task(id, created, due_date=None):
+    return {
+        'id': id,
+        'date_created': str(created),
+        'due_date': due_date and str(due_date),
+    }
+
+
+# Three lists of more than a page each, with interleaved dates and some
+# tasks without a due date.
+LISTS = {
+    list_id: [
+        task('%s-%s' % (list_id, number), 1000 + 3 * number + offset,
+             None if number % 7 == 0 else 5000 - 11 * number + offset)
+        for number in range(PAGE_SIZE + 30 * offset)
+    ]
+    for offset, list_id in enumerate(['a', 'b', 'c'])
+}
+
+
+def served(tasks, order_by, reverse):
+    # As ClickUp pages them: newest first unless reversed, and tasks
+    # missing the field last either way.
+    field = api.TASK_ORDER_FIELDS[order_by]
+    present = [task for task in tasks if task[field] is not None]
+    missing = [task for task in tasks if task[field] is None]
+    return sorted(present, key=lambda task: int(task[field]),
+                  reverse=not reverse) + missing
+
+
+@pytest.fixture
+def requests(monkeypatch):
+    requests = []
+
+    def make_api_request(path, fields=None):
+        requests.append(path)
+        path, query = path.split('?', 1)
+        query = dict(urllib.parse.parse_qsl(query))
+        page = int(query['page'])
+        tasks = served(LISTS[path.split('/')[1]], query['order_by'],
+                       query['reverse'] == 'true')
+        return {'tasks': tasks[page * PAGE_SIZE:(page + 1) * PAGE_SIZE]}
+
+    monkeypatch.setattr(api, 'make_api_request', make_api_request)
+    return requests
+
+
+@pytest.mark.parametrize('order', ['created', 'due_date'])
+@pytest.mark.parametrize('reverse', [False, True])
+def test_merge_order(requests, order, reverse):
+    query = 'order_by=%s&reverse=%s' % (order, str(reverse).lower())
+    merged = list(api.merge_tasks(list(LISTS), query, order, reverse))
+    expected = served([task for tasks in LISTS.values() for task in tasks],
+                      order, reverse)
+    field = api.TASK_ORDER_FIELDS[order]
+    assert [task[field] for task in merged] == \
+        [task[field] for task in expected]
+    assert sorted(task['id'] for task in merged) == \
+        sorted(task['id'] for task in expected)
+    assert all('reverse=%s' % str(reverse).lower() in path
+               for path in requests)
+
+
+
+@pytest.mark.parametrize('method, status, expected', [
+    ('GET', 200, (False, False)),
+    ('GET', 404, (False, False)),
+    ('GET', 429, (True, True)),
+    ('POST', 429, (True, True)),
+    ('GET', 503, (True, True)),
+    ('PUT', 500, (True, True)),
+    ('POST', 500, (False, True)),
+    ('POST', 502, (False, True)),
+])
+def test_classify(method, status, expected):
+    # (retryable, congested)
+    assert classify(method, status) == expected
+
+
+def test_retry_after():
+    now = time.time()
+    assert retry_after({'Retry-After': '2'}) == pytest.approx(now + 2, abs=1)
+    assert retry_after({'Retry-After': 'soon',
+                        'X-RateLimit-Reset': '1700000000'}) == 1700000000
+    assert retry_after({'X-RateLimit-Reset': '1700000000'}) == 1700000000
+    assert retry_after({}) is None
+
+
+def limits(limit, remaining, reset_at):
+    return {
+        'X-RateLimit-Limit': str(limit),
+        'X-RateLimit-Remaining': str(remaining),
+        'X-RateLimit-Reset': str(reset_at),
+    }
+
+
+def test_rate_limiter_spends_tokens():
+    limiter = RateLimiter()
+    assert limiter.reserve() == 0  # nothing known yet
+    reset_at = time.time() + 10
+    limiter.update(limits(100, 2, reset_at))
+    assert limiter.reserve() == 0
+    assert limiter.reserve() == 0
+    assert limiter.reserve() == pytest.approx(10, abs=1)
+    limiter.update(limits(100, 0, time.time() + 1000))
+    assert limiter.reserve() == BACKOFF_MAX
+
+
+def test_rate_limiter_window_reset():
+    limiter = RateLimiter()
+    limiter.update(limits(100, 0, time.time() - 1))
+    assert limiter.reserve() == 0
+    assert limiter.remaining == 99
+    assert limiter.reset_at is None
+
+
+def test_rate_limiter_out_of_order_updates():
+    # Within a window the lower count wins, whatever order responses
+    # arrive in; a new window starts from its own count.
+    limiter = RateLimiter()
+    reset_at = time.time() + 60
+    limiter.update(limits(100, 40, reset_at))
+    limiter.update(limits(100, 45, reset_at))
+    assert limiter.remaining == 40
+    limiter.update(limits(100, 99, reset_at + 60))
+    assert limiter.remaining == 99
+    limiter.update({'X-RateLimit-Limit': 'x'})
+    assert limiter.remaining == 99
+
+
+def test_rate_limiter_pause():
+    limiter = RateLimiter()
+    limiter.update(limits(100, 50, time.time() + 20))
+    limiter.pause_until(time.time() + 5)
+    # Paused to the later of the two.
+    assert limiter.reserve() == pytest.approx(20, abs=1)
+
+
+def test_concurrency_aimd():
+    limit = ConcurrencyLimit(initial=4, maximum=8)
+    limit.adjust(congested=False)
+    assert limit.limit == 4.25
+    for _ in range(100):
+        limit.adjust(congested=False)
+    assert limit.limit == 8
+    limit.adjust(congested=True)
+    assert limit.limit == 4
+    for _ in range(5):
+        limit.adjust(congested=True)
+    assert limit.limit == 1
+
+
+def test_concurrency_limit_blocks():
+    limit = ConcurrencyLimit(initial=2)
+    limit.acquire()
+    limit.acquire()
+    acquired = threading.Event()
+    thread = threading.Thread(
+        target=lambda: (limit.acquire(), acquired.set()))
+    thread.start()
+    assert not acquired.wait(0.05)
+    limit.release()
+    assert acquired.wait(1)
+    thread.join()
+    assert limit.in_flight == 2
+
+
+@pytest.fixture
+def client(monkeypatch):
+    # A client whose _send answers from `client.script`, one response or
+    # exception per attempt, without backing off in between.
+    monkeypatch.setattr(api, 'backoff_delay', lambda attempt: 0)
+    client = ClickUpClient(max_retries=3)
+    client.script = []
+    client.sent = []
+
+    def send(method, url, headers, body, attempt=0, decode=False,
+             fields=None):
+        client.sent.append((method, attempt))
+        answer = client.script.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    client._send = send
+    return client
+
+
+def response(status, **headers):
+    return Response(status, headers, b'{}')
+
+
+def test_429_waits_for_retry_after(client):
+    client.script = [response(429, **{'Retry-After': '0.2'}), response(200)]
+    start = time.monotonic()
+    assert client.request('POST', '/task').status == 200
+    assert time.monotonic() - start >= 0.15
+    assert client.sent == [('POST', 0), ('POST', 1)]
+    assert client.concurrency.limit == 2.5  # halved, then one success
+
+
+def test_server_error_on_post_is_not_retried(client):
+    client.script = [response(500)]
+    assert client.request('POST', '/task').status == 500
+    assert client.sent == [('POST', 0)]
+    assert client.concurrency.limit == 2
+
+
+def test_server_error_on_get_is_retried(client):
+    client.script = [response(503)] * 4
+    assert client.request('GET', '/team').status == 503
+    assert [attempt for _, attempt in client.sent] == [0, 1, 2, 3]
+
+
+def test_network_errors(client):
+    client.script = [ConnectionResetError(), response(200)]
+    assert client.request('GET', '/team').status == 200
+    assert len(client.sent) == 2
+    client.script = [http.client.RemoteDisconnected()]
+    with pytest.raises(http.client.RemoteDisconnected):
+        client.request('POST', '/task')
+    assert len(client.sent) == 3
+    assert client.concurrency.in_flight == 0
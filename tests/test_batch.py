@@ -0,0 +1,136 @@
+import json
+
+import pytest
+from click.testing import CliRunner
+
+import api
+import names
+from fake_clickup import FakeClickUp, Workload
+from main import cli
+
+
+@pytest.fixture(scope='module')
+def server():
+    server = FakeClickUp(Workload(spaces=1, folders=1, lists=1, tasks=0))
+    server.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def run(server, tmp_path, monkeypatch):
+    # Runs a batch of operations and returns the reports by line.
+    monkeypatch.setenv('CLICKUP_API_URL', server.url)
+    monkeypatch.setenv('CLICKUP_API_KEY', 'test')
+    monkeypatch.setattr(api, '_client', None)
+    monkeypatch.setattr(names, '_index',
+                        names.NameIndex(str(tmp_path / 'names.db')))
+
+    def run(*operations, concurrency=4):
+        lines = [
+            operation if isinstance(operation, str) else json.dumps(operation)
+            for operation in operations
+        ]
+        result = CliRunner().invoke(
+            cli, ['--no-cache', 'batch', '-j', str(concurrency)],
+            input='\n'.join(lines) + '\n')
+        reports = [json.loads(line) for line in result.output.splitlines()]
+        run.order = [report['line'] for report in reports]
+        run.exit_code = result.exit_code
+        return {report['line']: report for report in reports}
+
+    return run
+
+
+def test_references_run_in_order(run, server):
+    reports = run(
+        {'op': 'lists.create', 'args': {'name': 'Sprint 1',
+                                        'folder_id': '$f.id'}},
+        {'id': 'f', 'op': 'folders.create',
+         'args': {'name': 'Sprints', 'space_id': '101'}},
+        {'id': 'g', 'op': 'folders.create',
+         'args': {'name': 'Later', 'space_id': '101'}, 'after': 'l'},
+        {'id': 'l', 'op': 'lists.create', 'args': {'name': 'Sprint 2',
+                                                   'folder_id': '$f.id'}},
+    )
+    assert run.exit_code == 0
+    assert all(report['status'] == 'ok' for report in reports.values())
+    folder_id = reports[2]['result']['id']
+    assert reports[1]['result']['folder']['id'] == folder_id
+    assert reports[4]['result']['folder']['id'] == folder_id
+    assert run.order.index(2) < run.order.index(1)
+    assert run.order.index(4) < run.order.index(3)
+
+
+def test_failed_dependencies_skip(run):
+    reports = run(
+        {'id': 'missing', 'op': 'lists.get', 'args': {'id_or_name': '999'}},
+        {'id': 'a', 'op': 'folders.create',
+         'args': {'name': '$missing.name', 'space_id': '101'}},
+        {'op': 'lists.create', 'args': {'name': 'x', 'folder_id': '$a.id'}},
+        {'op': 'folders.create', 'args': {'name': 'Other',
+                                          'space_id': '101'}},
+    )
+    assert run.exit_code == 1
+    assert reports[1]['status'] == 'error'
+    assert reports[2]['status'] == 'skipped'
+    assert reports[3]['status'] == 'skipped'
+    assert reports[4]['status'] == 'ok'
+
+
+def test_circular_dependencies(run):
+    reports = run(
+        {'id': 'a', 'op': 'folders.create', 'args': {'name': '$b.name',
+                                                     'space_id': '101'}},
+        {'id': 'b', 'op': 'folders.create', 'args': {'name': 'b',
+                                                     'space_id': '101'},
+         'after': ['c']},
+        {'id': 'c', 'op': 'folders.create', 'args': {'name': 'c',
+                                                     'space_id': '101'},
+         'after': ['a']},
+        {'id': 'd', 'op': 'folders.create', 'args': {'name': 'd',
+                                                     'space_id': '101'}},
+        {'op': 'folders.create', 'args': {'name': 'e', 'space_id': '101'},
+         'after': ['a', 'd']},
+    )
+    assert run.exit_code == 1
+    assert [reports[line]['status'] for line in range(1, 6)] == \
+        ['error', 'error', 'error', 'ok', 'skipped']
+    assert reports[1]['error'] == 'circular dependency'
+    assert reports[1]['latency_ms'] is None
+
+
+def test_depending_on_itself(run):
+    reports = run({'id': 's', 'op': 'folders.create',
+                   'args': {'name': 's', 'space_id': '101'}, 'after': 's'})
+    assert reports[1]['error'] == 'circular dependency'
+
+
+@pytest.mark.parametrize('line, error', [
+    ('not json', 'invalid JSON'),
+    ('[]', 'expected an object with an "op" key'),
+    ('{"op": "lists.create", "args": []}', '"args" must be an object'),
+    ('{"op": "lists.create", "args": null}', 'missing argument name'),
+    ('{"op": "lists.get", "args": {"id_or_name": "$nowhere.id"}}',
+     'unknown dependency nowhere'),
+    ('{"op": "lists.explode"}', 'unknown operation lists.explode'),
+    ('{"op": "batch"}', 'unknown operation batch'),
+    ('{"op": "lists.get", "args": {"bogus": 1}}', 'unknown arguments bogus'),
+    ('{"op": "lists.get"}', 'missing argument id_or_name'),
+])
+def test_invalid_operations(run, line, error):
+    reports = run(line, {'op': 'folders.create',
+                         'args': {'name': 'fine', 'space_id': '101'}})
+    assert run.exit_code == 1
+    assert reports[1]['status'] == 'error'
+    assert reports[1]['error'].startswith(error)
+    assert reports[2]['status'] == 'ok'
+
+
+def test_duplicate_ids(run):
+    operation = {'id': 'x', 'op': 'folders.create',
+                 'args': {'name': 'x', 'space_id': '101'}}
+    reports = run(operation, operation)
+    assert [report['error'] for report in reports.values()] == \
+        ['duplicate id x'] * 2
@@ -0,0 +1,55 @@
+import pytest
+
+from cache import ResponseCache, cache_scope
+
+PATH = 'team/1/space'
+BODY = b'{"spaces": [{"id": "10"}]}'
+
+
+@pytest.fixture
+def filename(tmp_path):
+    return str(tmp_path / 'responses.db')
+
+
+def test_scopes_are_kept_apart(filename):
+    cache = ResponseCache(filename, scope='a')
+    cache.put('GET', PATH, BODY, {'spaces': [{'id': '10'}]})
+    assert cache.get('GET', PATH) == BODY
+    assert ResponseCache(filename, scope='a').get('GET', PATH) == BODY
+    assert ResponseCache(filename, scope='b').get('GET', PATH) is None
+
+
+def test_invalidation_crosses_scopes(filename):
+    # A change made with one API key may show in another's responses.
+    first = ResponseCache(filename, scope='a')
+    second = ResponseCache(filename, scope='b')
+    for cache in [first, second]:
+        cache.put('GET', PATH, BODY, {'spaces': [{'id': '10'}]})
+    assert first.invalidate('space/10') == 2
+    assert second.get('GET', PATH) is None
+
+
+def test_scope_follows_host_and_api_key(monkeypatch):
+    def scope(url, api_key):
+        monkeypatch.setenv('CLICKUP_API_URL', url)
+        monkeypatch.setenv('CLICKUP_API_KEY', api_key)
+        return cache_scope()
+
+    scopes = {
+        scope('https://api.clickup.com', 'pk_1'),
+        scope('https://api.clickup.com', 'pk_2'),
+        scope('http://127.0.0.1:8080', 'pk_1'),
+    }
+    assert len(scopes) == 3
+    assert scope('https://api.clickup.com', 'pk_1') in scopes
+    assert not any('pk_1' in scope for scope in scopes)
+
+
+def test_default_scope_is_read_per_request(filename, monkeypatch):
+    # As when the daemon runs commands for different API keys in turn.
+    cache = ResponseCache(filename)
+    monkeypatch.setenv('CLICKUP_API_KEY', 'pk_1')
+    cache.put('GET', PATH, BODY, {'spaces': [{'id': '10'}]})
+    assert cache.get('GET', PATH) == BODY
+    monkeypatch.setenv('CLICKUP_API_KEY', 'pk_2')
+    assert cache.get('GET', PATH) is None
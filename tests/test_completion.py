@@ -0,0 +1,180 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import pytest
+
+# completion.answer() reads the command line on its own to skip importing
+# click. Its answers must be what click's completion would print, for every
+# shell, and it must answer within the budget from a fresh interpreter.
+# Both run in a child with its own HOME and cache directory, where the
+# completion and spec files are.
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+COMPLETION_BUDGET_MS = 30
+RUNS = 10
+
+ITEMS = [
+    ('team', '', '1', 'Team'),
+    ('space', 'team:1', '101', 'Space'),
+    ('space', 'team:1', '102', 'Other space'),
+    ('folder', 'space:101', '10101', 'Folder one'),
+    ('folder', 'space:101', '10102', 'Folder two'),
+    ('folder', 'space:102', '10201', 'Elsewhere'),
+    ('list', 'folder:10101', '1010101', 'List one'),
+    ('list', 'folder:10101', '1010102', 'Other list'),
+    ('list', 'folder:10102', '1010201', 'List in two'),
+    ('list', 'space:101', '10190', 'Folderless list'),
+    ('list', 'space:102', '10290', 'Lost list'),
+]
+
+SHELLS = ['bash', 'zsh', 'fish']
+# The words after `clicli`, the last one being completed, and whether
+# answer() must answer rather than leave it to click, or the shells it
+# answers for.
+CASES = [
+    (['lists', 'get', ''], True),
+    (['lists', 'get', 'f'], True),
+    (['lists', 'get', 'OTHER'], True),
+    (['lists', 'get', '1010'], True),
+    # fish passes the word being completed with its quote, which answer()
+    # leaves to click as it can't tell where the word starts.
+    (['lists', 'get', '"Other l'], ['bash', 'zsh']),
+    (['lists', 'get', '-f', '10101', ''], True),
+    (['lists', 'get', '-f10102', ''], True),
+    (['lists', 'get', '--folder-id=10101', 'L'], True),
+    (['lists', 'get', '--space-id', '102', ''], True),
+    (['lists', 'get', '--folder-id', ''], True),
+    (['lists', 'get', '--folder-id='], True),
+    (['lists', 'get', '--fields', 'id', ''], True),
+    (['lists', 'update', '-n', ''], True),
+    (['lists', 'update', '-f', '10101', '--name', 'o'], True),
+    (['lists', 'update', '--id', ''], True),
+    (['folders', 'rename', '-n', ''], True),
+    (['folders', 'rename', '--space-id', '102', '-n', ''], True),
+    (['config', 'set', 'space-id', ''], True),
+    (['config', 'set', 'folder-id', '101'], True),
+    (['config', 'set', 'user', ''], True),
+    (['export', 'out.ndjson', '--space-id', ''], True),
+    (['export', 'out.ndjson', ''], True),
+    (['--no-cache', 'lists', 'get', ''], True),
+    (['lists', ''], False),
+    (['lists', 'g'], False),
+    (['lists', 'get', '--f'], False),
+    (['bogus', ''], False),
+    (['lists', 'get', 'x', ''], False),
+]
+
+SCRIPT = '''
+import io, json, os, sys
+from contextlib import redirect_stdout
+from click.shell_completion import shell_complete
+import completion
+from main import cli
+
+completion.save_spec(cli)
+results = []
+for shell, words, cword in json.load(sys.stdin):
+    instruction = '%s_complete' % shell
+    os.environ.update(COMP_WORDS=words, COMP_CWORD=cword,
+                      _CLICLI_COMPLETE=instruction)
+    ours, theirs = io.StringIO(), io.StringIO()
+    with redirect_stdout(ours):
+        answered = completion.answer()
+    with redirect_stdout(theirs):
+        shell_complete(cli, {}, 'clicli', '_CLICLI_COMPLETE', instruction)
+    results.append([answered, ours.getvalue(), theirs.getvalue()])
+print(json.dumps(results))
+'''
+
+
+@pytest.fixture(scope='module')
+def env(tmp_path_factory):
+    home = str(tmp_path_factory.mktemp('home'))
+    with open(os.path.join(home, '.cliclirc'), 'w') as file:
+        json.dump({'api-key': 'test', 'space-id': '101'}, file)
+    directory = os.path.join(home, '.cache', 'clicli')
+    os.makedirs(directory)
+    with open(os.path.join(directory, 'completion.tsv'), 'w') as file:
+        file.writelines('\t'.join(item) + '\n' for item in ITEMS)
+    # Bytecode is written as an install would have it, so the timings don't
+    # include compiling the modules.
+    env = {
+        key: value
+        for key, value in os.environ.items()
+        if not key.startswith(('CLICKUP_', 'XDG_', 'COMP_', '_CLICLI_'))
+        and key != 'PYTHONDONTWRITEBYTECODE'
+    }
+    env.update(HOME=home, CLICKUP_DAEMON='off')
+    return env
+
+
+def comp_env(shell, words):
+    # COMP_WORDS and COMP_CWORD as each shell's completion script sets them.
+    line = ' '.join(['clicli'] + words)
+    if shell == 'fish':
+        return line, words[-1]
+    return line, str(len(words))
+
+
+@pytest.fixture(scope='module')
+def results(env):
+    # By shell and command line: whether answer() answered, its output and
+    # click's.
+    cases = [(shell, words) for shell in SHELLS for words, _ in CASES]
+    child = subprocess.run([sys.executable, '-c', SCRIPT],
+                           cwd=SRC_DIR,
+                           env=env,
+                           input=json.dumps([[shell, *comp_env(shell, words)]
+                                             for shell, words in cases]),
+                           capture_output=True,
+                           text=True,
+                           check=True)
+    return {(shell, ' '.join(words)): result
+            for (shell, words), result in zip(
+                cases, json.loads(child.stdout.splitlines()[-1]))}
+
+
+@pytest.mark.parametrize('shell', SHELLS)
+@pytest.mark.parametrize('words, answered', CASES)
+def test_answers_as_click(results, shell, words, answered):
+    if isinstance(answered, list):
+        answered = shell in answered
+    ours_answered, ours, theirs = results[shell, ' '.join(words)]
+    assert ours_answered == answered
+    if answered:
+        assert ours == theirs
+
+
+def test_answers_offer_values(results):
+    # Not just agreeing on nothing.
+    _, output, _ = results['bash', 'lists get -f 10101 ']
+    assert output == 'plain,List one\nplain,Other list\n'
+
+
+def test_latency(env):
+    # The whole invocation through the entry point, from starting the
+    # interpreter to printing the values.
+    script = "import sys; sys.argv = ['clicli']; from daemon import main; " \
+        "main()"
+    words, cword = comp_env('bash', ['lists', 'get', '-f', '10101', ''])
+    env = dict(env, COMP_WORDS=words, COMP_CWORD=cword,
+               _CLICLI_COMPLETE='bash_complete')
+
+    def complete():
+        start = time.perf_counter()
+        child = subprocess.run([sys.executable, '-c', script],
+                               cwd=SRC_DIR,
+                               env=env,
+                               capture_output=True,
+                               text=True,
+                               check=True)
+        assert child.stdout == 'plain,List one\nplain,Other list\n'
+        return (time.perf_counter() - start) * 1000
+
+    complete()  # writes the spec and the bytecode
+    assert statistics.median(
+        complete() for _ in range(RUNS)) < COMPLETION_BUDGET_MS
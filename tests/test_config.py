@@ -0,0 +1,116 @@
+import json
+import os
+import threading
+
+import pytest
+from click.testing import CliRunner
+
+import commands.config as config
+from main import cli
+
+
+@pytest.fixture
+def config_file(tmp_path, monkeypatch):
+    filename = str(tmp_path / '.cliclirc')
+    monkeypatch.setattr(config, 'CONFIG_FILE', filename)
+    monkeypatch.setattr(config, '_config', None)
+    monkeypatch.setattr(config, '_config_mtime', None)
+    for key in list(os.environ):
+        if key.startswith(config.ENV_PREFIX):
+            monkeypatch.delenv(key)
+    return filename
+
+
+def read(filename):
+    with open(filename) as file:
+        return json.load(file)
+
+
+def test_set_and_get(config_file):
+    runner = CliRunner()
+    result = runner.invoke(cli, ['config', 'set', 'space-id', '101'])
+    assert result.exit_code == 0
+    result = runner.invoke(cli, ['config', 'get', 'space-id'])
+    assert result.output == '101\n'
+    assert read(config_file) == {'space-id': '101'}
+    assert os.stat(config_file).st_mode & 0o777 == config.PRIVATE_MODE
+    runner.invoke(cli, ['config', 'remove', 'space-id'])
+    assert read(config_file) == {}
+
+
+def test_write_keeps_the_file_mode(config_file):
+    config.set_value('user', '1')
+    os.chmod(config_file, 0o640)
+    config.set_value('team-id', '2')
+    assert os.stat(config_file).st_mode & 0o777 == 0o640
+    assert read(config_file) == {'user': '1', 'team-id': '2'}
+
+
+def test_failed_write_leaves_the_file(config_file, monkeypatch):
+    # The new config only replaces the old one once it is all written.
+    config.set_value('user', '1')
+    fsync = os.fsync
+    failures = [OSError('disk full')]
+
+    def failing_fsync(fd):
+        if failures:
+            raise failures.pop()
+        fsync(fd)
+
+    monkeypatch.setattr(os, 'fsync', failing_fsync)
+    with pytest.raises(OSError):
+        config.set_value('user', '2')
+    assert read(config_file) == {'user': '1'}
+    # The temporary file the failed write left is replaced by the next.
+    config.set_value('user', '3')
+    assert read(config_file) == {'user': '3'}
+    assert sorted(os.listdir(os.path.dirname(config_file))) == \
+        ['.cliclirc', '.cliclirc.lock']
+
+
+def test_concurrent_writes(config_file):
+    threads = [
+        threading.Thread(target=config.set_value, args=('key%s' % i, str(i)))
+        for i in range(20)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert read(config_file) == {'key%s' % i: str(i) for i in range(20)}
+
+
+def test_environment_overrides_the_file(config_file, monkeypatch):
+    config.set_value('space-id', '101')
+    config.set_value('api-url', 'https://example.com')
+    monkeypatch.setenv('CLICKUP_SPACE_ID', '202')
+    monkeypatch.setenv('CLICKUP_API_URL', 'http://127.0.0.1:8080')
+    assert config.direct_get('space-id') == '202'
+    assert config.direct_get('api-url') == 'http://127.0.0.1:8080'
+    monkeypatch.setenv('CLICKUP_SPACE_ID', '')
+    assert config.direct_get('space-id') == '101'
+    assert config.value_or_config('303', 'space-id') == '303'
+
+
+def test_missing_key(config_file, capsys):
+    assert config.direct_get('user', silent=True) is None
+    assert capsys.readouterr().err == ''
+    assert config.direct_get('user') is None
+    assert 'not present' in capsys.readouterr().err
+
+
+def test_config_is_read_again_when_it_changes(config_file):
+    with open(config_file, 'w') as file:
+        json.dump({'user': '1'}, file)
+    os.utime(config_file, ns=(10**18, 10**18))
+    assert config.direct_get('user') == '1'
+    # Unchanged modification time: the parsed config is kept.
+    with open(config_file, 'w') as file:
+        json.dump({'user': '2'}, file)
+    os.utime(config_file, ns=(10**18, 10**18))
+    assert config.direct_get('user') == '1'
+    os.utime(config_file, ns=(10**18 + 1, 10**18 + 1))
+    assert config.direct_get('user') == '2'
+    # As after a write by another process.
+    config.set_value('user', '3')
+    assert config.direct_get('user') == '3'
@@ -0,0 +1,167 @@
+import gzip
+import json
+import tracemalloc
+
+import pytest
+
+from decoding import StreamDecoder, decode_chunks, decompress
+from projection import parse_fields, project_response
+
+# threshold=0 makes every body go through the streaming decoder rather than
+# one json.loads call, which is what the splits below are meant to exercise.
+
+DOCUMENTS = {
+    'strings': {
+        'tasks': [{
+            'name': 'quote " backslash \\ slash / tab \t newline \n',
+            'text': 'café ☃ \U0001f600 \u0000',
+            'empty': '',
+            'brackets': '[{]},:',
+        }]
+    },
+    'numbers': {
+        'tasks': [0, -1, 3.25, 12345678901234567890, -0.5e-7, 1E+2, 6.02e23]
+    },
+    'nested arrays': {
+        'tasks': [[], [[]], [1, [2, [3, [4]]]], [{'a': [{'b': []}]}]],
+        'last_page': True,
+    },
+    'top-level array': [{'id': '1', 'tags': []}, [], 'x', 1.5, None],
+    'empty': {},
+}
+
+
+def chunked(data: bytes, *sizes):
+    # Splits data after the given offsets.
+    chunks = []
+    start = 0
+    for size in sizes:
+        chunks.append(data[start:size])
+        start = size
+    return chunks + [data[start:]]
+
+
+def encode(document, indent=None):
+    return json.dumps(document, indent=indent, ensure_ascii=False).encode()
+
+
+@pytest.mark.parametrize('name', DOCUMENTS)
+@pytest.mark.parametrize('indent', [None, 2])
+def test_every_split(name, indent):
+    data = encode(DOCUMENTS[name], indent)
+    for split in range(len(data) + 1):
+        assert decode_chunks(chunked(data, split), 0) == DOCUMENTS[name]
+
+
+@pytest.mark.parametrize('name', DOCUMENTS)
+def test_single_bytes(name):
+    data = encode(DOCUMENTS[name])
+    chunks = [data[i:i + 1] for i in range(len(data))]
+    assert decode_chunks(chunks, 0) == DOCUMENTS[name]
+
+
+@pytest.mark.parametrize('text, value', [
+    ('"\\u00e9"', 'é'),
+    ('"\\ud83d\\ude00"', '\U0001f600'),
+    ('"\\\\\\""', '\\"'),
+    ('3.25', 3.25),
+    ('-12e-3', -12e-3),
+])
+def test_splits_inside_escapes_and_numbers(text, value):
+    data = ('{"tasks": [%s, %s]}' % (text, text)).encode()
+    for split in range(len(data) + 1):
+        for second in range(split, len(data) + 1):
+            assert decode_chunks(chunked(data, split, second),
+                                 0) == {'tasks': [value, value]}
+
+
+def test_number_at_chunk_end_is_not_cut():
+    # "3." parses as 3 until the next chunk brings "25".
+    assert decode_chunks([b'{"tasks": [3.', b'25, 1', b'0]}'],
+                         0) == {'tasks': [3.25, 10]}
+
+
+def test_multibyte_character_split():
+    data = encode({'name': '☃\U0001f600'})
+    for split in range(len(data) + 1):
+        assert decode_chunks(chunked(data, split), 0) == {
+            'name': '☃\U0001f600'
+        }
+
+
+@pytest.mark.parametrize('name', ['strings', 'numbers', 'nested arrays',
+                                  'top-level array'])
+def test_truncated_input_raises(name):
+    # Cut inside a multi-byte character it is a UnicodeDecodeError, as from
+    # json.loads.
+    data = encode(DOCUMENTS[name])
+    for end in range(len(data)):
+        with pytest.raises((json.JSONDecodeError, UnicodeDecodeError)):
+            decode_chunks(chunked(data[:end], end // 2), 0)
+
+
+@pytest.mark.parametrize('data', [
+    b'{"tasks": [1 2]}',
+    b'{"tasks": [1,]}',
+    b'{"tasks" [1]}',
+    b'{tasks: [1]}',
+    b'{"tasks": [1]} []',
+    b'{"tasks": [1]}}',
+])
+def test_invalid_input_raises(data):
+    for split in range(len(data) + 1):
+        with pytest.raises(json.JSONDecodeError):
+            decode_chunks(chunked(data, split), 0)
+
+
+def test_small_bodies_are_decoded_at_once():
+    decoder = StreamDecoder([b'{"tasks": ', b'[1, 2]}'])
+    assert decoder.decode() == {'tasks': [1, 2]}
+    assert decoder.done
+
+
+def test_large_gzip_body():
+    document = {'tasks': [{'id': str(i), 'name': 'task %s' % i}
+                          for i in range(20000)]}
+    data = gzip.compress(encode(document))
+    chunks = [data[i:i + 1000] for i in range(0, len(data), 1000)]
+    assert decode_chunks(decompress(chunks, 'gzip')) == document
+
+
+@pytest.mark.parametrize('document', [
+    {'tasks': [{'id': '1', 'name': 'a', 'status': {'status': 'open',
+                                                   'color': '#fff'}},
+               {'id': '2', 'text': 'b'}, 'x', []],
+     'last_page': True},
+    {'id': '1', 'name': 'a', 'status': {'status': 'open'}},
+    {'err': 'Not found', 'ECODE': 'x'},
+    [{'id': '1', 'name': 'a'}],
+])
+def test_fields_every_split(document):
+    # The same as project_response on the whole document, whether it is
+    # projected while streamed or after one json.loads.
+    fields = parse_fields('id,status.status')
+    expected = project_response(document, fields)
+    data = encode(document)
+    for split in range(len(data) + 1):
+        assert decode_chunks(chunked(data, split), 0, fields) == expected
+    assert decode_chunks([data], fields=fields) == expected
+
+
+def test_fields_are_applied_while_decoding():
+    # What --fields leaves out is dropped task by task, not held for the
+    # whole page.
+    document = {'tasks': [{'id': str(i), 'description': 'x' * 1000}
+                          for i in range(2000)]}
+    data = encode(document)
+    chunks = [data[i:i + 65536] for i in range(0, len(data), 65536)]
+
+    def peak(fields):
+        tracemalloc.start()
+        try:
+            decode_chunks(chunks, 0, fields)
+            return tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    assert peak(parse_fields('id')) < peak(None) / 4
@@ -0,0 +1,110 @@
+import json
+from collections import Counter
+
+import pytest
+from click.testing import CliRunner
+
+import api
+import commands.export as export_module
+from fake_clickup import FakeClickUp, Workload
+from main import cli
+
+# Two lists of several pages each, in the stand-in server's IDs.
+LIST_IDS = ['1010101', '1010102']
+
+
+class Killed(Exception):
+    pass
+
+
+@pytest.fixture(scope='module')
+def server():
+    server = FakeClickUp(
+        Workload(spaces=1, folders=1, lists=2, folderless_lists=0,
+                 tasks=250)).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def run(server, monkeypatch):
+    monkeypatch.setenv('CLICKUP_API_URL', server.url)
+    monkeypatch.setenv('CLICKUP_API_KEY', 'test')
+    monkeypatch.setattr(api, '_client', None)
+    monkeypatch.setattr(api, 'backoff_delay', lambda attempt: 0)
+
+    def run(*args):
+        return CliRunner().invoke(cli, ['--no-cache', 'export', *args])
+
+    return run
+
+
+def server_ids(server):
+    return Counter(task['id'] for list_id in LIST_IDS
+                   for task in server.workload.list_tasks(int(list_id), {}))
+
+
+def file_ids(filename):
+    with open(filename) as file:
+        return Counter(json.loads(line)['id'] for line in file)
+
+
+def test_export(server, run, tmp_path):
+    filename = str(tmp_path / 'tasks.ndjson')
+    result = run(filename, *LIST_IDS)
+    assert result.exit_code == 0, result.output
+    assert file_ids(filename) == server_ids(server)
+    assert len(server_ids(server)) == 500
+
+
+@pytest.mark.parametrize('every', [2, 3, 4])
+def test_killed_and_resumed(server, run, tmp_path, monkeypatch, every):
+    # Every run dies on its `every`th checkpoint, after writing a page (or
+    # finishing a list) but before the checkpoint records it, the worst
+    # moment.
+    filename = str(tmp_path / 'tasks.ndjson')
+    save_checkpoint = export_module.save_checkpoint
+    saves = Counter()
+
+    def dying_save_checkpoint(filename, checkpoint):
+        saves['run'] += 1
+        if saves['run'] == every:
+            raise Killed()
+        save_checkpoint(filename, checkpoint)
+
+    monkeypatch.setattr(export_module, 'save_checkpoint',
+                        dying_save_checkpoint)
+    result = run(filename, *LIST_IDS)
+    runs = 1
+    while isinstance(result.exception, Killed):
+        saves.clear()
+        result = run(filename, '--resume')
+        runs += 1
+    assert result.exit_code == 0, result.output
+    assert runs > 1
+    assert file_ids(filename) == server_ids(server)
+
+
+def test_stopped_on_server_errors_and_resumed(server, run, tmp_path,
+                                              monkeypatch):
+    filename = str(tmp_path / 'tasks.ndjson')
+    fetch_page = export_module.fetch_page
+    pages = Counter()
+
+    def failing_fetch_page(filename, checkpoint, fields):
+        pages['fetched'] += 1
+        server.error_rate = 1 if pages['fetched'] == 3 else 0
+        return fetch_page(filename, checkpoint, fields)
+
+    monkeypatch.setattr(export_module, 'fetch_page', failing_fetch_page)
+    try:
+        result = run(filename, *LIST_IDS)
+    finally:
+        server.error_rate = 0
+    assert result.exit_code == 1
+    assert '--resume' in result.output
+    result = run(filename, '--resume')
+    assert result.exit_code == 0, result.output
+    assert json.loads(result.output)['tasks'] == 500
+    assert file_ids(filename) == server_ids(server)
@@ -0,0 +1,196 @@
+import re
+from datetime import datetime
+
+import pytest
+from click.testing import CliRunner
+
+import mirror as mirror_module
+from main import cli
+from mirror import Mirror
+from query import QueryError, WhereParser, to_milliseconds
+
+
+def task(id, name, status, assignees=(), due_date=None):
+    return {
+        'id': id,
+        'name': name,
+        'status': {
+            'status': status,
+            'type': 'closed' if status == 'done' else 'custom',
+        },
+        'assignees': [{'id': user} for user in assignees],
+        'due_date': due_date and str(to_milliseconds(due_date)),
+        'date_created': '1600000000000',
+        'date_updated': '1600000000000',
+    }
+
+
+TASKS = [
+    task('t1', 'Write docs', 'in progress', [1], datetime(2021, 5, 1)),
+    task('t2', 'Fix "quoted" bug', 'open', [2], datetime(2021, 7, 1)),
+    task('t3', "It's 50% done", 'In Progress', [1, 2]),
+    task('t4', 'and or not', 'done', [], datetime(2021, 6, 15)),
+]
+
+
+@pytest.fixture
+def mirror(tmp_path, monkeypatch):
+    mirror = Mirror(str(tmp_path / 'mirror.db'))
+    mirror.store_tasks('1', TASKS)
+    monkeypatch.setattr(mirror_module, '_mirror', mirror)
+    return mirror
+
+
+def ids(mirror, where):
+    return sorted(task.id for task in mirror.query_tasks(
+        list_ids=['1'], include_closed=True, where=where))
+
+
+def sql(expression):
+    return WhereParser(expression).parse()
+
+
+NAME = 'tasks.name COLLATE NOCASE = ?'
+
+
+@pytest.mark.parametrize('expression, expected', [
+    ('name = a or name = b and name = c',
+     '(%s OR (%s AND %s))' % (NAME, NAME, NAME)),
+    ('name = a and name = b or name = c',
+     '((%s AND %s) OR %s)' % (NAME, NAME, NAME)),
+    ('not name = a and name = b', '(NOT %s AND %s)' % (NAME, NAME)),
+    ('not not name = a', 'NOT NOT %s' % NAME),
+    ('(name = a or name = b) and name = c',
+     '((%s OR %s) AND %s)' % (NAME, NAME, NAME)),
+    ('not (name = a or name = b)', 'NOT (%s OR %s)' % (NAME, NAME)),
+    ('NAME = a OR name = b AND NOT name = c',
+     '(%s OR (%s AND NOT %s))' % (NAME, NAME, NAME)),
+])
+def test_precedence(expression, expected):
+    # not binds tighter than and, and tighter than or.
+    where, params = sql(expression)
+    assert where == expected
+    assert params == ['a', 'b', 'c'][:len(params)]
+
+
+@pytest.mark.parametrize('expression, expected', [
+    ('status = "in progress" or status = open and assignee = 1',
+     ['t1', 't3']),
+    ('(status = "in progress" or status = open) and assignee = 2',
+     ['t2', 't3']),
+    ('not status = done and not assignee = 1', ['t2']),
+    ('not (status = done or name ~ docs)', ['t2', 't3']),
+    ('assignee = 1 and assignee = 2', ['t3']),
+    ('due_date < 2021-06-01 or due_date > 2021-06-30', ['t1', 't2']),
+    ('closed = true', ['t4']),
+])
+def test_precedence_selects(mirror, expression, expected):
+    assert ids(mirror, expression) == expected
+
+
+@pytest.mark.parametrize('expression, expected', [
+    ('status = "in progress"', ['t1', 't3']),
+    ("status = 'IN PROGRESS'", ['t1', 't3']),
+    (r'name = "Fix \"quoted\" bug"', ['t2']),
+    (r"name = 'It\'s 50% done'", ['t3']),
+    ('name = "and or not"', ['t4']),
+    ('name = "(and)" or name = "and or not"', ['t4']),
+    ('name ~ "50%"', ['t3']),
+    ('name ~ "%"', ['t3']),
+    ('name ~ "_"', []),
+    ('name ~ QUOTED', ['t2']),
+    ('name ~ "DONE"', ['t3']),
+])
+def test_quoting(mirror, expression, expected):
+    assert ids(mirror, expression) == expected
+
+
+@pytest.mark.parametrize('expression, message', [
+    ('', 'expected a field name at the end'),
+    ('status', 'expected an operator after status'),
+    ('status =', 'expected a value after status'),
+    ('status == open', 'expected a value after status'),
+    ('= open', 'expected a field name, not ='),
+    ('status = open and', 'expected a field name at the end'),
+    ('status = open or = done', 'expected a field name, not ='),
+    ('(status = open', 'missing )'),
+    ('status = open)', 'unexpected )'),
+    ('status = open done', 'unexpected done'),
+    ('bogus = 1', 'unknown field bogus'),
+    ('assignee < 3', 'assignee only supports = and !='),
+    ('due_date < tomorrow', 'due_date expects a date'),
+    ('closed = maybe', 'closed expects true or false'),
+    ('status = "open', 'unexpected input at'),
+    ('not', 'expected a field name at the end'),
+])
+def test_invalid_expressions(expression, message):
+    with pytest.raises(QueryError, match='^' + re.escape(message)):
+        sql(expression)
+
+
+@pytest.mark.parametrize('expression', [
+    'status =',
+    '(status = open',
+    'bogus = 1',
+    'name = x; DROP TABLE tasks',
+])
+def test_invalid_expressions_are_usage_errors(mirror, expression):
+    result = CliRunner().invoke(
+        cli, ['tasks', 'list', '1', '--local', '--where', expression])
+    assert result.exit_code == 2
+    assert 'Invalid value for --where' in result.output
+    assert 'Traceback' not in result.output
+    assert ids(mirror, None) == ['t1', 't2', 't3', 't4']
+
+
+@pytest.mark.parametrize('expression', [
+    'name; DROP TABLE tasks = 1',
+    'tasks.name = x',
+    'name) OR (1 = 1',
+    '1 = 1',
+    'id IS NOT NULL OR id = x',
+    '"name" = x',
+    'name-- = x',
+])
+def test_field_names_are_not_sql(expression):
+    with pytest.raises(QueryError):
+        sql(expression)
+
+
+@pytest.mark.parametrize('value', [
+    "x' OR '1'='1",
+    'x" OR 1=1 --',
+    "'; DROP TABLE tasks; --",
+    'x = ? or 1',
+])
+def test_values_are_bound(mirror, value):
+    escaped = value.replace('\\', '\\\\').replace('"', '\\"')
+    for operator in ['=', '!=', '<', '~']:
+        where, params = sql('name %s "%s"' % (operator, escaped))
+        assert where.count('?') == 1
+        assert value not in where
+        assert value in params[0]
+    assert ids(mirror, 'name = "%s"' % escaped) == []
+    assert ids(mirror, 'name != "%s"' % escaped) == ['t1', 't2', 't3', 't4']
+
+
+def test_parameters_follow_the_other_filters(mirror):
+    # The --where parameters sit between the flag filters' and LIMIT's.
+    tasks = mirror.query_tasks(list_ids=['1'],
+                               statuses='in progress,open',
+                               assignees='2',
+                               where='name ~ "bug" or assignee = 1',
+                               order='id',
+                               limit=2)
+    assert [task.id for task in tasks] == ['t3', 't2']
+
+
+@pytest.mark.parametrize('reverse, expected', [
+    (False, ['t2', 't4', 't1', 't3']),
+    (True, ['t1', 't4', 't2', 't3']),
+])
+def test_tasks_without_due_date_come_last(mirror, reverse, expected):
+    # As from the API, newest first unless reversed.
+    tasks = mirror.query_tasks(list_ids=['1'], include_closed=True,
+                               order='due_date', reverse=reverse)
+    assert [task.id for task in tasks] == expected